@@ -21,6 +21,8 @@ def load_db_api_module(*args) -> None:
     # populate global namespace from db_api
     import pkg.interfaces.db_api as da
     from pkg.classes.model import Record, Conversion
+    from pkg.classes.statements import compiled_cache_stats
+    from pkg.classes.reader import cancellation_stats
     def load():
         load_plot_module(*args)
     exposed = {
@@ -29,12 +31,25 @@ def load_db_api_module(*args) -> None:
         "bdf": da.build_df,
         "e": da.edit,
         "fetch": da.fetch,
+        "fetch_iter": da.fetch_iter,
+        "fetchstats": da.fetch_cache_stats,
+        "summarize": da.summarize,
+        "ledgerstats": da.ledger_cache_stats,
+        "top_n": da.top_n,
+        "running_total": da.running_total,
+        "quantiles": da.quantiles,
         "d": da.delete,
         "r": da.read,
         "w": da.write_record,
         "gr": da.get_record,
         "wc": da.write_conversion,
         "wdf": da.write_df,
+        "rebuild": da.rebuild_aggregates,
+        "transaction": da.transaction,
+        "close": da.close_year,
+        "reopen": da.open_year,
+        "cachestats": compiled_cache_stats,
+        "cancelstats": cancellation_stats,
         "load": load,
         "Record": Record,
         "Conversion": Conversion,
@@ -0,0 +1,443 @@
+"""
+In-memory caches of the ledger.
+
+`ResultCache` is a bounded LRU cache of query results (DataFrames), keyed by
+the compiled SQL plus its parameters. Every entry belongs to a ledger 
+version: the engine's in-process write counter (`model.ledger_version`) and
+`model.data_version`, read from the database itself (the last record id and 
+a trigger-maintained write counter), so commits to `cuentas` or 
+`conversions` from any connection or process are detected. It stands in for
+`PRAGMA data_version`, which only reports other connections' commits to a 
+connection held open between reads. Any change drops the whole cache.
+
+`LedgerCache` mirrors the columns of `cuentas` that filters and aggregates 
+use as NumPy arrays, kept current by pulling only the records appended since
+the last read, and answers them with vectorized masks.
+"""
+from typing import Any, Callable, Optional, Hashable
+from collections import OrderedDict
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Engine, select
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import (
+    TextClause, 
+    BinaryExpression,
+    BindParameter,
+    BooleanClauseList,
+    UnaryExpression,
+    Grouping,
+    AsBoolean,
+    True_,
+    False_,
+)
+from sqlalchemy.sql.expression import Executable, ColumnElement
+
+from pkg.classes.model import (Record, CENTS_SCALE, LEDGER_CHANGES, 
+                               ledger_version, data_version)
+from pkg.classes.reader import read_frame, epoch_days
+from pkg.utilities.core import ensure
+
+
+class ResultCache:
+    """
+    LRU of DataFrames, bounded by `maxsize` entries and `max_bytes` of
+    (deep) memory. Hits return copies, so callers can't corrupt entries.
+
+    Example
+    -------
+    >>> cache = ResultCache()
+    >>> key = cache.key(stmt, engine, index_col='id')
+    >>> if (df := cache.get(key, engine)) is None:
+    ...     df = cache.put(key, read_frame(stmt, engine, index_col='id'))
+    """
+
+    def __init__(
+            self,
+            maxsize: int = 64,
+            max_bytes: int = 256 * 2**20
+    ) -> None:
+        ensure(maxsize, int)
+        ensure(max_bytes, int)
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries: OrderedDict[Hashable, pd.DataFrame] = OrderedDict()
+        self._version: Optional[tuple[int, int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(stmt: Executable, engine: Engine, **kwargs: Any) -> Hashable:
+        """Compiled SQL, bound parameters and read options of `stmt`."""
+        if isinstance(stmt, TextClause):
+            sql, params = str(stmt), {}
+        else:
+            compiled = stmt.compile(dialect=engine.dialect)
+            sql, params = str(compiled), compiled.params
+        # values may be unhashable (e.g. expanding IN lists)
+        return (str(engine.url), sql,
+                repr(sorted(params.items())), repr(sorted(kwargs.items())))
+
+    def _check_version(self, engine: Engine) -> None:
+        version = (ledger_version(engine), *data_version(engine))
+        if version != self._version:
+            self.clear()
+            self._version = version
+
+    def get(self, key: Hashable, engine: Engine) -> Optional[pd.DataFrame]:
+        """The cached result of `key`, None if missing or stale."""
+        self._check_version(engine)
+        if (df := self._entries.get(key)) is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return df.copy()
+
+    def put(self, key: Hashable, df: pd.DataFrame) -> pd.DataFrame:
+        """Caches `df` under `key`, evicting the least recently used entries."""
+        size = self._nbytes(df)
+        if size > self.max_bytes:
+            return df
+        if key in self._entries:
+            self.nbytes -= self._nbytes(self._entries.pop(key))
+        self._entries[key] = df.copy()
+        self.nbytes += size
+        while (len(self._entries) > self.maxsize
+               or self.nbytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= self._nbytes(evicted)
+        return df
+
+    @staticmethod
+    def _nbytes(df: pd.DataFrame) -> int:
+        return int(df.memory_usage(deep=True).sum())
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.nbytes = 0
+
+    def stats(self) -> dict[str, int | float]:
+        """Hits, misses, hit ratio, entries and memory footprint in bytes."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "ratio": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.nbytes,
+        }
+
+
+#region =========================== mirror ====================================
+
+# `LedgerCache.summarize` dimensions, named as `db_api.SUMMARY_GROUPS`
+MIRROR_GROUPS = ("category", "currency", "year", "month", "week", "day")
+MIRROR_AGGREGATES = ("sum", "count", "mean", "min", "max")
+_COMPARISONS = {
+    operators.eq: np.equal,
+    operators.ne: np.not_equal,
+    operators.lt: np.less,
+    operators.le: np.less_equal,
+    operators.gt: np.greater,
+    operators.ge: np.greater_equal,
+}
+
+
+class UnsupportedFilter(ValueError):
+    """A WHERE clause `LedgerCache` can't evaluate, callers fall back to SQL."""
+
+
+class LedgerCache:
+    """
+    Columnar mirror of the ledger: id, date (days since 1970-01-01), amount
+    (int64 cents) and dictionary-encoded currency and category codes, one 
+    NumPy array each, about 24 bytes per record.
+
+    Every read first calls `refresh`, which only reads `model.data_version`
+    of the mirrored columns while the ledger is unchanged. Otherwise only 
+    the records with an id above the largest mirrored one are read, unless 
+    a record was edited or deleted since (`model.ledger_changes`), which 
+    reloads the mirror.
+
+    Notes
+    -----
+    The first read loads every record, closed years included, whatever the
+    filter: about 24MB per million records, kept for the life of the mirror.
+    Connections are only checked out of `engine` while refreshing.
+
+    Example
+    -------
+    >>> mirror = LedgerCache(engine)
+    >>> mirror.summarize(Record.category == "FOOD", ["month"], ["sum"])
+    """
+
+    def __init__(self, engine: Engine) -> None:
+        ensure(engine, Engine)
+        self.engine = engine
+        self.loads = 0
+        self.appends = 0
+        self._lock = threading.Lock()
+        self._version: Optional[tuple[int, int]] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self.id = np.empty(0, np.int64)
+        self.date = np.empty(0, np.int64)
+        self.amount = np.empty(0, np.int64)
+        self.currency = np.empty(0, np.int32)
+        self.category = np.empty(0, np.int32)
+        self.labels: dict[str, list[str]] = {"currency": [], "category": []}
+        self._codes: dict[str, dict[str, int]] = {"currency": {}, "category": {}}
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    #region refresh
+
+    def refresh(self) -> None:
+        """Brings the mirror up to date with the ledger, see `LedgerCache`."""
+        with self._lock, self.engine.connect() as conn:
+            # versioned before reading: a write in between is caught by the
+            # next refresh, never missed
+            version = data_version(conn, LEDGER_CHANGES)
+            if version == self._version:
+                return
+            if self._version is None or version[1] != self._version[1]:
+                self._reset()
+                self.loads += 1
+            else:
+                self.appends += 1
+            last = int(self.id[-1]) if len(self) else 0
+            stmt = select(Record.id, epoch_days(Record.date), 
+                          Record.amount, Record.currency, Record.category) \
+                   .where(Record.id > last) \
+                   .order_by(Record.id)
+            self._append(read_frame(stmt, conn))
+            self._version = version
+
+    def _append(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        cents = np.round(df["amount"].to_numpy("float64") * CENTS_SCALE)
+        self.id = np.concatenate([self.id, df["id"].to_numpy("int64")])
+        self.date = np.concatenate([self.date, df["date"].to_numpy("int64")])
+        self.amount = np.concatenate([self.amount, cents.astype(np.int64)])
+        self.currency = np.concatenate(
+            [self.currency, self._encode("currency", df["currency"])])
+        self.category = np.concatenate(
+            [self.category, self._encode("category", df["category"])])
+
+    def _encode(self, name: str, values: pd.Series) -> np.ndarray:
+        """Codes of `values`, extending the dictionary with unseen ones."""
+        codes, uniques = pd.factorize(values)
+        known = self._codes[name]
+        for label in uniques:
+            if label not in known:
+                known[label] = len(self.labels[name])
+                self.labels[name].append(label)
+        mapping = np.array([known[label] for label in uniques], np.int32)
+        return mapping[codes] if len(mapping) else codes.astype(np.int32)
+
+    #endregion
+
+    #region filters
+
+    def where(self, clause: Optional[ColumnElement]) -> np.ndarray:
+        """
+        Boolean mask of the mirrored records matching `clause`, a WHERE 
+        clause over id, date, amount, currency and category as built by the
+        parser: AND, OR and NOT of comparisons, BETWEEN and IN. Anything else
+        (LIKE, regexps, descriptions, subqueries...) raises 
+        `UnsupportedFilter`.
+        """
+        n = len(self)
+        if clause is None or isinstance(clause, True_):
+            return np.ones(n, bool)
+        if isinstance(clause, False_):
+            return np.zeros(n, bool)
+        if isinstance(clause, Grouping):
+            return self.where(clause.element)
+        if isinstance(clause, AsBoolean):
+            mask = self.where(clause.element)
+            return mask if clause.operator is operators.is_true else ~mask
+        if (isinstance(clause, UnaryExpression) 
+                and clause.operator is operators.inv):
+            return ~self.where(clause.element)
+        if isinstance(clause, BooleanClauseList):
+            masks = [self.where(term) for term in clause.clauses]
+            if clause.operator is operators.and_:
+                return np.logical_and.reduce(masks) if masks else np.ones(n, bool)
+            if clause.operator is operators.or_:
+                return np.logical_or.reduce(masks) if masks else np.zeros(n, bool)
+        if isinstance(clause, BinaryExpression):
+            return self._compare(clause)
+        raise UnsupportedFilter(str(clause))
+
+    def _column(self, term: ColumnElement) -> str:
+        term = getattr(term, "clause", term)
+        for name in ("id", "date", "amount", "currency", "category"):
+            if term.compare(Record.__table__.c[name]):
+                return name
+        raise UnsupportedFilter(str(term))
+
+    def _value(self, name: str, value: Any) -> Any:
+        """`value` in the mirror's encoding of column `name`."""
+        if value is None:
+            raise UnsupportedFilter(f"NULL {name}")
+        if name == "date":
+            # partial ISO strings compare as text, not as days
+            if isinstance(value, str) and len(value) != 10:
+                raise UnsupportedFilter(f"date {value!r}")
+            return np.datetime64(value, "D").astype(np.int64)
+        if name == "amount":
+            return round(float(value) * CENTS_SCALE)
+        if name == "id":
+            return int(value)
+        # an unknown label matches no code
+        return self._codes[name].get(value, -1)
+
+    def _compare(self, term: BinaryExpression) -> np.ndarray:
+        name = self._column(term.left)
+        column = getattr(self, name)
+        op, right = term.operator, term.right
+        if op is operators.between_op and not term.modifiers.get("symmetric"):
+            lower, upper = (self._value(name, self._bound(bound))
+                            for bound in right.clauses)
+            return (column >= lower) & (column <= upper)
+        if op is operators.in_op and getattr(right, "expanding", False):
+            values = [self._value(name, v) for v in self._bound(right)]
+            return np.isin(column, values)
+        if op in _COMPARISONS:
+            if name in self._codes and op not in (operators.eq, operators.ne):
+                raise UnsupportedFilter(f"ordering {name}")
+            return _COMPARISONS[op](column, self._value(name, self._bound(right)))
+        raise UnsupportedFilter(str(term))
+
+    @staticmethod
+    def _bound(term: ColumnElement) -> Any:
+        if not isinstance(term, BindParameter):
+            raise UnsupportedFilter(str(term))
+        return term.effective_value
+
+    #endregion
+
+    #region aggregates
+
+    def _keys(self, name: str, mask: np.ndarray
+              ) -> tuple[np.ndarray, Callable[[np.ndarray], list[str]]]:
+        """Integer group keys of the masked records, and their labeler."""
+        if name in self._codes:
+            labels = self.labels[name]
+            codes = getattr(self, name)[mask]
+            return codes, lambda keys: [labels[k] for k in keys]
+        days = self.date[mask].astype("datetime64[D]")
+        if name == "day":
+            return (days.astype(np.int64), lambda keys: list(
+                np.datetime_as_string(keys.astype("datetime64[D]"))))
+        if name == "month":
+            return (days.astype("datetime64[M]").astype(np.int64), lambda keys: 
+                list(np.datetime_as_string(keys.astype("datetime64[M]"))))
+        years = days.astype("datetime64[Y]")
+        if name == "year":
+            return (years.astype(np.int64), lambda keys: 
+                list(np.datetime_as_string(keys.astype("datetime64[Y]"))))
+        # strftime's %W: weeks start on Monday, days before the first one 
+        # are week 00 (1970-01-01 was a Thursday)
+        yday = (days - years.astype("datetime64[D]")).astype(np.int64)
+        weekday = (self.date[mask] + 3) % 7
+        keys = years.astype(np.int64) * 100 + (yday + 7 - weekday) // 7
+        return keys, lambda keys: [f"{1970 + k // 100}-W{k % 100:02d}" 
+                                   for k in keys]
+
+    def aggregate(
+            self,
+            mask: np.ndarray,
+            by: list[str],
+            agg: list[str],
+    ) -> pd.DataFrame:
+        """
+        Measures of `agg` over the amounts of the records in `mask`, grouped
+        by `by`, with the same index, columns and order as 
+        `db_api.summarize`.
+        """
+        if (unknown := set(by) - set(MIRROR_GROUPS)):
+            raise UnsupportedFilter(f"groups {sorted(unknown)}")
+        if (unknown := set(agg) - set(MIRROR_AGGREGATES)):
+            raise UnsupportedFilter(f"aggregates {sorted(unknown)}")
+        amounts = self.amount[mask]
+        if by:
+            keys, labelers = zip(*(self._keys(name, mask) for name in by))
+            uniques, inverse = np.unique(np.stack(keys, axis=1), axis=0,
+                                         return_inverse=True)
+            inverse = inverse.reshape(-1)
+        else:
+            # a single row, even without records, as sqlite does
+            uniques, inverse = np.zeros((1, 0), np.int64), np.zeros(len(amounts), np.intp)
+        groups = len(uniques)
+        counts = np.bincount(inverse, minlength=groups)
+        sums = np.bincount(inverse, weights=amounts, minlength=groups)
+        columns = {}
+        for name in agg:
+            if name == "count":
+                columns[name] = counts.astype(np.int64)
+            elif name == "sum":
+                columns[name] = np.where(counts > 0, sums, np.nan) / CENTS_SCALE
+            elif name == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    columns[name] = sums / counts / CENTS_SCALE
+            else:
+                columns[name] = self._extreme(name, amounts, inverse, counts)
+
+        df = pd.DataFrame(columns, columns=agg)
+        if by:
+            df.index = pd.MultiIndex.from_arrays(
+                [labeler(uniques[:, i]) for i, labeler in enumerate(labelers)],
+                names=by) if len(by) > 1 else \
+                pd.Index(labelers[0](uniques[:, 0]), name=by[0])
+            df = df.sort_index()
+        return df
+
+    @staticmethod
+    def _extreme(name: str, amounts: np.ndarray, inverse: np.ndarray, 
+                 counts: np.ndarray) -> np.ndarray:
+        """Per-group min or max, NaN for empty groups."""
+        result = np.full(len(counts), np.nan)
+        if not len(amounts):
+            return result
+        ordered = amounts[np.argsort(inverse, kind="stable")]
+        filled = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        reduce = np.minimum if name == "min" else np.maximum
+        result[filled] = reduce.reduceat(ordered, starts) / CENTS_SCALE
+        return result
+
+    def summarize(
+            self,
+            clause: Optional[ColumnElement],
+            by: list[str],
+            agg: list[str],
+    ) -> pd.DataFrame:
+        """`aggregate` of the records matching `clause`, see `where`."""
+        self.refresh()
+        return self.aggregate(self.where(clause), by, agg)
+
+    #endregion
+
+    def stats(self) -> dict[str, int]:
+        """Mirrored records, memory footprint in bytes, full loads and appends."""
+        arrays = (self.id, self.date, self.amount, self.currency, self.category)
+        return {
+            "records": len(self),
+            "bytes": sum(array.nbytes for array in arrays),
+            "loads": self.loads,
+            "appends": self.appends,
+        }
+
+#endregion
@@ -2,15 +2,28 @@
 Main data manager for acccli. Relies heavily on utilities.core.
 """
 from dataclasses import dataclass
-from typing import List, Optional, Any
+from typing import List, Optional, Any, ContextManager
 from pathlib import Path, WindowsPath
 from datetime import date
+import sqlite3
 
 from pandas import Period
 from sqlalchemy.engine.base import Engine
-from sqlalchemy import create_engine
-
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from pkg.classes.model import (create_tables, 
+                               transaction,
+                               sync_amount_storage,
+                               attach_partitions)
+from pkg.classes.statements import track_compiled_cache
+from pkg.classes.migrations import migrate
+from pkg.classes.reader import (
+    SCAN_WARNING_ROWS, 
+    set_scan_warning_rows, set_query_timeout,
+)
 from pkg.utilities.jops import jopen, jrepr
+from pkg.utilities.parser import sqlite_regexp
 from pkg.utilities.file import sha256, SHA256Error
 from pkg.utilities.prompt import (prompt_currency,
                                   prompt_category_from_keybinds)
@@ -20,7 +33,8 @@ from pkg.utilities.typing import (FieldDictType,
                                   KeybindDictType,
                                   ExchangeDictType,
                                   StrDict,
-                                  CurrencyColorDictionary)
+                                  CurrencyColorDictionary,
+                                  SqliteProfileType)
 from pkg.utilities.core import (APPLICATION_CACHED_DIRECTORY,
                                 soft_warning,
                                 confirm_action,
@@ -45,12 +59,160 @@ def _today_period() -> Period:
     return Period(date.today(), 'M')
 
 
-def _engine(url : str | Path | None) -> Engine:
+#region ========================= sqlite-profile ===============================
+
+# connection-level tuning applied on every new DBAPI connection.
+# busy_timeout goes first: switching journal_mode may need to wait for a lock
+SQLITE_PRESETS : dict[str, SqliteProfileType] = {
+    # durable: fsync on every commit, WAL so readers don't block the writer
+    "safe" : {
+        "busy_timeout"  :   5000,
+        "journal_mode"  :   "WAL",
+        "synchronous"   :   "FULL",
+        "cache_size"    :   -16000,
+        "mmap_size"     :   0,
+        "temp_store"    :   "DEFAULT",
+    },
+    # WAL + NORMAL only loses the last commits on power loss, never corrupts
+    "fast" : {
+        "busy_timeout"  :   5000,
+        "journal_mode"  :   "WAL",
+        "synchronous"   :   "NORMAL",
+        "cache_size"    :   -64000,
+        "mmap_size"     :   268435456,
+        "temp_store"    :   "MEMORY",
+    },
+}
+DEFAULT_SQLITE_PRESET = "safe"
+
+_SQLITE_CHOICES = {
+    "journal_mode"  :   {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"},
+    "synchronous"   :   {"OFF", "NORMAL", "FULL", "EXTRA"},
+    "temp_store"    :   {"DEFAULT", "FILE", "MEMORY"},
+}
+_SQLITE_INTEGERS = {"busy_timeout", "cache_size", "mmap_size"}
+
+
+# read engine: bigger cache and mmap for analytical reads, never writes.
+# journal_mode is left to the writer, a read-only connection can't switch it
+READ_PROFILE : SqliteProfileType = {
+    "cache_size"    :   -64000,
+    "mmap_size"     :   268435456,
+    "temp_store"    :   "MEMORY",
+}
+
+
+def _check_profile(profile : SqliteProfileType) -> SqliteProfileType:
+    """Type-checks every pragma of `profile`, upper-casing choices."""
+    for pragma, value in profile.items():
+        if pragma in _SQLITE_INTEGERS:
+            ensure(value, int)
+        elif pragma in _SQLITE_CHOICES:
+            ensure(value, str)
+            if value.upper() not in _SQLITE_CHOICES[pragma]:
+                raise ValueError(f"Invalid {pragma}={value!r}. Must be any of "
+                                 f"{sorted(_SQLITE_CHOICES[pragma])}.")
+            profile[pragma] = value.upper()
+        else:
+            raise ValueError(f"Unsupported sqlite pragma: {pragma!r}.")
+    return profile
+
+
+def _sqlite_profile(config : str | dict | None) -> SqliteProfileType:
+    """
+    Resolves config.json's `sqlite` section: either a preset name or a dict
+    with an optional `preset` key whose pragmas are overridden by the rest.
+    The `read` key belongs to `_sqlite_read_profile`.
+    """
+    if config is None:
+        config = DEFAULT_SQLITE_PRESET
+    if isinstance(config, str):
+        config = {"preset" : config}
+    ensure(config, dict)
+
+    overrides = config.copy()
+    overrides.pop("read", None)
+    preset = overrides.pop("preset", DEFAULT_SQLITE_PRESET)
+    if preset not in SQLITE_PRESETS:
+        raise ValueError(f"Invalid sqlite {preset=}. "
+                         f"Must be any of {list(SQLITE_PRESETS)}.")
+    
+    return _check_profile(SQLITE_PRESETS[preset] | overrides)
+
+
+def _sqlite_read_profile(config : str | dict | None) -> SqliteProfileType:
+    """
+    Pragmas of the read-only engine: the write profile without 
+    `journal_mode`, then `READ_PROFILE`, then the `read` dict of config.json's 
+    `sqlite` section.
+    """
+    profile = _sqlite_profile(config)
+    profile.pop("journal_mode", None)
+    overrides = config.get("read", {}) if isinstance(config, dict) else {}
+    ensure(overrides, dict)
+    return _check_profile(profile | READ_PROFILE | overrides)
+
+
+def _set_sqlite_pragmas(engine : Engine, profile : SqliteProfileType) -> None:
+    """Applies `profile` on every new connection of `engine`."""
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, _connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma, value in profile.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        cursor.close()
+
+def _set_regexp(engine : Engine) -> None:
+    """Overrides sqlalchemy's REGEXP with our cached implementation."""
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, _connection_record) -> None:
+        dbapi_connection.create_function(
+            "regexp", 2, sqlite_regexp, deterministic=True)
+
+#endregion =====================================================================
+
+
+def _read_engine(
+        engine : Engine,
+        profile : Optional[SqliteProfileType] = None
+) -> Engine:
+    """
+    Read-only twin of `engine` with its own pool: opened with `mode=ro` and 
+    `query_only`, so long reads never take write locks. In-memory databases 
+    can't be opened twice, `engine` itself is returned instead.
+    """
+    database = engine.url.database
+    if not database or database == ":memory:":
+        return engine
+    uri = f"{Path(database).resolve().as_uri()}?mode=ro"
+    read_engine = create_engine(
+        engine.url,
+        creator=lambda: sqlite3.connect(uri, uri=True, check_same_thread=False)
+    )
+    _set_sqlite_pragmas(read_engine, (profile or {}) | {"query_only": "ON"})
+    _set_regexp(read_engine)
+    track_compiled_cache(read_engine)
+    # same storage scale and partitions as the writer
+    sync_amount_storage(read_engine)
+    attach_partitions(read_engine)
+    return read_engine
+
+
+def _engine(
+        url : str | Path | None,
+        profile : Optional[SqliteProfileType] = None
+) -> Engine:
     if url is None:
-        return create_engine("sqlite://")
-    if 'sqlite' in url:
-        return create_engine(url)
-    return create_engine(f"sqlite:///{url}")
+        engine = create_engine("sqlite://")
+    elif 'sqlite' in url:
+        engine = create_engine(url)
+    else:
+        engine = create_engine(f"sqlite:///{url}")
+    if profile:
+        _set_sqlite_pragmas(engine, profile)
+    _set_regexp(engine)
+    track_compiled_cache(engine)
+    return engine
 
 
 def _jsave(d : dict, p : Path) -> None:
@@ -102,9 +264,17 @@ class AccountingContext:
     config_path : Optional[Path]                = None
     fields_path : Optional[Path]                = None
     engine: Optional[Engine]                    = None
+    # read-only twin of `engine`, used by plots and raw `sql:` queries
+    read_engine: Optional[Engine]               = None
     editor : Optional[Path]                     = None
     fields : Optional[FieldDictType]            = None
     default_currency : Optional[str]            = None 
+    sqlite : Optional[SqliteProfileType]        = None
+    sqlite_read : Optional[SqliteProfileType]   = None
+    # ledger size above which `explain` warns on full scans
+    scan_warning_rows : int                     = SCAN_WARNING_ROWS
+    # seconds before any read is cancelled, None for no limit
+    query_timeout : Optional[float]             = None
     # built at runtime if not fetched from cache
     keybinds : Optional[KeybindDictType]        = None
     categories_dict: Optional[StrDict]          = None
@@ -156,7 +326,11 @@ class AccountingContext:
         self.config_path    =   Path(self.config_path)
         self.fields_path    =   Path(self.fields_path)
         self.editor         =   Path(self.editor)
-        self.engine         =   _engine(self.engine)
+        self.engine         =   _engine(self.engine, self.sqlite)
+        create_tables(self.engine)
+        migrate(self.engine)
+        self.read_engine    =   _read_engine(self.engine, self.sqlite_read)
+        self._set_read_limits()
         # overwrite period
         self.period         =   _today_period()
 
@@ -192,7 +366,15 @@ class AccountingContext:
         config                      =   jopen(config_path)
         self.config_path            =   _path_exists(config_path)
         self.fields_path            =   _path_exists(fields_path)
-        self.engine                 =   _engine(config.get('db_path'))
+        self.sqlite                 =   _sqlite_profile(config.get('sqlite'))
+        self.sqlite_read            =   _sqlite_read_profile(config.get('sqlite'))
+        self.engine                 =   _engine(config.get('db_path'), self.sqlite)
+        create_tables(self.engine)
+        migrate(self.engine)
+        self.read_engine            =   _read_engine(self.engine, self.sqlite_read)
+        self.scan_warning_rows      =   config.get('scan_warning_rows', SCAN_WARNING_ROWS)
+        self.query_timeout          =   config.get('query_timeout')
+        self._set_read_limits()
         self.editor                 =   check_editor(config.get("editor_path"))
         self.fields                 =   import_fields(fields_path)
         self.default_currency       =   prompt_currency(config.get('default_currency'), quiet=True)
@@ -200,6 +382,12 @@ class AccountingContext:
         self.categories_dict        =   fetch_category_dictionary(self.fields)
 
 
+    def _set_read_limits(self) -> None:
+        for engine in (self.engine, self.read_engine):
+            set_scan_warning_rows(engine, self.scan_warning_rows)
+            set_query_timeout(engine, self.query_timeout)
+
+
     def set_plot(self) -> None:
         """Sets plot configurations for styling."""
 
@@ -227,6 +415,15 @@ class AccountingContext:
         self.matplotlib             =   _return_dict(config.get("matplotlib"))
 
 
+    def batch(self) -> ContextManager[Session]:
+        """
+        Unit of work on `self.engine`: records and conversions written, edited
+        or deleted inside `with ctx.batch():` are committed once on exit, or 
+        rolled back together if anything fails. See `model.transaction`.
+        """
+        return transaction(self.engine)
+
+
     def update_exchange(self) -> None:
         """Force updates to self.exchange_dictionary."""
         self.exchange_dictionary = get_exchange_dict(
@@ -262,6 +459,8 @@ class AccountingContext:
 
         # manually update unserializable
         save_dict["engine"]         =   str(self.engine.url)
+        # rebuilt from `engine` on load
+        del save_dict["read_engine"]
         save_dict["editor"]         =   str(self.editor)
         save_dict["period"]         =   str(self.period)
         save_dict["config_path"]    =   str(self.config_path)
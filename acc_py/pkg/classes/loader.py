@@ -0,0 +1,86 @@
+"""
+Concurrent data layer for plots and dashboards: independent reads (e.g. the
+queries behind several figures) run in a thread pool, each on its own pooled
+connection, and are gathered in order before anything is drawn. sqlite
+releases the GIL while it steps a statement, so reads on separate
+connections do overlap.
+"""
+from typing import Any, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import threading
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+
+
+LOADER_WORKERS = min(4, os.cpu_count() or 1)
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def executor() -> ThreadPoolExecutor:
+    """Shared pool of `LOADER_WORKERS` threads, started on first use."""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(LOADER_WORKERS,
+                                           thread_name_prefix="loader")
+    return _EXECUTOR
+
+
+def concurrent_reads(engine: Engine) -> bool:
+    """
+    Whether reads of `engine` can run on several threads at once. Engines
+    bound to a single connection, like in-memory databases (a new thread
+    would see a new, empty database), read in turn on the calling thread.
+    """
+    return not isinstance(engine.pool, (SingletonThreadPool, StaticPool))
+
+
+def gather(engine: Engine, *fetchers: Callable[[], Any]) -> list[Any]:
+    """
+    Runs every fetcher (a no-argument callable reading from `engine`) in the
+    `executor` and returns their results in order. The first failure is
+    raised once the fetchers before it are done.
+
+    Notes
+    -----
+    Ctrl-C cancels the fetchers not started yet; running ones stop at their
+    time budget (see `reader.time_budget`), if any.
+
+    Example
+    -------
+    >>> dfs = gather(ctx.read_engine,
+    ...              partial(fetch_barchart_data, "2025-01"),
+    ...              partial(fetch_barchart_data, "2025-02"))
+    """
+    if len(fetchers) < 2 or not concurrent_reads(engine):
+        return [fetch() for fetch in fetchers]
+    futures = [executor().submit(fetch) for fetch in fetchers]
+    try:
+        return [future.result() for future in futures]
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+async def agather(engine: Engine, *fetchers: Callable[[], Any]) -> list[Any]:
+    """
+    Awaitable `gather`: the event loop keeps running while the fetchers
+    read in the `executor`. Cancelling the awaiting task cancels the
+    fetchers not started yet.
+
+    Example
+    -------
+    >>> savings, outflow = await agather(ctx.read_engine,
+    ...                                  fetch_savings_data, get_outflow_data)
+    """
+    if not concurrent_reads(engine):
+        return [fetch() for fetch in fetchers]
+    loop = asyncio.get_running_loop()
+    futures = [loop.run_in_executor(executor(), fetch) for fetch in fetchers]
+    return list(await asyncio.gather(*futures))
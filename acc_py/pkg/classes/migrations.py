@@ -0,0 +1,300 @@
+"""
+Versioned schema migrations. `create_tables` only adds what is missing;
+anything that changes existing tables is registered here with `migration`
+and applied in version order by `migrate`, which records its progress in the
+`schema_version` table.
+
+Migrations are meant to run on a live (WAL) ledger: every step commits on
+its own and `MigrationRun.backfill` updates rows in short id-range batches,
+so readers are never blocked and writers only wait for a single batch.
+An interrupted migration resumes from its last committed step or batch.
+"""
+from typing import Callable, Optional
+from dataclasses import dataclass
+from datetime import datetime
+from inspect import signature
+from time import sleep
+
+from sqlalchemy import (
+    Integer, String, Table, Column, MetaData,
+    text, select, insert, update, func,
+)
+from sqlalchemy.engine import Engine
+
+from pkg.classes.model import (
+    LEGACY_SCALE,
+    amount_scale, migrate_amounts_to_cents, begin_explicitly,
+    closed_years, partition_schema, record_fingerprint,
+)
+from pkg.utilities.core import ensure
+
+
+BACKFILL_CHUNKSIZE = 5_000
+
+SCHEMA_VERSION = Table(
+    "schema_version", MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String, nullable=False),
+    # steps committed so far and last id backfilled by the running step
+    Column("step", Integer, nullable=False, default=0),
+    Column("cursor", Integer),
+    # NULL until every step has been committed
+    Column("applied_at", String),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable[["MigrationRun"], None]
+
+
+MIGRATIONS: dict[int, Migration] = {}
+
+
+def migration(version: int, name: str) -> Callable:
+    """
+    Decorator: registers `apply(run)` as schema `version`. Steps issued
+    through `run` (`ddl`, `backfill`) are committed and skipped on resume;
+    anything else `apply` does must be idempotent.
+
+    Example
+    -------
+    >>> @migration(2, "lowercase descriptions")
+    ... def _lowercase(run: MigrationRun) -> None:
+    ...     run.ddl("CREATE INDEX IF NOT EXISTS ix_desc ON cuentas (description)")
+    ...     run.backfill("cuentas", "description = lower(description)")
+    """
+    ensure(version, int)
+    ensure(name, str)
+    def decorator(apply: Callable[["MigrationRun"], None]) -> Callable:
+        if version in MIGRATIONS:
+            raise ValueError(f"Migration {version} is already registered.")
+        MIGRATIONS[version] = Migration(version, name, apply)
+        return apply
+    return decorator
+
+
+#region ============================ runner ====================================
+
+class MigrationRun:
+    """
+    Step executor handed to a migration's `apply`. Steps are numbered in the
+    order they are issued, so `apply` must issue them deterministically.
+    """
+
+    def __init__(
+            self,
+            engine: Engine,
+            migration: Migration,
+            chunksize: int,
+            pause: float,
+    ) -> None:
+        self.engine = engine
+        self.migration = migration
+        self.chunksize = chunksize
+        self.pause = pause
+        self._issued = 0
+        with engine.connect() as conn:
+            row = conn.execute(
+                select(SCHEMA_VERSION.c.step, SCHEMA_VERSION.c.cursor)
+                .where(SCHEMA_VERSION.c.version == migration.version)
+            ).one()
+        self._committed, self._cursor = row
+
+    def _next_step(self) -> Optional[int]:
+        """Number of the step being issued, None if it was already committed."""
+        step = self._issued
+        self._issued += 1
+        return None if step < self._committed else step
+
+    def _record(self, conn, step: Optional[int], cursor: Optional[int]) -> None:
+        conn.execute(
+            update(SCHEMA_VERSION)
+            .where(SCHEMA_VERSION.c.version == self.migration.version)
+            .values(step=step, cursor=cursor)
+        )
+
+    def ddl(self, *statements: str) -> None:
+        """Runs `statements` as one step, atomically."""
+        if (step := self._next_step()) is None:
+            return
+        with self.engine.begin() as conn:
+            begin_explicitly(conn)
+            for statement in statements:
+                conn.execute(text(statement))
+            self._record(conn, step + 1, None)
+        self._committed = step + 1
+
+    def backfill(
+            self,
+            table: str,
+            assignments: str,
+            where: Optional[str] = None,
+            functions: Optional[dict[str, Callable]] = None,
+    ) -> int:
+        """
+        Step: `UPDATE table SET assignments [WHERE where]`, in batches of
+        `chunksize` ids. Each batch commits together with its cursor, so an
+        interrupted backfill resumes after the last committed id and no row
+        is updated twice. `functions` (name: callable) are registered as 
+        deterministic sqlite functions for `assignments` to call. Returns the
+        number of updated rows.
+        """
+        ensure(table, str)
+        ensure(assignments, str)
+        if (step := self._next_step()) is None:
+            return 0
+        functions = functions or {}
+        name = self.migration.name
+        condition = f" AND ({where})" if where else ""
+        last = self._cursor or 0
+
+        next_ids = text(
+            f"SELECT max(id), count(*) FROM (SELECT id FROM {table} "
+            f"WHERE id > :last ORDER BY id LIMIT :chunksize)"
+        )
+        batch = text(
+            f"UPDATE {table} SET {assignments} "
+            f"WHERE id > :last AND id <= :upto{condition}"
+        )
+        with self.engine.connect() as conn:
+            total = conn.execute(
+                text(f"SELECT count(*) FROM {table} WHERE id > :last"),
+                {"last": last}
+            ).scalar()
+
+        done = updated = 0
+        while True:
+            with self.engine.begin() as conn:
+                for fname, function in functions.items():
+                    conn.connection.driver_connection.create_function(
+                        fname, len(signature(function).parameters), function,
+                        deterministic=True)
+                upto, count = conn.execute(
+                    next_ids, {"last": last, "chunksize": self.chunksize}
+                ).one()
+                if upto is None:
+                    self._record(conn, step + 1, None)
+                    break
+                updated += conn.execute(
+                    batch, {"last": last, "upto": upto}).rowcount
+                self._record(conn, step, upto)
+            last = self._cursor = upto
+            done += count
+            print(f"{name}: {done}/{total} rows backfilled (last id: {upto}).")
+            # lets queued writers in between batches
+            if self.pause:
+                sleep(self.pause)
+        self._committed, self._cursor = step + 1, None
+        return updated
+
+
+def _ensure_schema_version(engine: Engine) -> None:
+    SCHEMA_VERSION.create(engine, checkfirst=True)
+
+
+def current_version(engine: Engine) -> int:
+    """Highest fully applied migration version, 0 if none."""
+    ensure(engine, Engine)
+    _ensure_schema_version(engine)
+    with engine.connect() as conn:
+        return conn.execute(
+            select(func.coalesce(func.max(SCHEMA_VERSION.c.version), 0))
+            .where(SCHEMA_VERSION.c.applied_at.is_not(None))
+        ).scalar()
+
+
+def pending_migrations(engine: Engine) -> list[Migration]:
+    """Registered migrations not yet applied, in version order."""
+    ensure(engine, Engine)
+    _ensure_schema_version(engine)
+    with engine.connect() as conn:
+        applied = set(conn.execute(
+            select(SCHEMA_VERSION.c.version)
+            .where(SCHEMA_VERSION.c.applied_at.is_not(None))
+        ).scalars())
+    return [MIGRATIONS[v] for v in sorted(MIGRATIONS) if v not in applied]
+
+
+def migrate(
+        engine: Engine,
+        target: Optional[int] = None,
+        chunksize: int = BACKFILL_CHUNKSIZE,
+        pause: float = 0.0,
+) -> list[int]:
+    """
+    Applies every pending migration up to `target` (all by default),
+    resuming any that was interrupted. `pause` seconds are slept between
+    backfill batches. Returns the applied versions.
+    """
+    ensure(engine, Engine)
+    ensure(chunksize, int)
+    applied = []
+    for mig in pending_migrations(engine):
+        if target is not None and mig.version > target:
+            break
+        with engine.begin() as conn:
+            started = conn.execute(
+                select(SCHEMA_VERSION.c.version)
+                .where(SCHEMA_VERSION.c.version == mig.version)
+            ).first()
+            if started is None:
+                conn.execute(insert(SCHEMA_VERSION).values(
+                    version=mig.version, name=mig.name, step=0))
+            else:
+                print(f"Resuming migration {mig.version} ({mig.name}).")
+        mig.apply(MigrationRun(engine, mig, chunksize, pause))
+        with engine.begin() as conn:
+            conn.execute(
+                update(SCHEMA_VERSION)
+                .where(SCHEMA_VERSION.c.version == mig.version)
+                .values(applied_at=datetime.now().isoformat(timespec="seconds"))
+            )
+        applied.append(mig.version)
+    return applied
+
+#endregion =====================================================================
+
+
+#region ========================== migrations ==================================
+
+@migration(1, "amounts to cents")
+def _amounts_to_cents(run: MigrationRun) -> None:
+    # already chunked and resumable on its own, see `migrate_amounts_to_cents`
+    if amount_scale(run.engine.dialect) == LEGACY_SCALE:
+        migrate_amounts_to_cents(run.engine, run.chunksize)
+
+
+def _has_column(engine: Engine, schema: str, table: str, column: str) -> bool:
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"PRAGMA {schema}.table_info({table})")
+        return column in {row[1] for row in rows}
+
+
+@migration(2, "record fingerprints")
+def _record_fingerprints(run: MigrationRun) -> None:
+    # `cuentas` and every closed-year partition need the same columns: the
+    # partitions are read through `SELECT *` unions (see `close_year`). The
+    # steps depend on the closed years, which can't change until it's 
+    # applied (see `model._refuse_during_migration`)
+    schemas = ["main"] + [partition_schema(y) for y in closed_years(run.engine)]
+    for schema in schemas:
+        # issued even when there is nothing to add: steps must be stable
+        missing = not _has_column(run.engine, schema, "cuentas", "fingerprint")
+        run.ddl(*(
+            [f"ALTER TABLE {schema}.cuentas ADD COLUMN fingerprint VARCHAR(16)"]
+            if missing else []
+        ))
+        # amounts are integer cents since migration 1
+        run.backfill(
+            f"{schema}.cuentas",
+            "fingerprint = record_fingerprint(date, amount, currency, description)",
+            where="fingerprint IS NULL",
+            functions={"record_fingerprint": record_fingerprint},
+        )
+        run.ddl(f"CREATE INDEX IF NOT EXISTS {schema}.ix_cuentas_fingerprint "
+                f"ON cuentas (fingerprint)")
+
+#endregion =====================================================================
@@ -1,10 +1,19 @@
-from typing import Any, Optional
+from typing import Any, Optional, Iterator, Iterable
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache, partial
+from pathlib import Path
 import datetime
+import sqlite3
 from copy import deepcopy
+from hashlib import blake2b
 
 from sqlalchemy import (
-    String, Date, Numeric, Engine
+    String, Date, Integer, Engine, Index, Table, Column, MetaData, 
+    text, inspect, table, column, select, event,
 )
+from sqlalchemy.engine import Dialect, Connection
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.orm import (
     Mapped, Session,
     mapped_column, declarative_base,
@@ -15,13 +24,150 @@ from pkg.utilities.core import ensure, soft_warning
 
 Base = declarative_base()
 
+# amounts are stored as integer minor units (cents)
+CENTS_SCALE = 100
+# scale of ledgers still using the legacy Numeric(10, 2) column
+LEGACY_SCALE = 1
+
+WRITE_LABEL = "The following record has been added to database:"
+
+# bytes of `record_fingerprint` (hex encoded, so twice as many characters)
+FINGERPRINT_SIZE = 8
+
+
+def amount_scale(dialect: Dialect) -> int:
+    """Storage scale of the engine `dialect` belongs to. See `sync_amount_storage`."""
+    return getattr(dialect, "amount_scale", CENTS_SCALE)
+
+
+class Cents(TypeDecorator):
+    """
+    Transparent integer minor-units storage: binds `12.34` as `1234` and reads
+    it back as `12.34`. SQLite sums plain integers, so aggregates stay exact.
+
+    The scale is read from the dialect at bind time, so ledgers that still 
+    hold the legacy `Numeric(10, 2)` column keep working until migrated by 
+    `migrate_amounts_to_cents`.
+    """
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect: Dialect) -> Any:
+        if value is None:
+            return None
+        scale = amount_scale(dialect)
+        if scale == LEGACY_SCALE:
+            return float(value)
+        return round(float(value) * scale)
+
+    def process_result_value(self, value: Any, dialect: Dialect) -> Any:
+        if value is None:
+            return None
+        return value / amount_scale(dialect)
+
+
+#region ======================== ledger-version ================================
+
+def ledger_version(engine: Engine) -> int:
+    """
+    In-process counter of writes through `engine`, recorded on its dialect 
+    like `amount_scale`. Result caches compare it to tell stale entries.
+    """
+    return getattr(engine.dialect, "ledger_version", 0)
+
+
+def bump_ledger_version(engine: Engine) -> int:
+    """Marks every result read so far from `engine` as stale."""
+    engine.dialect.ledger_version = ledger_version(engine) + 1
+    return engine.dialect.ledger_version
+
+#endregion =====================================================================
+
+
+#region ========================= unit-of-work =================================
+
+class UnitOfWork:
+    """Session shared by every `Entity.write` / `delete` inside `transaction`."""
+
+    def __init__(self, engine: Engine) -> None:
+        # objects stay readable after the final commit closes the session
+        self.session = Session(engine, expire_on_commit=False)
+        self.counts: Counter[str] = Counter()
+
+    def summary(self) -> str:
+        counts = ', '.join(f"{n} {action}" for action, n in self.counts.items())
+        return counts or "nothing to do"
+
+
+# active units of work, by engine
+_UNITS_OF_WORK: dict[Engine, UnitOfWork] = {}
+
+
+def active_unit_of_work(engine: Engine) -> Optional[UnitOfWork]:
+    return _UNITS_OF_WORK.get(engine)
+
+
+@contextmanager
+def _write_connection(engine: Engine) -> Iterator[Connection]:
+    """The active unit of work's connection, or a fresh transaction."""
+    if (uow := active_unit_of_work(engine)) is not None:
+        yield uow.session.connection()
+        return
+    with engine.begin() as conn:
+        yield conn
+
+
+@contextmanager
+def transaction(engine: Engine) -> Iterator[Session]:
+    """
+    Batches every `Entity.write` and `Entity.delete` on `engine` into a single
+    session, committed once on exit and rolled back if anything raises. 
+    A summary is printed at the end. Nested calls join the outer transaction.
+
+    Example
+    -------
+    >>> with transaction(engine):
+    ...     for record in records:
+    ...         record.write(engine)
+    """
+    ensure(engine, Engine)
+    if (uow := active_unit_of_work(engine)) is not None:
+        yield uow.session
+        return
+
+    uow = UnitOfWork(engine)
+    _UNITS_OF_WORK[engine] = uow
+    try:
+        yield uow.session
+        uow.session.commit()
+    except BaseException:
+        uow.session.rollback()
+        print(f"Transaction rolled back, discarded: {uow.summary()}.")
+        raise
+    else:
+        print(f"Transaction committed: {uow.summary()}.")
+    finally:
+        uow.session.close()
+        del _UNITS_OF_WORK[engine]
+        # reads inside the transaction may have seen rows now rolled back
+        bump_ledger_version(engine)
+
+#endregion =====================================================================
+
 
 class Entity:
 
+    # columns computed from the others on write, left out of `==` and repr
+    DERIVED_COLUMNS: tuple[str, ...] = ()
+
+    def _columns(self) -> list[str]:
+        return [col for col in self.__table__.columns.keys() 
+                if col not in self.DERIVED_COLUMNS]
+
     def __eq__(self, other: Any) -> bool:
         if not isinstance(self, type(other)):
             return False
-        cols = self.__table__.columns.keys()
+        cols = self._columns()
         for attr in cols:
             if not (hasattr(other, attr) and 
                     getattr(self, attr) == getattr(other, attr)):
@@ -30,7 +176,7 @@ class Entity:
 
 
     def __repr__(self) -> str:
-        cols = self.__table__.columns.keys()
+        cols = self._columns()
         values = {col: getattr(self, col) for col in cols}
         attrs = "\n".join(f"  {k}={v}" for k, v in values.items())
         self_type = type(self).__name__
@@ -67,7 +213,17 @@ class Entity:
         ensure(quiet, bool)
 
         if label is None:
-            label = "The following record has been added to database:"
+            label = WRITE_LABEL
+        bump_ledger_version(engine)
+
+        # inside `transaction`: queue it, flushing only to get the id
+        if (uow := active_unit_of_work(engine)) is not None:
+            uow.session.add(self)
+            uow.session.flush()
+            uow.counts["written"] += 1
+            if not quiet:
+                print(label, self, sep="\n")
+            return
         
         with Session(engine) as session:
             session.add(self)
@@ -83,6 +239,11 @@ class Entity:
         """
         ensure(engine, Engine)
         soft_warning("Warning: you may lose data permanently.")
+        bump_ledger_version(engine)
+        if (uow := active_unit_of_work(engine)) is not None:
+            uow.session.delete(self)
+            uow.counts["deleted"] += 1
+            return
         with Session(engine) as session:
             session.delete(self)
             session.commit()
@@ -100,26 +261,124 @@ class Entity:
 class Record(Base, Entity):
 
     __tablename__ = "cuentas"
+    # indexes follow the real access paths: period filters (date), drill-downs
+    # and category time series (category, currency, date) and per-currency
+    # aggregates (currency, date)
+    __table_args__ = (
+        Index("ix_cuentas_date", "date"),
+        Index("ix_cuentas_category_currency_date", 
+              "category", "currency", "date"),
+        Index("ix_cuentas_currency_date", "currency", "date"),
+        # duplicate lookups on import (see `record_fingerprint`); not unique,
+        # identical records are legitimate (two coffees on the same day)
+        Index("ix_cuentas_fingerprint", "fingerprint"),
+        # ids are never reused, so they stay unique across year partitions
+        {"sqlite_autoincrement": True},
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     date: Mapped[datetime.date] = mapped_column(Date, nullable=False)
-    amount: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
+    amount: Mapped[float] = mapped_column(Cents, nullable=False)
     currency: Mapped[str] = mapped_column(String(3), nullable=False)
     description: Mapped[str] = mapped_column(String, nullable=False)
     category: Mapped[str] = mapped_column(nullable=False)
+    # last: added by migration 2, `ALTER TABLE` appends it to older ledgers.
+    # deferred: only loaded when accessed
+    fingerprint: Mapped[Optional[str]] = mapped_column(
+        String(2 * FINGERPRINT_SIZE), nullable=True, deferred=True)
 
+    DERIVED_COLUMNS = ("fingerprint",)
+
+    def write(
+            self, 
+            engine: Engine, 
+            label: Optional[str] = None,
+            quiet: bool = False
+    ) -> None:
+        """
+        `Entity.write`, aware of closed years (see `close_year`): new records 
+        dated in one are routed to its partition, edits of one are refused.
+        """
+        ensure(engine, Engine)
+        years = closed_years(engine)
+        if not years:
+            return super().write(engine, label, quiet)
+
+        if self.id is not None or self.date.year not in years:
+            with _write_connection(engine) as conn:
+                check_writable(conn, [self.id] if self.id else [], [self.date])
+            return super().write(engine, label, quiet)
+
+        row = {col: getattr(self, col) for col in self.__table__.columns.keys()}
+        bump_ledger_version(engine)
+        with _write_connection(engine) as conn:
+            self.id, = route_records(conn, [row])
+        if (uow := active_unit_of_work(engine)) is not None:
+            uow.counts["written"] += 1
+        if not quiet:
+            print(label or WRITE_LABEL, self, sep="\n")
+
+    def delete(self, engine: Engine) -> None:
+        """`Entity.delete`, refused for records of closed years."""
+        ensure(engine, Engine)
+        if closed_years(engine) and self.id is not None:
+            with _write_connection(engine) as conn:
+                check_writable(conn, [self.id])
+        super().delete(engine)
+
+
+#region ========================= fingerprints =================================
+
+def record_fingerprint(
+        date: str,
+        cents: int,
+        currency: str,
+        description: str,
+) -> str:
+    """
+    Content hash of a record: blake2b of its ISO `date`, amount in `cents`, 
+    upper-cased `currency` and `description` with whitespace collapsed and 
+    case folded. The category is left out, so a re-imported record that was
+    re-categorized since still collides. Also registered as a sqlite 
+    function by the migration that backfills it.
+    """
+    normalized = " ".join(description.split()).casefold()
+    key = f"{date}|{int(cents)}|{currency.strip().upper()}|{normalized}"
+    return blake2b(key.encode(), digest_size=FINGERPRINT_SIZE).hexdigest()
+
+
+def _row_fingerprint(row: dict[str, Any] | Record) -> str:
+    """`record_fingerprint` of a record, or of a row with record columns."""
+    get = row.get if isinstance(row, dict) else partial(getattr, row)
+    return record_fingerprint(
+        get("date").strftime("%Y-%m-%d"), 
+        round(float(get("amount")) * CENTS_SCALE),
+        get("currency"), 
+        get("description"),
+    )
+
+
+@event.listens_for(Record, "before_insert")
+@event.listens_for(Record, "before_update")
+def _set_fingerprint(mapper, connection, target: Record) -> None:
+    target.fingerprint = _row_fingerprint(target)
+
+#endregion =====================================================================
 
 
 class Conversion(Base, Entity):
 
     __tablename__ = "conversions"
+    __table_args__ = (
+        Index("ix_conversions_date", "date"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     date: Mapped[datetime.date] = mapped_column(Date, nullable=False)
     base_currency: Mapped[str] = mapped_column(String(3), nullable=False)
-    base_amount: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
+    base_amount: Mapped[float] = mapped_column(Cents, nullable=False)
     target_currency: Mapped[str] = mapped_column(String(3), nullable=False)
-    target_amount: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
+    target_amount: Mapped[float] = mapped_column(Cents, nullable=False)
     description: Mapped[str] = mapped_column(String,nullable=False)
 
 
@@ -153,7 +412,822 @@ class Conversion(Base, Entity):
         pass
 
 
+class MonthlyAggregate(Base):
+    """
+    Materialized `cuentas` totals per (period, currency, category), kept 
+    current by the triggers in `AGGREGATE_TRIGGERS`. Plots read from here, so
+    their cost grows with periods × categories instead of records.
+    """
+
+    __tablename__ = "monthly_aggregates"
+
+    # '%Y-%m', as strftime in the triggers
+    period: Mapped[str] = mapped_column(String(7), primary_key=True)
+    currency: Mapped[str] = mapped_column(String(3), primary_key=True)
+    category: Mapped[str] = mapped_column(String, primary_key=True)
+    total: Mapped[float] = mapped_column(Cents, nullable=False)
+    count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+
+
+def create_indexes(engine: Engine) -> list[str]:
+    """
+    Idempotent migration: builds every index declared on the models that is
+    missing from the database and refreshes the planner statistics.
+    Returns the names of the indexes that were created.
+    """
+    ensure(engine, Engine)
+    created = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not table.indexes:
+                continue
+            existing = {col["name"] for col in inspect(conn).get_columns(table.name)}
+            for index in table.indexes:
+                stmt = text("SELECT 1 FROM sqlite_master "
+                            "WHERE type = 'index' AND name = :name")
+                if conn.execute(stmt, {"name": index.name}).first():
+                    continue
+                # columns not added yet are left to their migration
+                if not {col.name for col in index.columns} <= existing:
+                    continue
+                index.create(conn)
+                created.append(index.name)
+        if created:
+            conn.execute(text("ANALYZE"))
+    return created
+
+
+#region ====================== monthly-aggregates ==============================
+
+_ADD_TO_AGGREGATE = """
+    INSERT INTO monthly_aggregates (period, currency, category, total, count)
+    VALUES (strftime('%Y-%m', NEW.date), NEW.currency, NEW.category, 
+            NEW.amount, 1)
+    ON CONFLICT (period, currency, category) DO UPDATE 
+    SET total = total + excluded.total, count = count + 1;
+"""
+_REMOVE_FROM_AGGREGATE = """
+    UPDATE monthly_aggregates 
+    SET total = total - OLD.amount, count = count - 1
+    WHERE period = strftime('%Y-%m', OLD.date) 
+      AND currency = OLD.currency AND category = OLD.category;
+    DELETE FROM monthly_aggregates 
+    WHERE period = strftime('%Y-%m', OLD.date) 
+      AND currency = OLD.currency AND category = OLD.category 
+      AND count <= 0;
+"""
+AGGREGATE_TRIGGERS = {
+    "trg_cuentas_aggregate_insert": 
+        f"AFTER INSERT ON cuentas BEGIN {_ADD_TO_AGGREGATE} END",
+    "trg_cuentas_aggregate_delete": 
+        f"AFTER DELETE ON cuentas BEGIN {_REMOVE_FROM_AGGREGATE} END",
+    "trg_cuentas_aggregate_update": 
+        f"AFTER UPDATE OF date, amount, currency, category ON cuentas "
+        f"BEGIN {_REMOVE_FROM_AGGREGATE} {_ADD_TO_AGGREGATE} END",
+}
+
+
+def create_aggregate_triggers(engine: Engine) -> None:
+    """Idempotent: creates the `monthly_aggregates` maintenance triggers."""
+    ensure(engine, Engine)
+    with engine.begin() as conn:
+        for name, body in AGGREGATE_TRIGGERS.items():
+            conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {name} {body}"))
+
+
+def rebuild_aggregates(engine: Engine) -> int:
+    """
+    Recomputes `monthly_aggregates` from scratch in a single transaction.
+    Returns the number of aggregated rows.
+    """
+    ensure(engine, Engine)
+    # closed years are part of the totals too
+    source = LEDGER_VIEW if closed_years(engine) else "cuentas"
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM monthly_aggregates"))
+        conn.execute(text(
+            "INSERT INTO monthly_aggregates "
+            "(period, currency, category, total, count) "
+            "SELECT strftime('%Y-%m', date), currency, category, "
+            f"sum(amount), count(*) FROM {source} "
+            "GROUP BY 1, 2, 3"
+        ))
+        count = conn.execute(
+            text("SELECT count(*) FROM monthly_aggregates")).scalar()
+    return count
+
+#endregion =====================================================================
+
+
+#region ======================== change-counter ================================
+
+# bumped, from any connection, by every edit or deletion of a mirrored 
+# column (see `cache.LedgerCache`) and every write to `conversions`; record
+# inserts leave it alone, they move the last id instead (see `data_version`)
+LEDGER_CHANGES = "ledger_changes"
+# the same, for edits of any column (see `cache.ResultCache`)
+LEDGER_WRITES = "ledger_writes"
+_COUNT_CHANGE = f"UPDATE {LEDGER_CHANGES} SET counter = counter + 1;"
+_COUNT_WRITE = f"UPDATE {LEDGER_WRITES} SET counter = counter + 1;"
+CHANGE_TRIGGERS = {
+    "trg_cuentas_change_update": 
+        f"AFTER UPDATE OF id, date, amount, currency, category ON cuentas "
+        f"BEGIN {_COUNT_CHANGE} END",
+    "trg_cuentas_change_delete": 
+        f"AFTER DELETE ON cuentas BEGIN {_COUNT_CHANGE} END",
+    **{
+        f"trg_conversions_change_{event.lower()}": 
+            f"AFTER {event} ON conversions BEGIN {_COUNT_CHANGE} END"
+        for event in ("INSERT", "UPDATE", "DELETE")
+    },
+    # separate triggers, so ledgers that already have the ones above get them
+    "trg_cuentas_write_update": 
+        f"AFTER UPDATE ON cuentas BEGIN {_COUNT_WRITE} END",
+    "trg_cuentas_write_delete": 
+        f"AFTER DELETE ON cuentas BEGIN {_COUNT_WRITE} END",
+    **{
+        f"trg_conversions_write_{event.lower()}": 
+            f"AFTER {event} ON conversions BEGIN {_COUNT_WRITE} END"
+        for event in ("INSERT", "UPDATE", "DELETE")
+    },
+}
+
+
+def create_change_counter(engine: Engine) -> None:
+    """Idempotent: creates `ledger_changes`, `ledger_writes` and triggers."""
+    ensure(engine, Engine)
+    with engine.begin() as conn:
+        for counter in (LEDGER_CHANGES, LEDGER_WRITES):
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {counter} (id INTEGER PRIMARY KEY "
+                f"CHECK (id = 1), counter INTEGER NOT NULL)"
+            ))
+            conn.execute(text(
+                f"INSERT OR IGNORE INTO {counter} (id, counter) VALUES (1, 0)"))
+        for name, body in CHANGE_TRIGGERS.items():
+            conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {name} {body}"))
+
+
+def ledger_changes(conn: Engine | Connection) -> int:
+    """Changes counted in `LEDGER_CHANGES` since `create_change_counter`."""
+    with (conn.connect() if isinstance(conn, Engine) else nullcontext(conn)) as c:
+        return c.execute(
+            text(f"SELECT counter FROM {LEDGER_CHANGES}")).scalar() or 0
+
+
+def data_version(
+        conn: Engine | Connection, 
+        counter: str = LEDGER_WRITES
+) -> tuple[int, int]:
+    """
+    Version of the stored ledger, the same on every connection, unlike 
+    `PRAGMA data_version`: the last id handed to a record, which only grows
+    as records are added (closed years included), and `counter`, which 
+    counts every other write: `LEDGER_WRITES` (the default) moves on any 
+    edit, `LEDGER_CHANGES` only on edits of mirrored columns. Two lookups, 
+    no scan.
+    """
+    with (conn.connect() if isinstance(conn, Engine) else nullcontext(conn)) as c:
+        # ids of records routed to closed years are reserved in 
+        # sqlite_sequence, which exists once a year is closed
+        last = "SELECT seq FROM sqlite_sequence WHERE name = 'cuentas'" \
+               if closed_years(c) else "SELECT max(id) FROM cuentas"
+        last_id, changes = c.execute(text(
+            f"SELECT ({last}), (SELECT counter FROM {counter})")).one()
+    return last_id or 0, changes or 0
+
+#endregion =====================================================================
+
+
+#region ======================= description-search =============================
+
+# external-content FTS5 index over cuentas.description, rowid = cuentas.id
+DESCRIPTION_FTS = table("cuentas_fts", column("rowid"), column("description"))
+
+_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS cuentas_fts USING fts5("
+    "description, content='cuentas', content_rowid='id')"
+)
+_FTS_INSERT = (
+    "INSERT INTO cuentas_fts (rowid, description) "
+    "VALUES (NEW.id, NEW.description);"
+)
+_FTS_DELETE = (
+    "INSERT INTO cuentas_fts (cuentas_fts, rowid, description) "
+    "VALUES ('delete', OLD.id, OLD.description);"
+)
+FTS_TRIGGERS = {
+    "trg_cuentas_fts_insert": 
+        f"AFTER INSERT ON cuentas BEGIN {_FTS_INSERT} END",
+    "trg_cuentas_fts_delete": 
+        f"AFTER DELETE ON cuentas BEGIN {_FTS_DELETE} END",
+    "trg_cuentas_fts_update": 
+        f"AFTER UPDATE OF id, description ON cuentas "
+        f"BEGIN {_FTS_DELETE} {_FTS_INSERT} END",
+}
+
+
+def fts5_available(engine: Engine) -> bool:
+    """Whether the sqlite library behind `engine` was compiled with FTS5."""
+    ensure(engine, Engine)
+    with engine.connect() as conn:
+        options = conn.execute(text("PRAGMA compile_options")).scalars().all()
+    return "ENABLE_FTS5" in options
+
+
+def has_description_index(engine: Engine) -> bool:
+    """Whether `cuentas_fts` exists, i.e. `desc match` can use FTS5."""
+    ensure(engine, Engine)
+    return inspect(engine).has_table(DESCRIPTION_FTS.name)
+
+
+def create_description_index(engine: Engine) -> bool:
+    """
+    Idempotent: creates `cuentas_fts` and its sync triggers, populating it 
+    when it is new. Returns False (and does nothing) without FTS5 support.
+    """
+    if not fts5_available(engine):
+        return False
+    populate = not has_description_index(engine)
+    with engine.begin() as conn:
+        conn.execute(text(_FTS_DDL))
+        for name, body in FTS_TRIGGERS.items():
+            conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {name} {body}"))
+        if populate:
+            conn.execute(text(
+                "INSERT INTO cuentas_fts (cuentas_fts) VALUES ('rebuild')"))
+    return True
+
+#endregion =====================================================================
+
+
+#region =========================== bulk-load ==================================
+
+# loads below this many rows keep their per-row triggers: suspending them is
+# a schema change, which invalidates prepared statements on every connection
+DEFERRED_TRIGGERS_MIN_ROWS = 5_000
+# per-row AFTER INSERT triggers replaced by set-based statements on bulk loads
+_DEFERRED_TRIGGERS = {
+    **{k: v for k, v in AGGREGATE_TRIGGERS.items() if "AFTER INSERT" in v},
+    **{k: v for k, v in FTS_TRIGGERS.items() if "AFTER INSERT" in v},
+}
+# `source` is `cuentas` or a closed-year partition, see `route_records`
+_CATCH_UP = {
+    "trg_cuentas_aggregate_insert": 
+        "INSERT INTO monthly_aggregates "
+        "(period, currency, category, total, count) "
+        "SELECT strftime('%Y-%m', date), currency, category, "
+        "sum(amount), count(*) FROM {source} WHERE id > :last_id "
+        "GROUP BY 1, 2, 3 "
+        "ON CONFLICT (period, currency, category) DO UPDATE "
+        "SET total = total + excluded.total, count = count + excluded.count",
+    "trg_cuentas_fts_insert": 
+        "INSERT INTO cuentas_fts (rowid, description) "
+        "SELECT id, description FROM {source} WHERE id > :last_id",
+}
+
+
+def begin_explicitly(conn: Connection) -> None:
+    """
+    Opens the sqlite transaction of `conn` unless the driver already has.
+    pysqlite only emits its implicit BEGIN before DML, so DDL issued first
+    would autocommit and survive a rollback.
+    """
+    if not conn.connection.driver_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN")
+
+
+@contextmanager
+def _suspended_triggers(
+        conn: Connection, 
+        triggers: dict[str, str]
+) -> Iterator[list[str]]:
+    """
+    Drops the existing `triggers` (name: body) and recreates them on exit.
+    Yields the names actually dropped. `conn` must be inside a transaction, 
+    so a rollback restores them.
+    """
+    begin_explicitly(conn)
+    existing = set(conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+    )).scalars())
+    suspended = [name for name in triggers if name in existing]
+    for name in suspended:
+        conn.execute(text(f"DROP TRIGGER {name}"))
+    yield suspended
+    for name in suspended:
+        conn.execute(text(f"CREATE TRIGGER {name} {triggers[name]}"))
+
+
+@contextmanager
+def deferred_insert_triggers(conn: Connection, rows: int) -> Iterator[int]:
+    """
+    Drops the per-row insert triggers of `cuentas` while a bulk load of 
+    `rows` runs and brings `monthly_aggregates` / `cuentas_fts` up to date 
+    with one statement each afterwards. Loads below 
+    `DEFERRED_TRIGGERS_MIN_ROWS` keep their triggers. Yields `max(id)` 
+    before the load; every row above it is treated as new. `conn` must be 
+    inside a transaction, so a failed load restores the triggers on rollback.
+    """
+    ensure(conn, Connection)
+    ensure(rows, int)
+    triggers = _DEFERRED_TRIGGERS if rows >= DEFERRED_TRIGGERS_MIN_ROWS else {}
+    with _suspended_triggers(conn, triggers) as deferred:
+        last_id = conn.execute(
+            text("SELECT max(id) FROM cuentas")).scalar() or 0
+        yield last_id
+        for name in deferred:
+            conn.execute(text(_CATCH_UP[name].format(source="cuentas")), 
+                         {"last_id": last_id})
+
+#endregion =====================================================================
+
+
+#region ======================== cents-storage =================================
+
+AMOUNT_COLUMNS = {
+    "cuentas": ["amount"],
+    "conversions": ["base_amount", "target_amount"],
+}
+
+
+def sync_amount_storage(engine: Engine) -> int:
+    """
+    Detects how `cuentas.amount` is stored and records the scale on the 
+    engine's dialect, so `Cents` binds and reads accordingly. 
+    Legacy `NUMERIC(10, 2)` columns resolve to `LEGACY_SCALE`, anything else 
+    (including a fresh database) to `CENTS_SCALE`.
+    """
+    ensure(engine, Engine)
+    scale = CENTS_SCALE
+    insp = inspect(engine)
+    if insp.has_table(Record.__tablename__):
+        for column in insp.get_columns(Record.__tablename__):
+            if column["name"] == "amount" and "NUMERIC" in str(column["type"]):
+                scale = LEGACY_SCALE
+    engine.dialect.amount_scale = scale
+    return scale
+
+
+def _shadow_table(table: Table, name: str, **kwargs: Any) -> Table:
+    """
+    Index-less copy of `table` with the current column types. `kwargs` go to
+    `Table` (`schema`, `sqlite_autoincrement`, ...).
+    """
+    columns = [
+        Column(col.name, col.type, 
+               primary_key=col.primary_key, 
+               nullable=col.nullable)
+        for col in table.columns
+    ]
+    return Table(name, MetaData(), *columns, **kwargs)
+
+
+def _migrate_table_to_cents(
+        engine: Engine,
+        table: Table,
+        chunksize: int,
+) -> int:
+    """
+    Copies `table` into an integer-amount shadow table in `chunksize` batches,
+    committing after each one, and swaps it in at the end. Rerunning after an 
+    interruption resumes from the last copied id.
+    """
+    shadow = _shadow_table(table, f"_{table.name}_cents")
+    shadow.create(engine, checkfirst=True)
+
+    # legacy tables predate the columns added by later migrations
+    existing = {col["name"] for col in inspect(engine).get_columns(table.name)}
+    names = [col.name for col in table.columns if col.name in existing]
+    cents = AMOUNT_COLUMNS[table.name]
+    projection = ", ".join(
+        f"CAST(ROUND({name} * {CENTS_SCALE}) AS INTEGER)" if name in cents 
+        else name
+        for name in names
+    )
+    copy = text(
+        f"INSERT INTO {shadow.name} ({', '.join(names)}) "
+        f"SELECT {projection} FROM {table.name} "
+        f"WHERE id > :last ORDER BY id LIMIT :chunksize"
+    )
+    last_id = text(f"SELECT coalesce(max(id), 0) FROM {shadow.name}")
+
+    copied = 0
+    while True:
+        with engine.begin() as conn:
+            last = conn.execute(last_id).scalar()
+            rowcount = conn.execute(
+                copy, {"last": last, "chunksize": chunksize}).rowcount
+            # where the next chunk resumes
+            last = conn.execute(last_id).scalar()
+        if rowcount <= 0:
+            break
+        copied += rowcount
+        print(f"{table.name}: {copied} rows migrated (last id: {last}).")
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {table.name}"))
+        conn.execute(text(f"ALTER TABLE {shadow.name} RENAME TO {table.name}"))
+    return copied
+
+
+def migrate_amounts_to_cents(
+        engine: Engine,
+        chunksize: int = 50_000
+) -> int:
+    """
+    Chunked migration from the legacy `Numeric(10, 2)` amount columns to 
+    integer cents. Idempotent: ledgers already in cents are left untouched.
+    Returns the number of copied rows.
+    """
+    ensure(engine, Engine)
+    ensure(chunksize, int)
+
+    insp = inspect(engine)
+    copied = 0
+    for table in (Record.__table__, Conversion.__table__):
+        shadow = f"_{table.name}_cents"
+        # resume a swap interrupted between drop and rename
+        if not insp.has_table(table.name) and insp.has_table(shadow):
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {shadow} RENAME TO {table.name}"))
+            continue
+        if not insp.has_table(table.name):
+            continue
+        amount_type = {
+            col["name"]: str(col["type"]) 
+            for col in insp.get_columns(table.name)
+        }[AMOUNT_COLUMNS[table.name][0]]
+        if "NUMERIC" in amount_type:
+            copied += _migrate_table_to_cents(engine, table, chunksize)
+
+    # dropping the legacy tables dropped their triggers too
+    create_tables(engine)
+    rebuild_aggregates(engine)
+    return copied
+
+#endregion =====================================================================
+
+
+#region ======================== year-partitions ===============================
+
+# closed years live in `<ledger>.<year><suffix>`, attached as `y<year>`
+# `cuentas` keeps the open years; plots keep reading `monthly_aggregates`,
+# which (like `cuentas_fts`) still covers the closed years
+LEDGER_VIEW = "ledger"
+
+
+def closed_years(engine: Engine | Connection) -> tuple[int, ...]:
+    """Years moved out of `cuentas` by `close_year`, oldest first."""
+    return getattr(engine.dialect, "partition_years", ())
+
+
+def partition_schema(year: int) -> str:
+    return f"y{year}"
+
+
+def _ledger_path(engine: Engine) -> Optional[Path]:
+    database = engine.url.database
+    if not database or database == ":memory:":
+        return None
+    return Path(database)
+
+
+def partition_path(engine: Engine, year: int) -> Path:
+    """File holding the closed `year` of the ledger behind `engine`."""
+    ensure(engine, Engine)
+    ensure(year, int)
+    if (ledger := _ledger_path(engine)) is None:
+        raise ValueError("Year partitions need a file-backed ledger.")
+    return ledger.with_name(f"{ledger.stem}.{year}{ledger.suffix}")
+
+
+@lru_cache(maxsize=None)
+def partition_table(year: int) -> Table:
+    """`cuentas` inside the partition of `year`."""
+    return _shadow_table(Record.__table__, Record.__tablename__, 
+                         schema=partition_schema(year))
+
+
+def _set_closed_years(engine: Engine, years: Iterable[int]) -> None:
+    """
+    Records `years` on the engine's dialect, like `sync_amount_storage`, and
+    reconnects so every connection attaches them (see `attach_partitions`).
+    """
+    if not hasattr(engine.dialect, "partition_years"):
+        @event.listens_for(engine, "connect")
+        def _on_connect(dbapi_connection, _connection_record) -> None:
+            years = closed_years(engine)
+            if not years:
+                return
+            cursor = dbapi_connection.cursor()
+            for year in years:
+                cursor.execute(f"ATTACH DATABASE ? AS {partition_schema(year)}", 
+                               (str(partition_path(engine, year)),))
+            # for raw `sql:` queries; `read_frame` prunes by date instead
+            union = " UNION ALL ".join(
+                ["SELECT * FROM main.cuentas"] + 
+                [f"SELECT * FROM {partition_schema(y)}.cuentas" for y in years]
+            )
+            # temp objects count as writes for `query_only` (read engine)
+            query_only, = cursor.execute("PRAGMA query_only").fetchone()
+            cursor.execute("PRAGMA query_only = OFF")
+            cursor.execute(f"CREATE TEMP VIEW {LEDGER_VIEW} AS {union}")
+            cursor.execute(f"PRAGMA query_only = {query_only}")
+            cursor.close()
+    engine.dialect.partition_years = tuple(sorted(years))
+    engine.dispose()
+
+
+def attach_partitions(engine: Engine) -> tuple[int, ...]:
+    """
+    Finds the year partitions next to the ledger file and attaches them to 
+    every connection of `engine`. Returns the closed years.
+    """
+    ensure(engine, Engine)
+    if (ledger := _ledger_path(engine)) is None:
+        return ()
+    years = []
+    for path in ledger.parent.glob(f"{ledger.stem}.*{ledger.suffix}"):
+        year = path.name[len(ledger.stem) + 1:len(path.name) - len(ledger.suffix)]
+        if year.isdigit() and len(year) == 4:
+            years.append(int(year))
+    if years or hasattr(engine.dialect, "partition_years"):
+        _set_closed_years(engine, years)
+    return closed_years(engine)
+
+
+def _has_autoincrement(conn: Connection) -> bool:
+    ddl = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'cuentas'"
+    )).scalar()
+    return "AUTOINCREMENT" in (ddl or "").upper()
+
+
+def _ensure_autoincrement(engine: Engine) -> None:
+    """
+    Rebuilds a `cuentas` created before ids were declared AUTOINCREMENT. 
+    Otherwise sqlite reuses `max(id) + 1`, which may belong to a closed year.
+    """
+    with engine.begin() as conn:
+        if _has_autoincrement(conn):
+            return
+        shadow = _shadow_table(Record.__table__, "_cuentas_autoincrement", 
+                               sqlite_autoincrement=True)
+        begin_explicitly(conn)
+        shadow.create(conn)
+        conn.execute(text(f"INSERT INTO {shadow.name} SELECT * FROM cuentas"))
+        # DROP TABLE fires no triggers: aggregates and FTS rows are kept
+        conn.execute(text("DROP TABLE cuentas"))
+        conn.execute(text(f"ALTER TABLE {shadow.name} RENAME TO cuentas"))
+    create_tables(engine)
+
+
+def _partition_ids(conn: Connection, ids: Iterable[int]) -> dict[int, int]:
+    """Maps every id in `ids` stored in a closed year to that year."""
+    ids = list(ids)
+    found = {}
+    for year in closed_years(conn):
+        table = partition_table(year)
+        for id_ in conn.execute(
+                select(table.c.id).where(table.c.id.in_(ids))).scalars():
+            found[id_] = year
+    return found
+
+
+def check_writable(
+        conn: Connection,
+        ids: Iterable[int] = (),
+        dates: Iterable[datetime.date] = (),
+) -> None:
+    """
+    Raises ValueError if an edit touches a closed year: any of `ids` stored 
+    in a partition, or any of `dates` falling in a closed year.
+    """
+    years = closed_years(conn)
+    if not years:
+        return
+    errors = [
+        f"record {id_} belongs to closed year {year}"
+        for id_, year in _partition_ids(conn, ids).items()
+    ]
+    errors += [
+        f"year {year} is closed" 
+        for year in sorted({d.year for d in dates} & set(years))
+    ]
+    if errors:
+        raise ValueError(f"Cannot edit closed years: {', '.join(errors)}. "
+                         f"Reopen them with `open_year` first.")
+
+
+def _reserve_ids(conn: Connection, count: int) -> int:
+    """
+    Bumps the AUTOINCREMENT counter of `cuentas` by `count`, so those ids are 
+    never handed out again. Returns the last id before the reservation.
+    """
+    seq = conn.execute(text(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'cuentas'")).scalar()
+    if seq is None:
+        seq = conn.execute(text(
+            f"SELECT coalesce(max(id), 0) FROM {LEDGER_VIEW}")).scalar()
+        conn.execute(text(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES ('cuentas', :seq)"
+        ), {"seq": seq + count})
+    else:
+        conn.execute(text(
+            "UPDATE sqlite_sequence SET seq = :seq WHERE name = 'cuentas'"
+        ), {"seq": seq + count})
+    return seq
+
+
+def route_records(conn: Connection, rows: list[dict[str, Any]]) -> list[int]:
+    """
+    Inserts new records (`date` as `datetime.date`) into the partitions of 
+    their closed years, keeping `monthly_aggregates` and `cuentas_fts` in 
+    sync. Returns the assigned ids, in `rows` order.
+    """
+    ensure(conn, Connection)
+    triggers = set(conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+    )).scalars())
+    ids: list[int] = [0] * len(rows)
+    by_year: dict[int, list[int]] = {}
+    for position, row in enumerate(rows):
+        by_year.setdefault(row["date"].year, []).append(position)
+
+    for year, positions in by_year.items():
+        if year not in closed_years(conn):
+            raise ValueError(f"Year {year} is not closed.")
+        last_id = _reserve_ids(conn, len(positions))
+        batch = []
+        for offset, position in enumerate(positions, start=1):
+            ids[position] = last_id + offset
+            batch.append(rows[position] | {
+                "id": last_id + offset,
+                "fingerprint": _row_fingerprint(rows[position]),
+            })
+        table = partition_table(year)
+        conn.execute(table.insert(), batch)
+        source = f"{partition_schema(year)}.cuentas"
+        # what the insert triggers of `cuentas` would have done
+        for name in triggers & set(_CATCH_UP):
+            conn.execute(text(_CATCH_UP[name].format(source=source)), 
+                         {"last_id": last_id})
+    return ids
+
+
+def _refuse_during_migration(engine: Engine) -> None:
+    """
+    Raises ValueError while a migration is half applied: its steps were 
+    numbered against the closed years it started with, so closing or 
+    reopening one would shift them on resume (see `migrations.MigrationRun`).
+    """
+    # `migrations.SCHEMA_VERSION`, which can't be imported from here
+    if not inspect(engine).has_table("schema_version"):
+        return
+    with engine.connect() as conn:
+        interrupted = conn.execute(text(
+            "SELECT version, name FROM schema_version WHERE applied_at IS NULL"
+        )).first()
+    if interrupted is not None:
+        raise ValueError(
+            f"Migration {interrupted.version} ({interrupted.name}) was "
+            f"interrupted. Finish it with `migrate` first.")
+
+
+def close_year(engine: Engine, year: int) -> int:
+    """
+    Moves the records of `year` out of `cuentas` into their own database 
+    file (`partition_path`), attached to every connection. Returns the 
+    number of moved records.
+
+    Notes
+    -----
+    - `monthly_aggregates` and `cuentas_fts` keep the moved records.
+    - Edits and deletions of closed years are refused until `open_year`; 
+    new records dated in a closed year are routed to its partition.
+    - With `journal_mode=WAL` the commit is atomic per file only: rows are 
+    copied before being deleted, so an interruption may duplicate but 
+    never lose them.
+    - Refused while a migration is interrupted, like `open_year`.
+    """
+    ensure(engine, Engine)
+    ensure(year, int)
+    path = partition_path(engine, year)
+    years = closed_years(engine)
+    if year in years:
+        print(f"Year {year} is already closed ({path}).")
+        return 0
+    _refuse_during_migration(engine)
+
+    _ensure_autoincrement(engine)
+    is_new = not path.exists()
+    _set_closed_years(engine, years + (year,))
+    table = partition_table(year)
+    bounds = {"lower": f"{year}-01-01", "upper": f"{year + 1}-01-01"}
+    delete_triggers = {
+        name: body 
+        for name, body in (AGGREGATE_TRIGGERS | FTS_TRIGGERS).items()
+        if "AFTER DELETE" in body
+    }
+    try:
+        with engine.begin() as conn:
+            with _suspended_triggers(conn, delete_triggers):
+                table.create(conn, checkfirst=True)
+                for index, column in (("ix_cuentas_date", "date"), 
+                                      ("ix_cuentas_fingerprint", "fingerprint")):
+                    conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS "
+                        f"{partition_schema(year)}.{index} ON cuentas ({column})"
+                    ))
+                moved = conn.execute(text(
+                    f"INSERT INTO {partition_schema(year)}.cuentas "
+                    f"SELECT * FROM main.cuentas "
+                    f"WHERE date >= :lower AND date < :upper"
+                ), bounds).rowcount
+                conn.execute(text(
+                    "DELETE FROM main.cuentas "
+                    "WHERE date >= :lower AND date < :upper"
+                ), bounds)
+    except BaseException:
+        _set_closed_years(engine, years)
+        if is_new:
+            path.unlink(missing_ok=True)
+        raise
+    bump_ledger_version(engine)
+    print(f"Year {year} closed: {moved} records moved to {path}.")
+    return moved
+
+
+def open_year(engine: Engine, year: int) -> int:
+    """
+    Inverse of `close_year`: moves the records of `year` back into `cuentas`
+    and deletes its partition file. Returns the number of moved records.
+    """
+    ensure(engine, Engine)
+    ensure(year, int)
+    years = closed_years(engine)
+    if year not in years:
+        raise ValueError(f"Year {year} is not closed. Closed: {list(years)}.")
+    _refuse_during_migration(engine)
+
+    with engine.begin() as conn:
+        # aggregates and FTS already hold these records
+        with _suspended_triggers(conn, _DEFERRED_TRIGGERS):
+            moved = conn.execute(text(
+                f"INSERT INTO main.cuentas "
+                f"SELECT * FROM {partition_schema(year)}.cuentas"
+            )).rowcount
+    _set_closed_years(engine, [y for y in years if y != year])
+    path = partition_path(engine, year)
+    path.unlink()
+    bump_ledger_version(engine)
+    print(f"Year {year} reopened: {moved} records moved back from {path}.")
+    return moved
+
+
+def compact_partition(engine: Engine, year: int) -> None:
+    """Runs VACUUM on the partition of the closed `year` only."""
+    ensure(engine, Engine)
+    ensure(year, int)
+    if year not in closed_years(engine):
+        raise ValueError(f"Year {year} is not closed.")
+    with engine.connect() as conn:
+        conn.exec_driver_sql(f"VACUUM {partition_schema(year)}")
+
+
+def backup_partition(engine: Engine, year: int, target: Path) -> Path:
+    """Online copy of the partition of the closed `year` into `target`."""
+    ensure(engine, Engine)
+    ensure(year, int)
+    if year not in closed_years(engine):
+        raise ValueError(f"Year {year} is not closed.")
+    raw = engine.raw_connection()
+    try:
+        with sqlite3.connect(target) as dest:
+            raw.driver_connection.backup(dest, name=partition_schema(year))
+    finally:
+        raw.close()
+    return Path(target)
+
+#endregion =====================================================================
 
 
 def create_tables(engine: Engine) -> None:
-    Base.metadata.create_all(engine, checkfirst=True)
\ No newline at end of file
+    """
+    Creates missing tables and migrates missing indexes and triggers on 
+    existing ones. A freshly created `monthly_aggregates` is backfilled.
+    """
+    aggregates = MonthlyAggregate.__tablename__
+    backfill = not inspect(engine).has_table(aggregates)
+    Base.metadata.create_all(engine, checkfirst=True)
+    create_indexes(engine)
+    create_aggregate_triggers(engine)
+    create_change_counter(engine)
+    create_description_index(engine)
+    sync_amount_storage(engine)
+    if backfill:
+        rebuild_aggregates(engine)
+    attach_partitions(engine)
\ No newline at end of file
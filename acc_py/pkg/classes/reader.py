@@ -0,0 +1,503 @@
+"""
+DataFrame readers for ledger queries. Every `pd.read_sql` in the interfaces
+should go through `read_frame`, so storage details (like integer cents) are 
+resolved in one place.
+"""
+from typing import Any, Optional, Iterator
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import date
+from functools import lru_cache
+from time import perf_counter
+import operator
+import sqlite3
+import re
+
+import pandas as pd
+from sqlalchemy import (
+    Select, Integer, Label, FromClause, ColumnElement,
+    type_coerce, select, union_all, bindparam, event, text, func, cast,
+)
+from sqlalchemy.engine import Engine, Connection
+from sqlalchemy.sql.elements import (
+    TextClause, BinaryExpression, BooleanClauseList, BindParameter, ColumnClause,
+)
+from sqlalchemy.sql.visitors import replacement_traverse
+
+from pkg.classes.model import (
+    Record, Cents, AMOUNT_COLUMNS, LEDGER_VIEW,
+    amount_scale, closed_years, partition_table,
+)
+from pkg.utilities.core import ensure, pprint_df, soft_warning
+
+_LOWER_BOUNDS = (operator.ge, operator.gt)
+_UPPER_BOUNDS = (operator.le, operator.lt)
+
+# leading WITH of a text statement, see `_scaled_tables`
+_WITH = re.compile(r"\s*with(\s+recursive)?\s", re.IGNORECASE)
+
+# julian day number of 1970-01-01T00:00
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+# `explain` warns on full scans of ledgers larger than this
+SCAN_WARNING_ROWS = 100_000
+# plan detail of a full pass over cuentas or one of its partitions
+_LEDGER_SCAN = re.compile(r"^SCAN (\w+\.)?cuentas\b")
+
+# sqlite VM instructions between two time budget checks
+PROGRESS_STEPS = 1_000
+# reads cancelled since startup, by reason ("timeouts", "interrupts")
+CANCELLED = Counter()
+
+
+# memoized: prebuilt statements (see `statements.prepared`) are rewritten once
+@lru_cache(maxsize=256)
+def _raw_cents_columns(stmt: Select) -> tuple[Select, list[str]]:
+    """
+    Swaps every `Cents` column in `stmt` for its raw integer value, so the
+    result processor is skipped. Returns the new stmt and the swapped names.
+    """
+    columns = []
+    swapped = []
+    for col in stmt.selected_columns:
+        if isinstance(col.type, Cents):
+            inner = col.element if isinstance(col, Label) else col
+            col = type_coerce(inner, Integer).label(col.key)
+            swapped.append(col.key)
+        columns.append(col)
+    if not swapped:
+        return stmt, swapped
+    return stmt.with_only_columns(*columns, maintain_column_froms=True), swapped
+
+
+def _date_bounds(
+        stmt: Select,
+        params: Optional[dict[str, Any]] = None,
+) -> tuple[Optional[str], Optional[str]]:
+    """
+    Tightest `Record.date` bounds (as ISO strings) among the top-level AND 
+    terms of the WHERE clause of `stmt`, as set by `date_range_filter`. 
+    Value-less `bindparam`s are looked up in `params`.
+    """
+    params = params or {}
+    lower = upper = None
+    terms = [] if stmt.whereclause is None else [stmt.whereclause]
+    while terms:
+        term = terms.pop()
+        if (isinstance(term, BooleanClauseList) 
+                and term.operator is operator.and_):
+            terms.extend(term.clauses)
+            continue
+        if not (isinstance(term, BinaryExpression) 
+                and isinstance(term.right, BindParameter)):
+            continue
+        column = getattr(term.left, "clause", term.left)
+        if not column.compare(Record.__table__.c.date):
+            continue
+        value = term.right.effective_value
+        if value is None:
+            value = params.get(term.right.key)
+        if value is None:
+            continue
+        value = value.isoformat() if isinstance(value, date) else str(value)
+        # `< 2024-01-01` ends in 2023
+        if (term.operator is operator.lt and value[:4].isdigit() 
+                and value[4:] in ("", "-", "-01-01")):
+            value = f"{int(value[:4]) - 1}-12-31"
+        if term.operator in _LOWER_BOUNDS:
+            lower = value if lower is None else max(lower, value)
+        elif term.operator in _UPPER_BOUNDS:
+            upper = value if upper is None else min(upper, value)
+    return lower, upper
+
+
+def _partition_source(
+        years: tuple[int, ...],
+        lower: Optional[str],
+        upper: Optional[str],
+) -> Optional[FromClause]:
+    """
+    `cuentas` plus the closed-year partitions overlapping [lower, upper], 
+    or None when only `cuentas` is needed. Bounds are treated inclusively.
+    """
+    first = int(lower[:4]) if lower else min(years)
+    last = int(upper[:4]) if upper else max(years)
+    pruned = [year for year in years if first <= year <= last]
+    needs_main = any(year not in years for year in range(first, last + 1)) \
+                 or upper is None or lower is None
+    if not pruned:
+        return None
+    tables = [Record.__table__] if needs_main else []
+    tables += [partition_table(year) for year in pruned]
+    if len(tables) == 1:
+        return tables[0].alias("cuentas_partitions")
+    return union_all(*(select(*t.c) for t in tables)) \
+           .subquery("cuentas_partitions")
+
+
+def with_partitions(
+        stmt: Select, 
+        engine: Engine | Connection,
+        params: Optional[dict[str, Any]] = None,
+) -> Select:
+    """
+    Points every `cuentas` reference of `stmt` at the partitions its date 
+    bounds overlap (see `close_year`). Unchanged while no year is closed.
+    """
+    if not (years := closed_years(engine)):
+        return stmt
+    source = _partition_source(years, *_date_bounds(stmt, params))
+    if source is None:
+        return stmt
+
+    # matched explicitly rather than through `ClauseAdapter`: the source's
+    # columns proxy its first table, a partition when `cuentas` isn't read
+    def _replace(element: Any, **_: Any) -> Optional[Any]:
+        if isinstance(element, FromClause) and _is_ledger(element):
+            return source
+        if (isinstance(element, ColumnClause) 
+                and _is_ledger(getattr(element, "table", None))):
+            return source.c[element.key]
+        return None
+
+    return replacement_traverse(stmt, {}, _replace)
+
+
+def _is_ledger(element: Any) -> bool:
+    """Whether `element` is the `cuentas` table, ORM-annotated or not."""
+    table = Record.__table__
+    return element is table or (
+        hasattr(element, "_deannotate") and element._deannotate() is table)
+
+
+def epoch_days(column: ColumnElement) -> Label:
+    """
+    ISO date `column` as integer days since 1970-01-01, computed by sqlite.
+    Read as is, pandas turns them into datetimes in one vectorized cast 
+    (`pd.to_datetime(days, unit='D')`) instead of parsing text row by row.
+    """
+    days = cast(func.julianday(column) - UNIX_EPOCH_JULIAN_DAY, Integer)
+    return type_coerce(days, Integer).label(column.key)
+
+
+def _scaled_tables(
+        stmt: TextClause, 
+        engine: Engine | Connection,
+) -> TextClause:
+    """
+    `stmt` with `cuentas`, `conversions` and the `ledger` view of closed 
+    years shadowed by CTEs of the same name that divide their amounts by the
+    storage scale, so every column derived from them (`sum(amount)`, 
+    `amount * 2 AS x`...) is in currency units. sqlite flattens them into 
+    the query: indexes are still used. Schema-qualified names 
+    (`main.cuentas`) still read the stored units.
+    """
+    scale = float(amount_scale(engine.dialect))
+    # (name, what it reads, table its columns come from)
+    shadowed = [(name, f"main.{name}", name) for name in AMOUNT_COLUMNS]
+    if closed_years(engine):
+        shadowed.append((LEDGER_VIEW, f"temp.{LEDGER_VIEW}", 
+                         Record.__tablename__))
+    ctes = []
+    for name, source, table in shadowed:
+        amounts = AMOUNT_COLUMNS[table]
+        names = Record.metadata.tables[table].columns.keys()
+        columns = ", ".join(f"{c} / {scale!r} AS {c}" if c in amounts else c
+                            for c in names)
+        ctes.append(f"{name} AS (SELECT {columns} FROM {source})")
+    sql = stmt.text
+    # the statement's own CTEs follow ours
+    if match := _WITH.match(sql):
+        recursive = " RECURSIVE" if match.group(1) else ""
+        return text(f"WITH{recursive} {', '.join(ctes)}, {sql[match.end():]}")
+    return text(f"WITH {', '.join(ctes)} {sql}")
+
+
+def _prepare(
+        stmt: Select | TextClause,
+        engine: Engine | Connection,
+        params: Optional[dict[str, Any]] = None,
+) -> tuple[Select | TextClause, list[str]]:
+    """The statement `read_frame` actually runs, and its raw cents columns."""
+    if isinstance(stmt, TextClause):
+        return _scaled_tables(stmt, engine), []
+    stmt, swapped = _raw_cents_columns(stmt)
+    stmt = with_partitions(stmt, engine, params)
+    return stmt, swapped
+
+
+def _scale_amounts(
+        df: pd.DataFrame,
+        swapped: list[str],
+        engine: Engine | Connection,
+) -> pd.DataFrame:
+    """Raw minor units of the `swapped` columns of `df` as float amounts."""
+    scale = amount_scale(engine.dialect)
+    for name in swapped:
+        if name in df.columns:
+            df[name] = df[name].astype("float64") / scale
+    return df
+
+
+#region ========================= query plans ==================================
+
+def set_scan_warning_rows(engine: Engine, rows: int) -> None:
+    """
+    Records on the engine's dialect, like `amount_scale`, the ledger size 
+    above which `explain_plan` warns on full scans.
+    """
+    ensure(rows, int)
+    engine.dialect.scan_warning_rows = rows
+
+
+def scan_warning_rows(engine: Engine | Connection) -> int:
+    return getattr(engine.dialect, "scan_warning_rows", SCAN_WARNING_ROWS)
+
+
+def ledger_size_estimate(conn: Engine | Connection) -> int:
+    """
+    Records in the ledger, estimated as the largest id of `cuentas`: a single
+    lookup at the end of its rowid b-tree, where `count(*)` would be a full
+    pass. Ids are never reused, so deletions make it an upper bound.
+    """
+    with (conn.connect() if isinstance(conn, Engine) else nullcontext(conn)) as c:
+        return c.execute(text("SELECT max(id) FROM cuentas")).scalar() or 0
+
+
+def explain_plan(
+        stmt: Select | TextClause,
+        engine: Engine | Connection,
+        params: Optional[dict[str, Any]] = None,
+) -> pd.DataFrame:
+    """
+    `EXPLAIN QUERY PLAN` of `stmt` as `read_frame` would run it (cents and 
+    partition rewrites included, same bound parameters), without running it.
+    Pretty-prints the plan and emits a `soft_warning` for every full scan of
+    `cuentas` while it holds more than `scan_warning_rows(engine)` rows 
+    (see `ledger_size_estimate`).
+    Returns the plan (`id`, `parent`, `notused`, `detail`).
+    """
+    stmt, _ = _prepare(stmt, engine, params)
+    plan = []
+
+    def _explain(conn, cursor, statement, parameters, context, executemany):
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        plan.extend(cursor.fetchall())
+        # the statement itself never runs
+        return "SELECT NULL WHERE 0", ()
+
+    with engine.connect() as conn:
+        event.listen(conn, "before_cursor_execute", _explain, retval=True)
+        conn.execute(stmt, params or {}).close()
+        event.remove(conn, "before_cursor_execute", _explain)
+        scans = [detail for *_, detail in plan if _LEDGER_SCAN.match(detail)]
+        rows = ledger_size_estimate(conn) if scans else 0
+
+    df = pd.DataFrame(plan, columns=["id", "parent", "notused", "detail"])
+    pprint_df(df[["id", "parent", "detail"]], header="Query plan")
+    if rows > (limit := scan_warning_rows(engine)):
+        for detail in scans:
+            soft_warning(
+                f"Warning: '{detail}' reads every record ({rows} > {limit}). "
+                f"Filter on an indexed column (date, category, currency) "
+                f"to avoid it."
+            )
+    return df
+
+#endregion =====================================================================
+
+
+#region ========================= time budget ==================================
+
+class QueryTimeout(TimeoutError):
+    """A read cancelled because it ran out of its time budget."""
+
+
+def set_query_timeout(engine: Engine, seconds: Optional[float]) -> None:
+    """
+    Records on the engine's dialect, like `scan_warning_rows`, the default 
+    time budget of every read. None (or 0) for no limit.
+    """
+    if seconds is not None:
+        ensure(seconds, int, float)
+    engine.dialect.query_timeout = seconds or None
+
+
+def query_timeout(engine: Engine | Connection) -> Optional[float]:
+    return getattr(engine.dialect, "query_timeout", None)
+
+
+def cancellation_stats() -> dict[str, int]:
+    """Reads cancelled since startup, by timeout and by Ctrl-C."""
+    return {"timeouts": CANCELLED["timeouts"], 
+            "interrupts": CANCELLED["interrupts"]}
+
+
+class _Budget:
+    """Deadline and cancellation reason of a `time_budget`."""
+
+    def __init__(self, timeout: Optional[float]) -> None:
+        self.timeout = timeout
+        self.reason: Optional[str] = None
+        self.restart()
+
+    def restart(self) -> None:
+        """Starts a new budget, e.g. for the next page of a stream."""
+        self.deadline = perf_counter() + self.timeout if self.timeout else None
+
+    def __call__(self) -> int:
+        # sqlite's progress handler: non-zero aborts the running statement.
+        # It is also where Ctrl-C lands while sqlite runs: the 
+        # KeyboardInterrupt is swallowed by sqlite3, which aborts as well
+        if self.deadline is not None and perf_counter() > self.deadline:
+            self.reason = "timeouts"
+            return 1
+        return 0
+
+    @staticmethod
+    def aborted(error: Exception) -> bool:
+        error = getattr(error, "orig", error)
+        return getattr(error, "sqlite_errorcode", None) == sqlite3.SQLITE_INTERRUPT
+
+
+@contextmanager
+def time_budget(
+        engine: Engine | Connection,
+        timeout: Optional[float] = None,
+) -> Iterator[tuple[Connection, _Budget]]:
+    """
+    Connection of `engine` (or `engine` itself, if a connection) whose 
+    statements are aborted by sqlite's progress handler once `timeout` 
+    seconds have passed, `query_timeout(engine)` by default, or on Ctrl-C. 
+    Either way the statement is rolled back and the connection stays usable:
+    timeouts raise `QueryTimeout` and interrupts `KeyboardInterrupt`, both
+    counted in `CANCELLED`.
+    """
+    if timeout is None:
+        timeout = query_timeout(engine)
+    else:
+        ensure(timeout, int, float)
+    budget = _Budget(timeout)
+    scope = engine.connect() if isinstance(engine, Engine) \
+            else nullcontext(engine)
+    with scope as conn:
+        raw = conn.connection.driver_connection
+        raw.set_progress_handler(budget, PROGRESS_STEPS)
+        try:
+            yield conn, budget
+        except Exception as e:
+            if not budget.aborted(e):
+                raise
+            budget.reason = budget.reason or "interrupts"
+            CANCELLED[budget.reason] += 1
+            if budget.reason == "interrupts":
+                raise KeyboardInterrupt("Query interrupted.") from e
+            raise QueryTimeout(
+                f"Query cancelled after {timeout} seconds.") from e
+        finally:
+            raw.set_progress_handler(None, PROGRESS_STEPS)
+
+#endregion =====================================================================
+
+
+def read_frame(
+        stmt: Select | TextClause,
+        engine: Engine | Connection,
+        explain: bool = False,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+) -> pd.DataFrame:
+    """
+    `pd.read_sql` wrapper. Amount columns are fetched as raw int64 minor units
+    and scaled in a single vectorized division, instead of converting every
+    row through `Cents` (or `Decimal`, on legacy ledgers). Once years are 
+    closed, `cuentas` is read through the partitions the statement's date 
+    bounds overlap (see `with_partitions`).
+
+    Arguments
+    ---------
+    stmt
+        Select or raw text statement. Text statements read `cuentas` and 
+        `conversions` with their amounts in currency units, see 
+        `_scaled_tables`.
+    engine
+        Engine or connection to read from.
+    explain
+        Prints the query plan first, see `explain_plan`.
+    timeout
+        Seconds before the read is cancelled, `query_timeout(engine)` by 
+        default. See `time_budget`.
+    **kwargs
+        Passed to `pd.read_sql` (`index_col`, `parse_dates`, `params`, ...).
+        `params` fills the `bindparam`s of prebuilt statements.
+    """
+    if explain:
+        explain_plan(stmt, engine, kwargs.get("params"))
+    stmt, swapped = _prepare(stmt, engine, kwargs.get("params"))
+
+    with time_budget(engine, timeout) as (conn, _):
+        df = pd.read_sql(stmt, conn, **kwargs)
+    return _scale_amounts(df, swapped, engine)
+
+
+def read_frames(
+        stmt: Select | TextClause,
+        engine: Engine,
+        key: ColumnElement,
+        chunk_size: int,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+) -> Iterator[pd.DataFrame]:
+    """
+    Streams the result of `stmt` as DataFrames of at most `chunk_size` rows,
+    newest `key` first. Select statements are paginated on `key` (keyset
+    pagination: every page is `key < last seen key ... LIMIT chunk_size`), so
+    memory stays bounded by one page however large the result is. Text 
+    statements can't be paginated and are streamed from a single cursor.
+
+    Arguments
+    ---------
+    stmt
+        Select or raw text statement, without `order_by`/`limit`.
+    engine
+        Engine to read from.
+    key
+        Unique, indexed column to paginate on (typically `Record.id`).
+    chunk_size
+        Rows per yielded DataFrame.
+    timeout
+        Seconds each page may take, see `read_frame`.
+    **kwargs
+        Passed to `read_frame`.
+    """
+    with engine.connect() as conn:
+        conn = conn.execution_options(stream_results=True, 
+                                      yield_per=chunk_size)
+        if isinstance(stmt, TextClause):
+            stmt = _scaled_tables(stmt, engine)
+            with time_budget(conn, timeout) as (conn, budget):
+                for df in pd.read_sql(stmt, conn, chunksize=chunk_size, 
+                                      **kwargs):
+                    yield df
+                    budget.restart()
+            return
+
+        first = stmt.order_by(key.desc()).limit(chunk_size)
+        # one shape for every later page, compiled once
+        following = first.where(key < bindparam("keyset_last"))
+        params = kwargs.pop("params", None) or {}
+        page, last = first, None
+        while True:
+            if last is not None:
+                params = params | {"keyset_last": last}
+            df = read_frame(page, conn, params=params, timeout=timeout, 
+                            **kwargs)
+            if df.empty:
+                return
+            yield df
+            if len(df) < chunk_size:
+                return
+            page = following
+            keys = df.index if df.index.name == key.name else df[key.name]
+            # numpy scalars can't be bound
+            last = keys.to_numpy()[-1].item()
@@ -0,0 +1,74 @@
+"""
+Registry of prebuilt statements for the hot read paths (plots, drill-downs).
+Each is built once with `bindparam` placeholders and executed with fresh
+parameters, so neither the construct nor its compiled form (SQLAlchemy's
+per-engine compiled cache) is rebuilt per call.
+"""
+from typing import Callable
+from collections import Counter
+from functools import lru_cache
+
+from sqlalchemy import Select, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+
+from pkg.utilities.core import ensure
+
+
+_BUILDERS: dict[str, Callable[[], Select]] = {}
+
+# outcome of every statement executed on a tracked engine
+COMPILED_CACHE = Counter()
+_OUTCOMES = {CACHE_HIT: "hits", CACHE_MISS: "misses"}
+
+
+def register(name: str) -> Callable:
+    """
+    Decorator: registers a statement builder under `name`. The builder takes
+    no arguments; everything that varies per call must be a `bindparam`.
+
+    Example
+    -------
+    >>> @register("records.by_category")
+    ... def _by_category() -> Select:
+    ...     return select(Record).where(Record.category == bindparam("category"))
+    >>> read_frame(prepared("records.by_category"), engine,
+    ...            params={"category": "FOOD"})
+    """
+    ensure(name, str)
+    def decorator(builder: Callable[[], Select]) -> Callable[[], Select]:
+        if name in _BUILDERS:
+            raise ValueError(f"Statement {name!r} is already registered.")
+        _BUILDERS[name] = builder
+        return builder
+    return decorator
+
+
+@lru_cache(maxsize=None)
+def prepared(name: str) -> Select:
+    """The statement registered as `name`, built on first use only."""
+    if name not in _BUILDERS:
+        raise KeyError(f"Unknown statement {name!r}. "
+                       f"Registered: {sorted(_BUILDERS)}.")
+    return _BUILDERS[name]()
+
+
+def track_compiled_cache(engine: Engine) -> None:
+    """Counts compiled cache hits and misses of `engine` in `COMPILED_CACHE`."""
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters,
+                       context, executemany) -> None:
+        outcome = _OUTCOMES.get(getattr(context, "cache_hit", None))
+        if outcome is not None:
+            COMPILED_CACHE[outcome] += 1
+
+
+def compiled_cache_stats() -> dict[str, int | float]:
+    """Compiled cache hits, misses and hit ratio since startup."""
+    hits, misses = COMPILED_CACHE["hits"], COMPILED_CACHE["misses"]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "ratio": hits / total if total else 0.0,
+    }
@@ -2,22 +2,34 @@
 Database API, allows user to write to DB using sqlalchemy as query wrapper.
 Heavily relies on both parser.py and py
 """
-from typing import List, Optional, Type, Any
+from typing import List, Optional, Type, Any, ContextManager, Iterator
 from datetime import date
 from pathlib import Path
+from time import perf_counter
 import subprocess
 
 import pandas as pd
 from jinja2 import Template
 from sqlalchemy import (
+    Select,
     inspect, 
+    insert,
     select,
     desc,
+    func,
+    bindparam,
+    type_coerce,
+    case,
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.sql.elements import TextClause
 from sqlalchemy.orm import Session
 
 from pkg.classes.context import ctx
-from pkg.classes.model import Record, Conversion
+from pkg.classes.model import Record, Conversion, Cents
+from pkg.classes import model
+from pkg.classes.reader import read_frame, read_frames, epoch_days
+from pkg.classes.cache import ResultCache, LedgerCache, UnsupportedFilter
 from pkg.utilities.core import (
     APPLICATION_DIRECTORY,
     pprint_df,
@@ -28,6 +40,7 @@ from pkg.utilities.parser import (
     parse_semantic_filter,
     parse_csv_record,
     sanitize_df,
+    DATE_COLUMN_FORMAT,
 )
 from pkg.utilities.prompt import (
     FixedColumnsType,
@@ -43,11 +56,112 @@ from pkg.utilities.prompt import (
 
 #region ============================ utils  ====================================
 
-RECORD_TABLE_COLUMNS : List[str] = list(inspect(Record).c.keys())
+# user-facing record columns; derived ones (fingerprint) are kept by the model
+RECORD_TABLE_COLUMNS : List[str] = [
+    column for column in inspect(Record).c.keys() 
+    if column not in Record.DERIVED_COLUMNS
+]
+# how `write_df` resolves appended records already stored
+ON_DUPLICATE : tuple[str, ...] = ("skip", "error", "keep")
+BULK_INSERT_CHUNKSIZE : int = 10_000
+UPSERT_CHUNKSIZE : int = 5_000
+# ids per `IN (...)`, below SQLITE_MAX_VARIABLE_NUMBER (32766 since 3.32)
+ID_CHUNKSIZE : int = 10_000
+FETCH_CHUNKSIZE : int = 10_000
+# `fetch` dtypes: repeated strings as categories, amounts in a fixed width
+FETCH_DTYPES : dict[str, str] = {
+    "amount": "float64",
+    "currency": "category",
+    "category": "category",
+}
+# `fetch` results, dropped on every write (see `ResultCache`)
+RESULT_CACHE = ResultCache(maxsize=64)
+# columnar mirror of the ledger answering `summarize`, see `ledger_cache`
+LEDGER_CACHE : Optional[LedgerCache] = None
+# `summarize` dimensions and measures, computed by sqlite
+SUMMARY_GROUPS : dict[str, Any] = {
+    "category": Record.category,
+    "currency": Record.currency,
+    "year": func.strftime('%Y', Record.date),
+    "month": func.strftime('%Y-%m', Record.date),
+    "week": func.strftime('%Y-W%W', Record.date),
+    "day": func.strftime('%Y-%m-%d', Record.date),
+}
+SUMMARY_AGGREGATES : dict[str, Any] = {
+    "sum": func.sum(Record.amount),
+    "count": func.count(Record.id),
+    # typed as `Cents` so `read_frame` scales it like the others
+    "mean": type_coerce(func.avg(Record.amount), Cents),
+    "min": func.min(Record.amount),
+    "max": func.max(Record.amount),
+}
 
 def ensure_or_none(value : Any, *args : Type[Any]):
     ensure(value, *args, allow_none=True)
 
+
+def _project(
+        stmt : Select, 
+        columns : Optional[List[str]] = None
+) -> Select:
+    """
+    `stmt` selecting only `id` plus `columns` (every record column by 
+    default), with `date` as epoch days (see `epoch_days`).
+    """
+    columns = columns or RECORD_TABLE_COLUMNS
+    if (unknown := set(columns) - set(RECORD_TABLE_COLUMNS)):
+        raise ValueError(
+            f"Unknown columns {sorted(unknown)}. Valid: {RECORD_TABLE_COLUMNS}.")
+    selected = [Record.id] + [
+        epoch_days(Record.date) if column == 'date' else getattr(Record, column)
+        for column in RECORD_TABLE_COLUMNS[1:] if column in columns
+    ]
+    return stmt.with_only_columns(*selected)
+
+
+def _compact(df : pd.DataFrame) -> pd.DataFrame:
+    """
+    Applies `FETCH_DTYPES` and turns epoch days back into datetimes. 
+    Categoricals span every configured category (or currency), not only the
+    fetched ones, so fetched frames can be re-categorized and written back.
+    """
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df.date, unit='D')
+    known = {
+        "category": list(ctx.categories_dict or {}),
+        "currency": list(ctx.currency_list or []),
+    }
+    dtypes = {}
+    for column, dtype in FETCH_DTYPES.items():
+        if column not in df.columns:
+            continue
+        if dtype == "category":
+            # values stored before they were configured are kept too
+            dtype = pd.CategoricalDtype(list(dict.fromkeys(
+                [*known.get(column, []), *df[column].dropna().unique()])))
+        dtypes[column] = dtype
+    return df.astype(dtypes)
+
+
+def _fingerprints(df : pd.DataFrame) -> List[str]:
+    """`model.record_fingerprint` of every row of a sanitized record df."""
+    dates = pd.to_datetime(df.date).dt.strftime('%Y-%m-%d')
+    cents = (df.amount.astype(float) * model.CENTS_SCALE).round().astype('int64')
+    return [
+        model.record_fingerprint(*row) 
+        for row in zip(dates, cents, df.currency, df.description)
+    ]
+
+
+def _to_rows(df : pd.DataFrame) -> List[dict[str, Any]]:
+    """
+    Sanitized df to records keyed by column name, casting `date` back to 
+    `datetime.date`. Columns that aren't `Record` columns are dropped.
+    """
+    dates = pd.to_datetime(df.date).dt.date
+    columns = [c for c in df.columns if c in Record.__table__.c]
+    return df[columns].assign(date=dates).to_dict(orient='records')
+
 #endregion =====================================================================
 
 
@@ -153,6 +267,14 @@ def write_record(obj : Any = None) -> None:
     obj.write(ctx.engine)
 
 
+def transaction() -> ContextManager[Session]:
+    """
+    `with transaction():` batches `write_record`, `write_conversion`, `edit`
+    and `delete` into a single commit. Alias of `ctx.batch()`.
+    """
+    return ctx.batch()
+
+
 def get_record(
         id_ : Optional[int] = None,
 ) -> Record:
@@ -235,24 +357,132 @@ def build_df(
     return df
 
 
-def write_df(df : pd.DataFrame | pd.Series) -> None:
+def bulk_insert(
+        df : pd.DataFrame,
+        chunksize : Optional[int] = None,
+        quiet : bool = False,
+) -> pd.DataFrame:
+    """
+    Appends a sanitized **record** dataframe in a single transaction through 
+    a compiled Core `insert(Record)` executemany, `chunksize` rows per call. 
+    Returns `df` indexed by the assigned ids.
+
+    Arguments
+    ---------
+    df
+        Sanitized dataframe (see `sanitize_df`), without `id`.
+    chunksize
+        Rows per executemany call. Defaults to `BULK_INSERT_CHUNKSIZE`.
+    quiet
+        If False, prints the throughput.
+
+    Notes
+    -----
+    - Parameters are converted column-wise (dates to ISO strings, amounts to
+    the storage scale of `Cents`) and handed to the driver as tuples, 
+    skipping SQLAlchemy's per-row bind processing.
+    - From `model.DEFERRED_TRIGGERS_MIN_ROWS` rows, the aggregate / FTS 
+    insert triggers are deferred and caught up set-wise (see 
+    `model.deferred_insert_triggers`).
+    - Ids are read back as the rows above the previous `max(id)`, which holds 
+    because sqlite serializes writers and the whole load is one transaction.
+    - Rows dated in closed years are routed to their partitions.
+    - Fingerprints (see `model.record_fingerprint`) are computed column-wise 
+    too; duplicates are not checked here, see `write_df`.
+    - Joins the active `transaction()`, if any.
+    """
+    ensure(df, pd.DataFrame)
+    ensure_or_none(chunksize, int)
+    if df.empty:
+        return df
+    
+    chunksize = chunksize or BULK_INSERT_CHUNKSIZE
+    columns = [c for c in RECORD_TABLE_COLUMNS if c != 'id'] + ['fingerprint']
+
+    def insert_open(conn, df : pd.DataFrame) -> list[int]:
+        scale = model.amount_scale(conn.dialect)
+        params = {
+            **{c: df[c].tolist() for c in columns if c in df.columns},
+            'date': pd.to_datetime(df.date).dt.strftime('%Y-%m-%d').tolist(),
+            'amount': (df.amount.astype(float) * scale).round()
+                      .astype('int64').tolist(),
+            'fingerprint': _fingerprints(df),
+        }
+        compiled = insert(Record) \
+                   .values({c: bindparam(c) for c in columns}) \
+                   .compile(dialect=conn.dialect)
+        # tuples in the order the compiled statement binds them, which is
+        # the table's, whatever the order of `columns` or of `df`
+        rows = list(zip(*(params[name] for name in compiled.positiontup)))
+        with model.deferred_insert_triggers(conn, len(rows)) as last_id:
+            for i in range(0, len(rows), chunksize):
+                conn.exec_driver_sql(str(compiled), rows[i:i + chunksize])
+        return conn.execute(
+            select(Record.id).where(Record.id > last_id).order_by(Record.id)
+        ).scalars().all()
+
+    def load(conn) -> list[int]:
+        # rows dated in closed years go to their partition (see `close_year`)
+        years = pd.to_datetime(df.date).dt.year
+        closed = years.isin(model.closed_years(conn)).to_numpy()
+        if not closed.any():
+            return insert_open(conn, df)
+        ids = pd.Series(0, index=range(len(df)))
+        ids[closed] = model.route_records(conn, _to_rows(df[closed]))
+        if not closed.all():
+            ids[~closed] = insert_open(conn, df[~closed])
+        return ids.tolist()
+
+    start = perf_counter()
+    model.bump_ledger_version(ctx.engine)
+    if (uow := model.active_unit_of_work(ctx.engine)) is not None:
+        ids = load(uow.session.connection())
+        uow.counts["written"] += len(ids)
+    else:
+        with ctx.engine.begin() as conn:
+            ids = load(conn)
+    elapsed = perf_counter() - start
+
+    if not quiet:
+        print(f"{len(ids)} records inserted in {elapsed:.3f}s "
+              f"({len(ids) / max(elapsed, 1e-9):,.0f} rows/s).")
+    return df.set_axis(pd.Index(ids, name='id'))
+
+
+def write_df(
+        df : pd.DataFrame | pd.Series,
+        on_duplicate : str = "keep",
+) -> Optional[pd.DataFrame]:
     """
     Writes **record** dataframe to database. Performs type-checking, column type
-    checking, and if df contains index, then it updates each record accordingly.
-    Otherwise, df is appeneded to database.
+    checking, and if df contains index, then only the rows and columns that 
+    differ from the stored records are shown and, once confirmed, upserted 
+    (see `upsert_records`). Otherwise, df is appeneded to database through 
+    `bulk_insert`, and returned indexed by the assigned ids.
     
     Arguments
     -----
     df
         DataFrame to be passed to database. 
+    on_duplicate
+        What to do with appended records whose fingerprint (same date, 
+        amount, currency and description, see `model.record_fingerprint`) 
+        is already stored, e.g. when re-importing an overlapping csv:
+        - "keep": write them all, duplicates included. Default, identical 
+        records are legitimate (two coffees on the same day).
+        - "skip": write only the new ones.
+        - "error": print them and raise ValueError, writing nothing.
+        Ignored for updates.
     """
 
     if not isinstance(df, (pd.DataFrame, pd.Series)):
         raise TypeError(df, (pd.DataFrame, pd.Series))
+    ensure(on_duplicate, str)
+    if on_duplicate not in ON_DUPLICATE:
+        raise ValueError(f"Invalid {on_duplicate=}. Valid: {ON_DUPLICATE}.")
 
     # sanitize dataframe before writing to it
     ensure(df, pd.DataFrame, pd.Series)
-    table_name = Record.__tablename__
     category_list = list(ctx.categories_dict.keys())
     df = sanitize_df(df, category_list)
 
@@ -260,28 +490,176 @@ def write_df(df : pd.DataFrame | pd.Series) -> None:
     is_index_id = (df.index.name == 'id')
     if not ('id' in df.columns) and not is_index_id:
         # if that is not the case, just append to db
-        df.to_sql(
-            name=table_name, con=ctx.engine, 
-            if_exists='append', index=False
-        )
+        if on_duplicate != "keep" and (df := _resolve_duplicates(
+                df, skip=(on_duplicate == "skip"))).empty:
+            print("No new records to write.")
+            return
+        df = bulk_insert(df)
         pprint_df(df=df, header="Changes have been commited.")
-        return
+        return df
 
-    # if there is index, reset it so orient=records preserves it
-    if is_index_id:
-        df = df.reset_index()
-    as_dict = df.to_dict(orient='records')
+    # updates: only rows and columns that differ from the db are written
+    if not is_index_id:
+        df = df.set_index('id')
+    current = _current_records(df.index.tolist())
+    changed = _diff_mask(df, current)
+    rows = changed.any(axis=1)
+    columns = changed.columns[changed.any()].tolist()
+    if not rows.any():
+        print("No changes to write.")
+        return
 
     def _action():
-        with Session(ctx.engine) as session:
-            session.bulk_update_mappings(Record, as_dict)
-            session.commit()
+        upsert_records(df.loc[rows], columns)
 
-    # print dataframe and confirm user validation ---        
-    pprint_df(df)
+    # print the diff and confirm user validation ---
+    pprint_df(_diff_frame(df[rows], current, changed[rows][columns]))
     confirm_action(_action)
 
 
+def _stored_fingerprints(fingerprints : List[str]) -> pd.Series:
+    """
+    Id of a stored record (closed years included) for every fingerprint in
+    `fingerprints` that is stored, looked up through the fingerprint index in
+    `ID_CHUNKSIZE` batches. Sees the records of the active `transaction()`.
+    """
+    uow = model.active_unit_of_work(ctx.engine)
+    source = uow.session.connection() if uow is not None else ctx.engine
+    frames = [
+        read_frame(
+            select(Record.fingerprint, Record.id)
+            .where(Record.fingerprint.in_(fingerprints[i:i + ID_CHUNKSIZE])),
+            source
+        )
+        for i in range(0, len(fingerprints), ID_CHUNKSIZE)
+    ]
+    stored = pd.concat(frames) if frames else pd.DataFrame(
+        columns=['fingerprint', 'id'])
+    return stored.drop_duplicates('fingerprint').set_index('fingerprint').id
+
+
+def _resolve_duplicates(df : pd.DataFrame, skip : bool) -> pd.DataFrame:
+    """
+    Rows of the sanitized `df` not stored yet, by fingerprint. Stored ones 
+    are dropped if `skip`, otherwise printed and refused with ValueError.
+    Rows repeated within `df` itself are all kept.
+    """
+    fingerprints = pd.Series(_fingerprints(df), index=df.index)
+    stored = _stored_fingerprints(fingerprints.unique().tolist())
+    duplicated = fingerprints.isin(stored.index)
+    if not duplicated.any():
+        return df
+    count = int(duplicated.sum())
+    if skip:
+        print(f"Skipping {count} records already stored.")
+        return df[~duplicated]
+    pprint_df(
+        df[duplicated].assign(stored_id=fingerprints[duplicated].map(stored)),
+        header="Records already stored:"
+    )
+    raise ValueError(
+        f"{count} records are already stored. Pass on_duplicate='skip' to "
+        f"write only the new ones, or 'keep' to write them all."
+    )
+
+
+def _current_records(ids : List[int]) -> pd.DataFrame:
+    """Stored records for `ids`, fetched in `ID_CHUNKSIZE` batches."""
+    frames = [
+        read_frame(
+            select(Record).where(Record.id.in_(ids[i:i + ID_CHUNKSIZE])),
+            ctx.engine, index_col='id'
+        )
+        for i in range(0, len(ids), ID_CHUNKSIZE)
+    ]
+    current = pd.concat(frames) if frames else pd.DataFrame()
+    if not current.empty:
+        current['date'] = pd.to_datetime(current.date) \
+                            .dt.strftime(DATE_COLUMN_FORMAT)
+    return current.reindex(columns=RECORD_TABLE_COLUMNS[1:])
+
+
+def _diff_mask(df : pd.DataFrame, current : pd.DataFrame) -> pd.DataFrame:
+    """
+    Boolean frame (df's index and record columns), True where the sanitized 
+    `df` differs from `current`. Ids missing from the db differ everywhere.
+    """
+    old = current.reindex(df.index)
+    mask = {
+        column: df[column].ne(old[column]) 
+        for column in RECORD_TABLE_COLUMNS[1:]
+    }
+    # compare amounts in cents, sidestepping float noise
+    mask['amount'] = df.amount.round(2).ne(old.amount.round(2))
+    return pd.DataFrame(mask, index=df.index)
+
+
+def _diff_frame(
+        df : pd.DataFrame, 
+        current : pd.DataFrame, 
+        changed : pd.DataFrame
+) -> pd.DataFrame:
+    """`old -> new` for every changed cell, blank elsewhere."""
+    old = current.reindex(index=changed.index, columns=changed.columns)
+    new = df[changed.columns].astype(str)
+    cells = old.astype(str).where(old.notna(), '') + ' -> ' + new
+    return cells.where(changed, '')
+
+
+def upsert_records(
+        df : pd.DataFrame, 
+        columns : Optional[List[str]] = None,
+        chunksize : Optional[int] = None,
+) -> int:
+    """
+    Writes a sanitized **record** dataframe indexed by id with a chunked
+    `INSERT ... ON CONFLICT(id) DO UPDATE`, in a single transaction. 
+    Returns the number of rows written.
+
+    Arguments
+    ---------
+    df
+        Sanitized dataframe indexed by `id`.
+    columns
+        Columns overwritten on existing ids. Defaults to every record column.
+    chunksize
+        Rows per executemany call. Defaults to `UPSERT_CHUNKSIZE`.
+
+    Notes
+    -----
+    - Raises ValueError for records of closed years (see `close_year`).
+    - Joins the active `transaction()`, if any.
+    """
+    ensure(df, pd.DataFrame)
+    ensure_or_none(columns, list)
+    ensure_or_none(chunksize, int)
+    columns = columns or RECORD_TABLE_COLUMNS[1:]
+    chunksize = chunksize or UPSERT_CHUNKSIZE
+
+    stmt = sqlite_insert(Record)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Record.id],
+        # df holds whole records: their fingerprints are always current
+        set_={column: stmt.excluded[column] 
+              for column in columns + ['fingerprint']}
+    )
+    rows = _to_rows(df.reset_index().assign(fingerprint=_fingerprints(df)))
+
+    def load(conn) -> None:
+        model.check_writable(conn, df.index.tolist(), [row['date'] for row in rows])
+        for i in range(0, len(rows), chunksize):
+            conn.execute(stmt, rows[i:i + chunksize])
+
+    model.bump_ledger_version(ctx.engine)
+    if (uow := model.active_unit_of_work(ctx.engine)) is not None:
+        load(uow.session.connection())
+        uow.counts["written"] += len(rows)
+    else:
+        with ctx.engine.begin() as conn:
+            load(conn)
+    return len(rows)
+
+
 def build_conversion(
         date_ : Optional[date] = None,
         base_operation_str : Optional[str] = None,
@@ -427,6 +805,9 @@ def delete(
 def fetch(
         semantic_filter : Optional[str] = None,
         max_lines : Optional[int] = None,
+        columns : Optional[List[str]] = None,
+        explain : bool = False,
+        timeout : Optional[float] = None,
 ) -> pd.DataFrame:
     """
     Fetches records from database.
@@ -439,39 +820,398 @@ def fetch(
         - str columns: exact match, `LIKE` wildcard, or regex
         - int columns: exact match or numeric range
         - float columns: numeric range only
+        - date column: `date in 2025`, `date in 2025-03`, `date in 2025-W07`
+        - description tokens: `desc match coffee bar*` (full-text search)
+        Filters combine with `&&`, `||`, `!` and parentheses into one query,
+        e.g. `(cat FOOD || cat RENT) && !currency USD`.
     max_lines
         Maximum number of records to return. Optional.
+    columns
+        Record columns to select, besides `id` (the index). All by default.
+        Not available for raw `sql:` queries.
+    explain
+        Pretty-prints the `EXPLAIN QUERY PLAN` of the query before running it,
+        warning on full scans of large ledgers. Defaults to False. Bypasses
+        the result cache.
+    timeout
+        Seconds before the query is cancelled with `QueryTimeout`. Defaults
+        to config.json's `query_timeout` (no limit if unset). Ctrl-C 
+        cancels it too, see `cancellation_stats`.
 
     Notes
     -----
     - When `semantic_filter` is omitted, the user is prompted interactively.
     - Results are ordered by `Record.id` (desc) and limited by `max_lines` if 
-    provided.
+    provided, i.e. the newest `max_lines` records.
     - To use SQL, use `sql: SELECT ...` (only SELECT statements are supported).
+    Amounts and anything computed from them (`sum(amount)`, `amount * 2`)
+    come back in currency units, except through schema-qualified tables 
+    (`main.cuentas`), which hold integer cents. It runs on `ctx.read_engine`,
+    so anything but reads fails. It is returned as written, without 
+    ordering or limit.
+    - `currency` and `category` come back as `category` dtype, spanning every
+    configured currency and category, `amount` as float64 and `date` as 
+    datetime64.
+    - For results too large to hold in memory, see `fetch_iter`.
+    - Results are cached until the ledger changes, in this process or any
+    other, see `fetch_cache_stats`.
     """
     
     # type checking
     ensure_or_none(max_lines, int)
     ensure_or_none(semantic_filter, str)
+    ensure_or_none(columns, list)
+    ensure(explain, bool)
+    ensure_or_none(timeout, int, float)
+
+    stmt = _semantic_statement(semantic_filter)
+    raw = isinstance(stmt, TextClause)
+    if raw and columns:
+        raise ValueError("`columns` can't be applied to raw `sql:` queries.")
+    if not raw:
+        stmt = _project(stmt, columns).order_by(desc(Record.id))
+        if max_lines:
+            stmt = stmt.limit(max_lines)
+
+    # raw `sql:` queries run on the read-only engine, they can't write
+    engine = ctx.read_engine if raw else ctx.engine
+    kwargs = {"index_col": 'id'}
+    if raw:
+        kwargs["parse_dates"] = {"date": "%Y-%m-%d"}
+    # versioned on the writer, the only engine that can change the ledger
+    key = RESULT_CACHE.key(stmt, engine, **kwargs)
+    if not explain and (df := RESULT_CACHE.get(key, ctx.engine)) is not None:
+        return df
+    try:
+        df = read_frame(stmt, engine, explain=explain, timeout=timeout, 
+                        **kwargs)
+    except pd.errors.DatabaseError:
+        raise ValueError(f"Database error found. More likely wrong query: {stmt=}.")
+    else:
+        return RESULT_CACHE.put(key, df if raw else _compact(df))
+
+
+def fetch_cache_stats() -> dict[str, int | float]:
+    """
+    `fetch` result cache hits, misses, hit ratio, number of cached results
+    and their memory footprint in bytes.
+    """
+    return RESULT_CACHE.stats()
+
+
+def fetch_iter(
+        semantic_filter : Optional[str] = None,
+        chunk_size : int = FETCH_CHUNKSIZE,
+        timeout : Optional[float] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Streams records from database as DataFrames of up to `chunk_size` rows,
+    newest first. Same filters as `fetch`, but memory is bounded by a single
+    chunk, so it can scan the whole ledger.
+
+    Parameters
+    ----------
+    semantic_filter
+        A textual filter expression, see `fetch`.
+    chunk_size
+        Maximum number of records per chunk. Defaults to `FETCH_CHUNKSIZE`.
+    timeout
+        Seconds each chunk may take, see `fetch`.
+
+    Notes
+    -----
+    - Pages are fetched with keyset pagination on `Record.id` (`id < last id
+    seen`), so every page is an index range scan instead of a growing OFFSET.
+    - Reads run on `ctx.read_engine`: records written in a pending 
+    `transaction` are not visible yet.
+    - Chunks have `fetch`'s dtypes. Raw `sql:` queries are streamed from a 
+    single cursor, as written.
+
+    Example
+    -------
+    >>> total = sum(chunk.amount.sum() for chunk in fetch_iter("currency = USD"))
+    """
+    ensure_or_none(semantic_filter, str)
+    ensure(chunk_size, int)
+    if chunk_size <= 0:
+        raise ValueError(f"{chunk_size=} must be positive.")
+    ensure_or_none(timeout, int, float)
+
+    stmt = _semantic_statement(semantic_filter)
+    if isinstance(stmt, TextClause):
+        chunks = read_frames(stmt, ctx.read_engine, Record.id, chunk_size,
+                             timeout=timeout, index_col='id',
+                             parse_dates={"date": "%Y-%m-%d"})
+    else:
+        chunks = map(_compact, read_frames(_project(stmt), ctx.read_engine, 
+                                           Record.id, chunk_size, 
+                                           timeout=timeout, index_col='id'))
+    try:
+        yield from chunks
+    except pd.errors.DatabaseError:
+        raise ValueError(f"Database error found. More likely wrong query: {stmt=}.")
+
 
+def _semantic_statement(
+        semantic_filter : Optional[str],
+) -> Select | TextClause:
+    """Prompts for `semantic_filter` if omitted and parses it."""
     # ask for semantic filter and parse it
     if semantic_filter is None:
         semantic_filter = input("Type your semantic filter: ")
     
     # query constructor -- by design, there is no prompter for this
-    stmt = parse_semantic_filter(semantic_filter)
-    if max_lines:
-        stmt = stmt.limit(max_lines)
-    stmt = stmt.order_by(desc(Record.id))
+    # `desc match` falls back to LIKE if sqlite was built without FTS5
+    full_text = model.has_description_index(ctx.engine)
+    return parse_semantic_filter(semantic_filter, full_text)
+
+
+def summarize(
+        semantic_filter : Optional[str] = None,
+        by : Optional[List[str]] = None,
+        agg : Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Aggregates the records matching `semantic_filter` in a single GROUP BY 
+    run by sqlite, so only one row per group reaches Python. Filters the 
+    `ledger_cache` mirror can evaluate (dates, amounts, currencies, 
+    categories and ids) are answered from it instead, without a query.
+
+    Notes
+    -----
+    The first call answered from the mirror loads the whole ledger into 
+    memory, even for a one-month filter. Later calls only read the records
+    added since, see `LedgerCache`.
 
+    Parameters
+    ----------
+    semantic_filter
+        A textual filter expression, see `fetch`. Raw `sql:` is not allowed.
+    by
+        Grouping dimensions, among `SUMMARY_GROUPS`: category, currency, 
+        year, month, week and day. They make up the (Multi)Index, in order.
+        An empty list aggregates every matching record into a single row.
+        Defaults to category, currency and month.
+    agg
+        Measures over `amount`, among `SUMMARY_AGGREGATES`: sum, count, mean,
+        min and max. One column each. Defaults to sum, count and mean.
+
+    Example
+    -------
+    >>> summarize("date in 2025 && !cat INGRESO", by=["month"], agg=["sum"])
+    """
+    by = ["category", "currency", "month"] if by is None else by
+    agg = ["sum", "count", "mean"] if agg is None else agg
+    ensure(agg, list)
+    groups = _summary_groups(by)
+    if not agg or (unknown := set(agg) - SUMMARY_AGGREGATES.keys()):
+        raise ValueError(
+            f"Invalid aggregates {agg}. Valid: {list(SUMMARY_AGGREGATES)}.")
+
+    stmt = _filtered_statement(semantic_filter)
     try:
-        df = pd.read_sql(stmt, ctx.engine, 
-                         index_col='id',
-                         parse_dates={"date": "%Y-%m-%d"})
-    except pd.errors.DatabaseError:
-        raise ValueError(f"Database error found. More likely wrong query: {stmt=}.")
-    else:
-        return df
+        return ledger_cache().summarize(stmt.whereclause, by, agg)
+    except UnsupportedFilter:
+        pass
+    measures = [SUMMARY_AGGREGATES[name].label(name) for name in agg]
+    stmt = stmt.with_only_columns(*groups, *measures) \
+               .group_by(*groups) \
+               .order_by(*groups)
+    df = read_frame(stmt, ctx.read_engine, index_col=by or None)
+    if 'count' in df.columns:
+        df['count'] = df['count'].astype('int64')
+    return df
+
+
+def ledger_cache() -> LedgerCache:
+    """
+    The `LedgerCache` of `ctx.read_engine`, rebuilt when the context 
+    switches to another ledger. It's loaded by its first read, see 
+    `LedgerCache`.
+    """
+    global LEDGER_CACHE
+    if LEDGER_CACHE is None or LEDGER_CACHE.engine is not ctx.read_engine:
+        LEDGER_CACHE = LedgerCache(ctx.read_engine)
+    return LEDGER_CACHE
+
+
+def ledger_cache_stats() -> dict[str, int]:
+    """
+    Records mirrored by `ledger_cache`, their memory footprint in bytes and
+    how many times the mirror was fully loaded or appended to.
+    """
+    return ledger_cache().stats()
+
+
+def _summary_groups(by : List[str]) -> List[Any]:
+    """`SUMMARY_GROUPS` expressions of `by`, labeled by name."""
+    ensure(by, list)
+    if (unknown := set(by) - SUMMARY_GROUPS.keys()):
+        raise ValueError(
+            f"Unknown groups {sorted(unknown)}. Valid: {list(SUMMARY_GROUPS)}.")
+    return [SUMMARY_GROUPS[name].label(name) for name in by]
+
+
+def _filtered_statement(semantic_filter : Optional[str]) -> Select:
+    """`_semantic_statement`, refusing raw `sql:` queries."""
+    ensure_or_none(semantic_filter, str)
+    stmt = _semantic_statement(semantic_filter)
+    if isinstance(stmt, TextClause):
+        raise ValueError("Raw `sql:` queries are not supported here, use `fetch`.")
+    return stmt
+
+
+def top_n(
+        semantic_filter : Optional[str] = None,
+        n : int = 5,
+        by : Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Largest `n` records per group, e.g. the top 5 expenses per category and 
+    month, ranked by sqlite with `ROW_NUMBER() OVER (PARTITION BY ...)`.
+
+    Parameters
+    ----------
+    semantic_filter
+        A textual filter expression, see `fetch`. Raw `sql:` is not allowed.
+    n
+        Records per group. Defaults to 5.
+    by
+        Groups, among `SUMMARY_GROUPS` (see `summarize`). Empty for an 
+        overall top `n`. Defaults to category and month.
+
+    Notes
+    -----
+    Indexed by `by` plus `rank` (1 is the largest amount, ties broken by 
+    newest id), with the record's `id` and columns (`fetch` dtypes).
+    """
+    ensure(n, int)
+    if n <= 0:
+        raise ValueError(f"{n=} must be positive.")
+    by = ["category", "month"] if by is None else by
+    groups = _summary_groups(by)
+    rank = func.row_number().over(
+        partition_by=groups or None,
+        order_by=(desc(Record.amount), desc(Record.id))
+    ).label("rank")
+    # category and currency already are record columns
+    extra = [group for group in groups if group.name not in RECORD_TABLE_COLUMNS]
+    ranked = _project(_filtered_statement(semantic_filter)) \
+             .add_columns(*extra, rank) \
+             .subquery("ranked")
+    order = [ranked.c[name] for name in by] + [ranked.c.rank]
+    stmt = select(ranked).where(ranked.c.rank <= n).order_by(*order)
+    df = _compact(read_frame(stmt, ctx.read_engine))
+    return df.set_index(by + ["rank"])
+
+
+def running_total(
+        semantic_filter : Optional[str] = None,
+        by : Optional[List[str]] = None,
+        period : str = "day",
+        signed : bool = False,
+) -> pd.DataFrame:
+    """
+    Cumulative amount per group over time, computed by sqlite with 
+    `SUM(...) OVER (PARTITION BY ... ORDER BY period)`.
+
+    Parameters
+    ----------
+    semantic_filter
+        A textual filter expression, see `fetch`. Raw `sql:` is not allowed.
+    by
+        Groups, among `SUMMARY_GROUPS` (see `summarize`). Defaults to 
+        currency: amounts of different currencies never add up.
+    period
+        Time step, one of year, month, week or day.
+    signed
+        Adds `ctx.inflow_categories` and subtracts everything else, i.e. a 
+        running balance. Otherwise every amount adds up.
+
+    Notes
+    -----
+    Indexed by `by` plus `period`, with the period's `amount` and the 
+    `running_total` up to it: one line per group when unstacked.
+    """
+    ensure(period, str)
+    ensure(signed, bool)
+    by = ["currency"] if by is None else by
+    if period not in ("year", "month", "week", "day") or period in by:
+        raise ValueError(f"Invalid {period=} for {by=}.")
+    groups = _summary_groups(by)
+    step = SUMMARY_GROUPS[period].label("period")
+
+    amount = Record.amount
+    if signed:
+        if not ctx.inflow_categories:
+            raise RuntimeError("Run 'set_plot' to load the inflow categories.")
+        inflow = Record.category.in_(ctx.inflow_categories)
+        amount = type_coerce(case((inflow, Record.amount), 
+                                  else_=-Record.amount), Cents)
+    flows = _filtered_statement(semantic_filter) \
+            .with_only_columns(*groups, step, 
+                               type_coerce(func.sum(amount), Cents).label("amount")) \
+            .group_by(*groups, step) \
+            .subquery("flows")
+    keys = [flows.c[name] for name in by]
+    total = func.sum(flows.c.amount).over(
+        partition_by=keys or None,
+        order_by=flows.c.period
+    )
+    stmt = select(*keys, flows.c.period, flows.c.amount, 
+                  type_coerce(total, Cents).label("running_total")) \
+           .order_by(*keys, flows.c.period)
+    return read_frame(stmt, ctx.read_engine, index_col=by + ["period"])
+
+
+def quantiles(
+        semantic_filter : Optional[str] = None,
+        q : int = 4,
+        by : Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Splits the amounts of every group into `q` equally populated buckets 
+    with sqlite's `NTILE(q) OVER (PARTITION BY ... ORDER BY amount)`, and 
+    returns each bucket's bounds, e.g. quartiles of expenses per category.
+
+    Parameters
+    ----------
+    semantic_filter
+        A textual filter expression, see `fetch`. Raw `sql:` is not allowed.
+    q
+        Number of buckets. Defaults to 4.
+    by
+        Groups, among `SUMMARY_GROUPS` (see `summarize`). Defaults to 
+        category.
+
+    Notes
+    -----
+    Indexed by `by` plus `tile` (1 to `q`), with `lower`/`upper` amounts
+    and `count` of records in the bucket. Groups with fewer than `q` records
+    have fewer buckets.
+    """
+    ensure(q, int)
+    if q <= 0:
+        raise ValueError(f"{q=} must be positive.")
+    by = ["category"] if by is None else by
+    groups = _summary_groups(by)
+    tile = func.ntile(q).over(
+        partition_by=groups or None,
+        order_by=Record.amount
+    ).label("tile")
+    tiled = _filtered_statement(semantic_filter) \
+            .with_only_columns(*groups, Record.amount, tile) \
+            .subquery("tiled")
+    keys = [tiled.c[name] for name in by] + [tiled.c.tile]
+    stmt = select(*keys, 
+                  func.min(tiled.c.amount).label("lower"),
+                  func.max(tiled.c.amount).label("upper"),
+                  func.count().label("count")) \
+           .group_by(*keys) \
+           .order_by(*keys)
+    df = read_frame(stmt, ctx.read_engine, index_col=by + ["tile"])
+    df['count'] = df['count'].astype('int64')
+    return df
 
 
 def _read_conversion(
@@ -480,7 +1220,7 @@ def _read_conversion(
     """Simple conversion reader. No support for df return yet."""
     ensure(max_lines, int)
     stmt = select(Conversion).limit(max_lines).order_by(desc(Conversion.date))
-    df = pd.read_sql(stmt, ctx.engine, index_col='id')
+    df = read_frame(stmt, ctx.engine, index_col='id')
     pprint_df(df)
 
 
@@ -519,5 +1259,33 @@ def read(
         raise TypeError(f"Invalid {entity_type=}. Must be Conversion or Record.")
 
 
+def rebuild_aggregates() -> None:
+    """
+    Recomputes the monthly totals plots read from. They're kept current by 
+    triggers, so this is only needed if they drift, e.g. after restoring 
+    `cuentas` from a dump without its triggers.
+    """
+    count = model.rebuild_aggregates(ctx.engine)
+    print(f"Monthly aggregates rebuilt: {count} rows.")
+
+
+def close_year(year : int) -> None:
+    """
+    Moves every record of `year` into its own database file next to the 
+    ledger, which is then attached and queried transparently. The file can 
+    be vacuumed and backed up on its own (see `model.compact_partition`, 
+    `model.backup_partition`). Edits of closed years are refused.
+    """
+    ensure(year, int)
+    def _action():
+        model.close_year(ctx.engine, year)
+        model.attach_partitions(ctx.read_engine)
+    confirm_action(_action,
+                   label=f"Move every record of {year} to its own file? [y/N]")
+
 
-    
\ No newline at end of file
+def open_year(year : int) -> None:
+    """Moves the records of a closed `year` back into the ledger."""
+    ensure(year, int)
+    model.open_year(ctx.engine, year)
+    model.attach_partitions(ctx.read_engine)
@@ -1,7 +1,8 @@
 from typing import (
     Iterable, Optional, Any
 )
-from datetime import date
+from datetime import date, timedelta
+from functools import partial
 
 import pandas as pd
 from pandas import Period
@@ -12,12 +13,21 @@ from matplotlib.axes import Axes
 from matplotlib.figure import Figure
 from matplotlib.backend_bases import Event
 from sqlalchemy import (
-    select, not_, extract,
+    Select, select, not_, bindparam,
 )
 
 from pkg.classes import ctx, Record
+from pkg.classes.model import MonthlyAggregate
+from pkg.classes.reader import read_frame
+from pkg.classes.loader import gather
+from pkg.classes.statements import register, prepared
 from pkg.utilities.core import pprint_df
-from pkg.utilities.parser import parse_period, parse_date
+from pkg.utilities.parser import (
+    parse_period, 
+    parse_date,
+    parse_date_range,
+    date_range_filter,
+)
 from pkg.utilities.typing import (
     ValidDateArgument,
     MetadataType,
@@ -29,6 +39,8 @@ from pkg.utilities.typing import (
 from .shared import (
     INCLUDING_INFLOW, 
     TOTAL_AMOUNT_COL,
+    AGGREGATE_INFLOW,
+    AGGREGATE_TOTAL_COL,
     sum_currencies,
     get_bkgcolor,
     negatecolor,
@@ -36,39 +48,37 @@ from .shared import (
     raise_on_empty,
 )
 
-def by_date(
-        mindate: date,
-        maxdate: date,
-) -> EntityFilter:
-    return (Record.date.between(mindate, maxdate), )
+def datefilter_bounds(args: Any) -> dict[str, date]:
+    """
+    Half-open `lower` / `upper` bounds `args` resolves to, as the parameters
+    of the prebuilt statements below.
+    """
+    if isinstance(args, ParsablePeriod) or args is None:
+        lower, upper = parse_date_range(parse_period(args, ctx.period))
+    elif isinstance(args, list | tuple):
+        lower, upper = parse_date(args[0]), parse_date(args[-1])
+        if lower > upper:
+            print("Arguments have been swapped to avoid empty DataFrame.")
+            lower, upper = upper, lower
+        # both ends included
+        upper += timedelta(days=1)
+    else:
+        raise TypeError(
+            f"Argument {args} is not a valid `Period`/`datetime.date` type."
+        )
+    return {"lower": lower, "upper": upper}
 
 
-def by_period(
-        period: Period,
-) -> EntityFilter:
-    """Quick filter by period."""  
-    return (
-        extract('year', Record.date) == period.year,
-        extract('month', Record.date) == period.month
-    )
+def as_period(args: Any) -> Period | None:
+    """Returns the monthly period `args` resolves to, if any."""
+    if isinstance(args, ParsablePeriod) or args is None:
+        return parse_period(args, ctx.period)
+    return None
 
 
 def by_datefilter(args: Any) -> EntityFilter:
-    
-    if isinstance(args, ParsablePeriod) or args is None:
-        period = parse_period(args, ctx.period)
-        return by_period(period)
-    if isinstance(args, list | tuple):
-        datemin = parse_date(args[0])
-        datemax = parse_date(args[-1])
-        if datemin > datemax:
-            print("Arguments have been swapped to avoid empty DataFrame.")
-            return by_date(datemax, datemin) 
-        return by_date(datemin, datemax)
-
-    raise TypeError(
-        f"Argument {args} is not a valid `Period`/`datetime.date` type."
-    )
+    """Ad-hoc `Record.date` filter for `args`, see `datefilter_bounds`."""
+    return date_range_filter(**datefilter_bounds(args))
 
 
 def datefilter_str(args: Any) -> str:
@@ -87,30 +97,70 @@ def datefilter_str(args: Any) -> str:
     )
 
 
-def quick_filter(
-        datearg: ValidDateArgument,
-        category: str,
-        currency: str
-) -> pd.DataFrame:
+#region ======================= prebuilt statements ============================
+
+# built once, executed with new parameters: on-click drill-downs and redraws
+# never rebuild nor recompile them (see `pkg.classes.statements`)
+
+@register("barchart.quick_filter")
+def _quick_filter_stmt() -> Select:
     # why calling the database instead of filtering in pandas?
     # wellp, when group_by(Record.category) is called, description 
     # is lost, it can't be retrieved
-
-    q = select(Record.id, 
-               Record.date,
-               Record.amount, 
-               Record.description
+    return select(Record.id, 
+                  Record.date,
+                  Record.amount, 
+                  Record.description
             ) \
             .where(
-                *by_datefilter(datearg),
-                Record.category == category, 
-                Record.currency == currency
+                *date_range_filter(bindparam("lower"), bindparam("upper")),
+                Record.category == bindparam("category"), 
+                Record.currency == bindparam("currency")
             ) \
             .order_by(
                 Record.amount.desc(), 
                 Record.date.desc()
             )
-    return pd.read_sql(q, ctx.engine, 'id')
+
+
+@register("barchart.by_period")
+def _barchart_period_stmt() -> Select:
+    # whole months are answered by the aggregate table
+    return select(MonthlyAggregate.currency, 
+                  MonthlyAggregate.category, 
+                  AGGREGATE_TOTAL_COL) \
+            .where(MonthlyAggregate.period == bindparam("period"),
+                   not_(AGGREGATE_INFLOW)) \
+            .group_by(MonthlyAggregate.currency, 
+                      MonthlyAggregate.category)
+
+
+@register("barchart.by_date")
+def _barchart_date_stmt() -> Select:
+    # arbitrary date ranges still need the records
+    return select(Record.currency, 
+                  Record.category, 
+                  TOTAL_AMOUNT_COL) \
+            .where(*date_range_filter(bindparam("lower"), bindparam("upper")),
+                   not_(INCLUDING_INFLOW)) \
+            .group_by(Record.currency, 
+                      Record.category)
+
+#endregion =====================================================================
+
+
+def quick_filter(
+        datearg: ValidDateArgument,
+        category: str,
+        currency: str,
+        explain: bool = False,
+) -> pd.DataFrame:
+    params = datefilter_bounds(datearg) | {
+        "category": category, 
+        "currency": currency
+    }
+    return read_frame(prepared("barchart.quick_filter"), ctx.read_engine, 
+                      index_col='id', params=params, explain=explain)
 
 
 def quick_printer(
@@ -242,25 +292,30 @@ def get_header(
 @raise_on_empty
 def fetch_barchart_data(
         datearg: ValidDateArgument,
+        explain: bool = False,
 ) -> pd.DataFrame:
-    q = select(Record.currency, 
-               Record.category, 
-               TOTAL_AMOUNT_COL) \
-        .where(*by_datefilter(datearg),
-               not_(INCLUDING_INFLOW)) \
-        .group_by(Record.currency, 
-                  Record.category)
+    if (period := as_period(datearg)) is not None:
+        q = prepared("barchart.by_period")
+        params = {"period": str(period)}
+    else:
+        q = prepared("barchart.by_date")
+        params = datefilter_bounds(datearg)
     
-    df = pd.read_sql(q, ctx.engine, 
-                     index_col=['currency', 'category'])
+    df = read_frame(q, ctx.read_engine, 
+                     index_col=['currency', 'category'],
+                     params=params,
+                     explain=explain)
     return df
 
 
 def core_barchart(
-        datearg: Optional[ValidDateArgument] = None
+        datearg: Optional[ValidDateArgument] = None,
+        df: Optional[pd.DataFrame] = None,
 ) -> Figure:
     
-    df = fetch_barchart_data(datearg)    
+    # prefetched by `barchart_by_datefilter` when plotting several periods
+    if df is None:
+        df = fetch_barchart_data(datearg)
     currencies = df.groupby(level=0)["total_amount"].count().to_dict()
 
     # main figure creation
@@ -317,6 +372,8 @@ def barchart_by_datefilter(
     Clicking on a bar:
         - Highlights it in red. 
         - Prints the related records (date, description, amount).
+    For a list of periods, every period's data is fetched concurrently (see
+    `loader.gather`) before the first figure is drawn.
     """
     if dateargs is None or isinstance(dateargs, ParsablePeriod):
         fig = core_barchart(dateargs)
@@ -336,6 +393,8 @@ def barchart_by_datefilter(
         fig.show()
         return fig    
     else:
-        figs = [core_barchart(period) for period in periods]
+        dfs = gather(ctx.read_engine, 
+                     *(partial(fetch_barchart_data, period) for period in periods))
+        figs = [core_barchart(period, df) for period, df in zip(periods, dfs)]
         plt.show()
         return figs
\ No newline at end of file
@@ -2,7 +2,9 @@ from typing import Optional
 
 import pandas as pd
 import matplotlib.pyplot as plt
-from sqlalchemy import select, func, Label
+from functools import partial
+
+from sqlalchemy import Select, select, func, bindparam
 from matplotlib.figure import Figure
 from matplotlib.dates import DateFormatter
 
@@ -10,22 +12,33 @@ from pkg.utilities.core import pprint_df
 from pkg.utilities.typing import FrequencyType
 from pkg.utilities.prompt import prompt_category_from_keybinds
 from pkg.classes import ctx, Record
+from pkg.classes.model import MonthlyAggregate
+from pkg.classes.reader import read_frame
+from pkg.classes.statements import register, prepared
 from .shared import (
-    YEAR_MONTH_PERIOD_COL,
     TOTAL_AMOUNT_COL,
+    AGGREGATE_PERIOD_COL,
+    AGGREGATE_TOTAL_COL,
     raise_on_empty,
 )
 
 
 def get_freq_configs(freq: str = None) -> dict:
     configs = {
+        # weeks are not materialized, they're grouped from the records
         "w": {
+            "statement": "category_ts.w",
+            "entity": Record,
             "period_col": func.strftime('%Y %W 1', Record.date).label('period'),
+            "total_col": TOTAL_AMOUNT_COL,
             "zeroes": "W-MON",
             "date_fmt": '%Y %U %w'
         },
         "m": {
-            "period_col": YEAR_MONTH_PERIOD_COL,
+            "statement": "category_ts.m",
+            "entity": MonthlyAggregate,
+            "period_col": AGGREGATE_PERIOD_COL,
+            "total_col": AGGREGATE_TOTAL_COL,
             "zeroes": "MS",
             "date_fmt": '%Y-%m'
         }
@@ -46,24 +59,35 @@ def fill_zeroes(
     return df.reindex(zero_period).fillna(0)
 
 
+def _category_ts_stmt(freq: str) -> Select:
+    configs = get_freq_configs(freq)
+    entity = configs["entity"]
+    return select(entity.currency, 
+                  configs["period_col"], 
+                  configs["total_col"]
+            ) \
+            .where(entity.category == bindparam("category")) \
+            .group_by(entity.currency, 'period')
+
+
+# prebuilt once per frequency, see `pkg.classes.statements`
+for _freq in ("m", "w"):
+    register(f"category_ts.{_freq}")(partial(_category_ts_stmt, _freq))
+
+
 @raise_on_empty
 def fetch_category_ts_data(
-        periodcol: Label[str], 
+        configs: dict,
         category: str,
-        fmt: str, 
         /,
+        explain: bool = False,
 ) -> pd.DataFrame:
-    q = select(Record.currency, 
-               periodcol, 
-               TOTAL_AMOUNT_COL
-            ) \
-            .where(Record.category == category) \
-            .group_by(Record.currency, 'period')
-    
-    df = pd.read_sql(
-        q, ctx.engine, 
-        parse_dates={'period': fmt},
-        index_col=['currency', 'period']
+    df = read_frame(
+        prepared(configs["statement"]), ctx.read_engine, 
+        parse_dates={'period': configs["date_fmt"]},
+        index_col=['currency', 'period'],
+        params={"category": category},
+        explain=explain
     )
     return df
 
@@ -94,8 +118,7 @@ def category_time_series(
     category = prompt_category_from_keybinds(ctx.keybinds, category)
 
     configs = get_freq_configs(freq)
-    period = configs["period_col"]
-    df = fetch_category_ts_data(period, category, configs["date_fmt"])
+    df = fetch_category_ts_data(configs, category)
 
     # main plot
     fig, ax = plt.subplots()
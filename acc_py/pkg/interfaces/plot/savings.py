@@ -4,10 +4,12 @@ from sqlalchemy import select, case
 from sqlalchemy.sql import functions
 from matplotlib.figure import Figure
 
-from pkg.classes.model import Record
+from pkg.classes.model import MonthlyAggregate
 from pkg.classes.context import ctx
+from pkg.classes.reader import read_frame
 from .shared import (
-    YEAR_MONTH_PERIOD_COL,
+    AGGREGATE_INFLOW,
+    AGGREGATE_PERIOD_COL,
     sum_currencies,
     get_config,
     raise_on_empty,
@@ -15,22 +17,22 @@ from .shared import (
 
 
 @raise_on_empty
-def fetch_savings_data() -> pd.DataFrame:
-    """Quick `savings_plot` data fetcher."""
+def fetch_savings_data(explain: bool = False) -> pd.DataFrame:
+    """Quick `savings_plot` data fetcher. `explain` prints the query plan."""
 
     # compute savings query
-    is_inflow = Record.category.in_(ctx.inflow_categories)
-    flow = case((is_inflow, +1), else_=-1) * Record.amount
+    flow = case((AGGREGATE_INFLOW, +1), else_=-1) * MonthlyAggregate.total
     savings = functions.sum(flow).label('savings')
 
-    q = select(YEAR_MONTH_PERIOD_COL, 
-               Record.currency, 
+    q = select(AGGREGATE_PERIOD_COL, 
+               MonthlyAggregate.currency, 
                savings
             ) \
-            .group_by('period', Record.currency)
+            .group_by('period', MonthlyAggregate.currency)
 
-    df = pd.read_sql(q, ctx.engine, ['period', 'currency'],
-        parse_dates={'period' : {'format' : '%Y-%m'}}
+    df = read_frame(q, ctx.read_engine, index_col=['period', 'currency'],
+        parse_dates={'period' : {'format' : '%Y-%m'}},
+        explain=explain
     )
     return df
 
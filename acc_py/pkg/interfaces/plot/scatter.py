@@ -10,11 +10,12 @@ from matplotlib.figure import Figure
 from pkg.utilities.typing import ParsablePeriod
 from pkg.utilities.parser import parse_period
 from pkg.utilities.core import pprint_df
-from pkg.classes.model import Record
+from pkg.classes.model import MonthlyAggregate
 from pkg.classes.context import ctx
-from .shared import (YEAR_MONTH_PERIOD_COL,
-                     TOTAL_AMOUNT_COL,
-                     INCLUDING_INFLOW,
+from pkg.classes.reader import read_frame
+from .shared import (AGGREGATE_PERIOD_COL,
+                     AGGREGATE_TOTAL_COL,
+                     AGGREGATE_INFLOW,
                      negatecolor,
                      get_bkgcolor,
                      raise_on_empty)
@@ -68,18 +69,19 @@ def scattered_map(
 
 
 @raise_on_empty
-def get_outflow_data() -> pd.DataFrame:
-    q = select(Record.currency, 
-               YEAR_MONTH_PERIOD_COL, 
-               TOTAL_AMOUNT_COL) \
-        .where(not_(INCLUDING_INFLOW)) \
-        .group_by(Record.currency, 
-                  YEAR_MONTH_PERIOD_COL)
+def get_outflow_data(explain: bool = False) -> pd.DataFrame:
+    q = select(MonthlyAggregate.currency, 
+               AGGREGATE_PERIOD_COL, 
+               AGGREGATE_TOTAL_COL) \
+        .where(not_(AGGREGATE_INFLOW)) \
+        .group_by(MonthlyAggregate.currency, 
+                  AGGREGATE_PERIOD_COL)
     
-    df = pd.read_sql(
-        q, ctx.engine, 
+    df = read_frame(
+        q, ctx.read_engine, 
         parse_dates={"period": {"format" : "%Y-%m"}},
-        index_col=['currency', 'period']
+        index_col=['currency', 'period'],
+        explain=explain
     )    
     return df
 
@@ -7,7 +7,7 @@ from matplotlib.colors import to_rgb
 from sqlalchemy.sql import functions, func
 from sqlalchemy import Label
 
-from pkg.classes.model import Record
+from pkg.classes.model import Record, MonthlyAggregate
 from pkg.classes.context import ctx
 from pkg.utilities.typing import (
     CurrencyAmountType,
@@ -23,6 +23,11 @@ YEAR_MONTH_PERIOD_COL: Label[str] = func \
                                     .label("period")
 TOTAL_AMOUNT_COL = functions.sum(Record.amount).label("total_amount")
 
+# same columns, read from the materialized monthly totals
+AGGREGATE_INFLOW = MonthlyAggregate.category.in_(ctx.inflow_categories)
+AGGREGATE_PERIOD_COL: Label[str] = MonthlyAggregate.period.label("period")
+AGGREGATE_TOTAL_COL = functions.sum(MonthlyAggregate.total).label("total_amount")
+
 #endregion =====================================================================
 
 
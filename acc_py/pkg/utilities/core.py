@@ -62,7 +62,7 @@ class fg:
 
 def soft_warning(s : str) -> None:
     """Print soft warning."""
-    print(f"{fg.red}{s}{fg.end}")
+    print(f"{fg.red}{s}{fg.reset}")
 
 
 def ensure(
@@ -12,12 +12,25 @@ def acccli():
         "bdf": da.build_df,
         "e": da.edit,
         "fetch": da.fetch,
+        "fetch_iter": da.fetch_iter,
+        "fetchstats": da.fetch_cache_stats,
+        "summarize": da.summarize,
+        "ledgerstats": da.ledger_cache_stats,
+        "top_n": da.top_n,
+        "running_total": da.running_total,
+        "quantiles": da.quantiles,
         "d": da.delete,
         "r": da.read,
         "w": da.write_record,
         "gr": da.get_record,
         "wc": da.write_conversion,
         "wdf": da.write_df,
+        "rebuild": da.rebuild_aggregates,
+        "transaction": da.transaction,
+        "close": da.close_year,
+        "reopen": da.open_year,
+        "cachestats": compiled_cache_stats,
+        "cancelstats": cancellation_stats,
         "Record": Record,
         "Conversion": Conversion,
     
@@ -4,8 +4,9 @@ Some parsers import Record and Session from db.model: be careful.
 Basic functionality: take user input and return what is documented.
 All parsers should raise, and try as much as possible.
 """
-from typing import List
+from typing import List, Any
 from datetime import date, timedelta
+from functools import lru_cache
 import re
 from pathlib import Path
 from io import StringIO
@@ -18,14 +19,20 @@ from pandas.api.types import is_string_dtype, is_numeric_dtype
 from sqlalchemy import (
     Select, 
     Engine,
+    String,
     select, 
     true, 
     text, 
+    and_,
+    or_,
+    not_,
+    type_coerce,
 )
 from sqlalchemy.orm import Session
 from sqlalchemy.sql.elements import ColumnElement
 
-from pkg.classes.model import Record, Conversion
+from pkg.classes.model import Record, Conversion, DESCRIPTION_FTS
+from pkg.utilities.typing import EntityFilter
 
 
 DATE_COLUMN_FORMAT = "%Y-%m-%d"
@@ -254,13 +261,181 @@ def parse_period(
             raise ValueError(f"Could not parse {period=}.")
 
 
+def parse_date_range(
+        expr : str | date | pd.Period
+) -> tuple[date, date]:
+    """
+    Parses `expr` into half-open `[lower, upper)` date bounds.
+
+    Arguments
+    ---------
+    expr
+        - `pd.Period` of any frequency (year, month, week, day...).
+        - `datetime.date`: that single day.
+        - 'YYYY': the whole year.
+        - 'YYYY-MM' (or 'YYYY MM', 'YYYY/MM'): the whole month.
+        - 'YYYY-Www': ISO week, e.g. '2025-W07'.
+        - Anything else is passed to `parse_date` as a single day.
+    """
+    if isinstance(expr, pd.Period):
+        return expr.start_time.date(), (expr + 1).start_time.date()
+    if isinstance(expr, date):
+        return expr, expr + timedelta(days=1)
+    if not isinstance(expr, str):
+        raise TypeError(f"Argument {expr=} must be str, date or Period.")
+
+    expr = expr.strip().replace("'", "").replace('"', '')
+    if re.fullmatch(r'\d{4}', expr):
+        return parse_date_range(pd.Period(year=int(expr), freq='Y'))
+    if (match := re.fullmatch(r'(\d{4})-?W(\d{1,2})', expr, re.IGNORECASE)):
+        year, week = map(int, match.groups())
+        monday = date.fromisocalendar(year, week, 1)
+        return monday, monday + timedelta(weeks=1)
+    if (match := re.fullmatch(r'(\d{4}) *[-/ ] *(\d{1,2})', expr)):
+        year, month = map(int, match.groups())
+        if not 1 <= month <= 12:
+            raise ValueError(f"Invalid {month=} in {expr=}.")
+        return parse_date_range(pd.Period(year=year, month=month, freq='M'))
+    if re.fullmatch(r'\d{4}-\d{2}-\d{2}', expr):
+        return parse_date_range(date.fromisoformat(expr))
+    return parse_date_range(parse_date(expr))
+
+
+def parse_date_wildcard(
+        wildcard : str
+) -> tuple[str, str] | None:
+    """
+    Parses a `LIKE`-style prefix wildcard over ISO dates (e.g. '2025-03%') 
+    into half-open string bounds: ('2025-03', '2025-03:'). 
+    Returns None when `wildcard` is not a plain prefix pattern, so it can only
+    be matched with `LIKE`.
+    """
+    match = re.fullmatch(r'([\d-]+)%', wildcard.strip())
+    if not match:
+        return None
+    prefix = match.group(1)
+    # ISO dates only hold digits and '-', both sorting before ':'
+    upper = prefix + ':'
+    # a bare number gets NUMERIC affinity against the DATE column and stops
+    # comparing as text: bound partial years by their first possible date
+    if prefix.isdigit():
+        return prefix.ljust(4, '0') + '-', upper
+    return prefix, upper
+
+
+def date_range_filter(
+        lower : date | str,
+        upper : date | str
+) -> EntityFilter:
+    """
+    Sargable `lower <= Record.date < upper` predicate, so the date index can
+    be range-scanned. String bounds are compared against the ISO text stored 
+    in SQLite.
+    """
+    column = Record.date
+    if isinstance(lower, str):
+        column = type_coerce(Record.date, String)
+    return (column >= lower, column < upper)
+
+
+def parse_description_match(
+        terms : List[str],
+        full_text : bool = True
+) -> ColumnElement[bool]:
+    """
+    Parses `desc match` terms into a token search over descriptions. Every 
+    term must match; a trailing `*` makes it a prefix search.
+    Relies on the `cuentas_fts` index when `full_text`, otherwise falls back 
+    to a `LIKE '%term%'` per term.
+    """
+    words = []
+    for term in terms:
+        term = term.replace('"', '').replace("'", '')
+        word = term.rstrip('*')
+        if word:
+            words.append((word, term.endswith('*')))
+    if not words:
+        raise ValueError(f"Invalid description match: {terms=}.")
+
+    if not full_text:
+        return and_(*[Record.description.like(f"%{word}%") for word, _ in words])
+
+    # quoted tokens so punctuation is never read as fts5 query syntax
+    query = ' '.join(f'"{word}"' + ('*' if prefix else '') 
+                     for word, prefix in words)
+    matches = select(DESCRIPTION_FTS.c.rowid) \
+              .where(DESCRIPTION_FTS.c.description.match(query))
+    return Record.id.in_(matches)
+
+
+#region =========================== regex ======================================
+
+REGEX_METACHARACTERS = set(".^$*+?{}[]\\|()")
+REGEX_QUANTIFIERS = set("*?{")
+
+
+@lru_cache(maxsize=256)
+def compile_regex(pattern : str) -> re.Pattern:
+    """`re.compile`, memoized: SQLite calls REGEXP once per row."""
+    return re.compile(pattern)
+
+
+def sqlite_regexp(pattern : str, value : Any) -> bool:
+    """REGEXP implementation registered on every connection: `value REGEXP pattern`."""
+    if pattern is None or value is None:
+        return False
+    return compile_regex(pattern).search(str(value)) is not None
+
+
+def regex_literal_prefix(pattern : str) -> str:
+    """
+    Literal text every match of `pattern` starts with, e.g. '^FOOD-.*' -> 
+    'FOOD-'. Empty when the pattern is not anchored or has alternations.
+    """
+    if not pattern.startswith('^') or '|' in pattern:
+        return ''
+    prefix = []
+    for i, char in enumerate(pattern[1:], 1):
+        if char in REGEX_METACHARACTERS:
+            # 'ab*' only guarantees 'a'
+            if char in REGEX_QUANTIFIERS and prefix:
+                prefix.pop()
+            break
+        prefix.append(char)
+    return ''.join(prefix)
+
+
+def parse_regex_filter(
+        column : ColumnElement,
+        pattern : str
+) -> ColumnElement[bool]:
+    """
+    `column REGEXP pattern`, with an indexable range predicate on the 
+    pattern's literal prefix pushed alongside it, so the Python regex only 
+    runs on rows that can actually match.
+    """
+    regex = column.regexp_match(pattern)
+    if not (prefix := regex_literal_prefix(pattern)):
+        return regex
+    if column is Record.date:
+        if not (bounds := parse_date_wildcard(prefix + '%')):
+            return regex
+        return and_(*date_range_filter(*bounds), regex)
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper, regex)
+
+#endregion =====================================================================
+
+
 def core_semantic_filter_parse(
-        semantic_filter : str
+        semantic_filter : str,
+        full_text : bool = True
 ) -> tuple[ColumnElement[bool]]:
     """
     Meant to parse a single stmt into a semantically-valid SQL query.
     **IMPORTANT** the query is not necessarily valid, it can't be known until 
     runtime. 
+    `full_text` tells whether `desc match` can use the FTS5 index.
     """
     match semantic_filter.split():
 
@@ -300,14 +475,22 @@ def core_semantic_filter_parse(
         # ---------------------------- date filters ----------------------------
         case ["date", "like", *date_wildcard]:
             date_ = ' '.join(date_wildcard).replace('"','').replace("'","")
+            if (bounds := parse_date_wildcard(date_)):
+                return and_(*date_range_filter(*bounds))
             return Record.date.like(date_)
         
+        case ["date", "in", *period]:
+            if len(period) == 0:
+                raise ValueError("Invalid date range filter.")
+            bounds = parse_date_range(' '.join(period))
+            return and_(*date_range_filter(*bounds))
+        
         case ["date", "=" | "equal", *date_]:
             date_str = ' '.join(date_)
             return Record.date == parse_date(date_str).strftime(DATE_COLUMN_FORMAT)
         
         case ["date", ("r" | "regex" | "regexp"), date_regex]:
-            return Record.date.regexp_match(date_regex)
+            return parse_regex_filter(Record.date, date_regex)
 
         # -------------------------- category filters --------------------------
         case ["category" | "cat", "like", category_wildcard]:
@@ -319,7 +502,7 @@ def core_semantic_filter_parse(
             return Record.category.like(category_wildcard)
         
         case ["category" | "cat", ("r" | "regex" | "regexp"), category_]:
-            return Record.category.regexp_match(category_)
+            return parse_regex_filter(Record.category, category_)
         
         case ["category" | "cat", category_]:
             category_ = category_.replace('\'', '').replace('\"', '').upper()
@@ -350,7 +533,10 @@ def core_semantic_filter_parse(
             if len(description_regex) == 0 :
                 raise ValueError("Invalid description regex match.")
             description_regex = ' '.join(description_regex)
-            return Record.description.regexp_match(description_regex)
+            return parse_regex_filter(Record.description, description_regex)
+        
+        case [ "description" | "desc", "match", *terms]:
+            return parse_description_match(terms, full_text)
         
         # ----------------------------- true match -----------------------------
         case [  ] | [ "true" | "True" ]:
@@ -364,12 +550,160 @@ def core_semantic_filter_parse(
             )
 
 
+#region ======================= boolean filters ================================
+
+"""
+    grammar, loosest binding first:
+        filter  :=  and ( '||' and )*
+        and     :=  not ( '&&' not )*
+        not     :=  '!' not | '(' filter ')' | clause
+    a clause is anything `core_semantic_filter_parse` understands. Parentheses
+    opened inside a clause (e.g. a regex group) belong to the clause, and so
+    does a ')' closing no open group, or not followed by the end of the 
+    filter, an operator or another ')' (e.g. `desc like %:)%`).
+"""
+
+FILTER_OPERATORS = ("&&", "||")
+
+
+def _closes_group(rest : str) -> bool:
+    """Whether a ')' followed by `rest` can close a group, see grammar."""
+    rest = rest.lstrip()
+    return not rest or rest.startswith((*FILTER_OPERATORS, ")"))
+
+
+def _tokenize_filter(general_filter : str) -> List[tuple[str, str]]:
+    """Splits a filter into ('op', '&&' | '||' | '!' | '(' | ')') and ('clause', text) tokens."""
+    # `depth`: parentheses open inside the current clause, `groups`: open '(' ops
+    tokens, clause, depth, groups = [], [], 0, 0
+
+    def flush():
+        if (stmt := ''.join(clause).strip()):
+            tokens.append(("clause", stmt))
+        clause.clear()
+
+    i = 0
+    while i < len(general_filter):
+        pair, char = general_filter[i:i + 2], general_filter[i]
+        starting = not ''.join(clause).strip()
+        if pair in FILTER_OPERATORS and depth == 0:
+            flush()
+            tokens.append(("op", pair))
+            i += 2
+            continue
+        closing = (char == ")" and depth == 0 and groups > 0
+                   and _closes_group(general_filter[i + 1:]))
+        if (starting and char in "!(") or closing:
+            flush()
+            tokens.append(("op", char))
+            groups += (char == "(") - (char == ")")
+        else:
+            if char == "(":
+                depth += 1
+            elif char == ")" and depth > 0:
+                depth -= 1
+            clause.append(char)
+        i += 1
+    flush()
+    return tokens
+
+
+class _FilterParser:
+    """Recursive descent over `_tokenize_filter` tokens, see grammar above."""
+
+    def __init__(self, general_filter : str, full_text : bool) -> None:
+        self.general_filter = general_filter
+        self.full_text = full_text
+        self.tokens = _tokenize_filter(general_filter)
+        self.position = 0
+
+    def _peek(self) -> tuple[str, str] | None:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def _error(self, reason : str) -> ValueError:
+        return ValueError(
+            f"Invalid input. {reason} in semantic_filter={self.general_filter!r}."
+        )
+
+    def parse(self) -> ColumnElement[bool]:
+        expr = self._or()
+        if (token := self._peek()) is not None:
+            raise self._error(f"Unexpected {token[1]!r}")
+        return expr
+
+    def _or(self) -> ColumnElement[bool]:
+        terms = [self._and()]
+        while self._peek() == ("op", "||"):
+            self.position += 1
+            terms.append(self._and())
+        return terms[0] if len(terms) == 1 else or_(*terms)
+
+    def _and(self) -> ColumnElement[bool]:
+        terms = [self._not()]
+        while self._peek() == ("op", "&&"):
+            self.position += 1
+            terms.append(self._not())
+        return terms[0] if len(terms) == 1 else and_(*terms)
+
+    def _not(self) -> ColumnElement[bool]:
+        token = self._peek()
+        # empty clauses match everything, e.g. 'cat FOOD && '
+        if token in (None, ("op", "&&"), ("op", "||"), ("op", ")")):
+            return core_semantic_filter_parse('', self.full_text)
+        self.position += 1
+        match token:
+            case ("op", "!"):
+                return not_(self._not())
+            case ("op", "("):
+                expr = self._or()
+                if self._peek() != ("op", ")"):
+                    raise self._error("Unbalanced parentheses")
+                self.position += 1
+                return expr
+            case ("clause", stmt):
+                return core_semantic_filter_parse(stmt, self.full_text)
+            case _:
+                raise self._error(f"Unexpected {token[1]!r}")
+
+
+@lru_cache(maxsize=256)
+def _parse_filter_expression(
+        normalized : str,
+        full_text : bool,
+        today : date
+) -> ColumnElement[bool]:
+    """
+    Memoized parse of a normalized filter. `today` is part of the key 
+    because relative dates ('yesterday', '-3') resolve against it.
+    """
+    return _FilterParser(normalized, full_text).parse()
+
+
+def parse_filter_expression(
+        general_filter : str,
+        full_text : bool = True
+) -> ColumnElement[bool]:
+    """
+    Parses clauses joined by `&&`, `||`, prefixed by `!` and grouped by
+    parentheses into a single boolean expression, e.g.
+    `(cat FOOD || cat RENT) && !currency USD`. Identical filters, up to 
+    whitespace, are parsed once.
+    """
+    normalized = ' '.join(general_filter.split())
+    return _parse_filter_expression(normalized, full_text, date.today())
+
+#endregion =====================================================================
+
+
 def parse_semantic_filter(
-        general_filter : str
+        general_filter : str,
+        full_text : bool = True
 )-> Select[tuple[Record]]:
     """
-    Runs parse_core_semantic_filter splitted by 'and'. 
-    At the moment, no support for other boolean concatenators.
+    Parses a boolean combination of `core_semantic_filter_parse` clauses 
+    (see `parse_filter_expression`) into a single select.
     It allows raw SQL select statement via 'sql: select ...'.
     Prevents update, insert and drop statements from evaluation.
     """
@@ -381,11 +715,7 @@ def parse_semantic_filter(
             raise ValueError(f"UPDATE, INSERT and DROP are not allowed.")
         return text(general_filter.replace("sql: ", ""))
 
-    sql_expr_and = [
-        core_semantic_filter_parse(stmt) 
-        for stmt in general_filter.split('&&')
-    ]
-    return select(Record).where(*sql_expr_and)
+    return select(Record).where(parse_filter_expression(general_filter, full_text))
 
 
 def parse_element_from_dict(
@@ -478,6 +808,10 @@ def sanitize_df(
     errors : List[str] = []
     if not must_exist_columns.issubset(df.columns):
         raise ValueError(f"DataFrame must contain the following columnts: {must_exist_columns}.")
+    # `fetch` returns these as `category` dtype
+    for column in ("currency", "category"):
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
     if is_numeric_dtype(df.amount):
         if not (df.amount > 0).all():
             errors.append("df.amount contains a (or more) negatives values.")
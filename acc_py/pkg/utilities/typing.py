@@ -12,6 +12,7 @@ from sqlalchemy import ColumnElement
 StrDict = dict[str, str]
 FieldDictType = list[dict[str, str | list[StrDict]]]
 KeybindDictType = dict[str, str | dict[str, str]]
+SqliteProfileType = dict[str, str | int]
 
 # exchange related stuff
 CurrencyAmountType = dict[str, float]
@@ -1,8 +1,8 @@
 from pathlib import Path
 from typing import Callable
 from unittest.mock import MagicMock, patch
-from pkg.classes.model import Base
-from sqlalchemy import Engine, create_engine
+from pkg.classes.model import create_tables, Record, MonthlyAggregate, Session
+from sqlalchemy import Engine, create_engine, inspect, text
 from datetime import date
 
 
@@ -13,6 +13,26 @@ TEST_FILE_DIRECTORY = Path(__file__).parent / "files"
 RUN_API_TEST = False
 TODAY = date.today()
 
+# `cuentas` and `conversions` as created before indexes, cents and fingerprints
+LEGACY_DDL = [
+    "CREATE TABLE cuentas (id INTEGER PRIMARY KEY, date DATE, "
+    "amount NUMERIC(10, 2), currency VARCHAR(3), description VARCHAR, "
+    "category VARCHAR)",
+    "CREATE TABLE conversions (id INTEGER PRIMARY KEY, date DATE, "
+    "base_currency VARCHAR(3), base_amount NUMERIC(10, 2), "
+    "target_currency VARCHAR(3), target_amount NUMERIC(10, 2), "
+    "description VARCHAR)",
+]
+# amounts of the records of `legacy_ledger`, ids 1 to 4
+LEGACY_AMOUNTS = [12.34, 0.1, 5, 1999.99]
+# (date, amount, currency, category) of the records of `seeded_engine`
+SEEDED_RECORDS = [
+    ("2025-01-05", 10.5, "USD", "FOOD"),
+    ("2025-01-20", 4.25, "USD", "FOOD"),
+    ("2025-01-21", 7.0, "EUR", "FOOD"),
+    ("2025-02-01", 100.0, "USD", "RENT"),
+]
+
 #endregion =====================================================================
 
 
@@ -61,10 +81,84 @@ def patch_builtin(f: Callable, **kwargs) -> Patcher:
 
 def mem_engine() -> Engine:
     engine = create_engine("sqlite:///:memory:")
-    Base.metadata.create_all(engine)
+    create_tables(engine)
+    return engine
+
+
+def legacy_engine() -> Engine:
+    """In-memory ledger as created before indexes, cents and fingerprints."""
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        for ddl in LEGACY_DDL:
+            conn.execute(text(ddl))
+    return engine
+
+
+def legacy_ledger() -> Engine:
+    """`legacy_engine` holding 4 records and 1 conversion, `Numeric` amounts."""
+    engine = legacy_engine()
+    with engine.begin() as conn:
+        for i, amount in enumerate(LEGACY_AMOUNTS, 1):
+            conn.execute(text(
+                "INSERT INTO cuentas VALUES "
+                f"({i}, '2025-01-0{i}', {amount}, 'USD', 'foo', 'BAR')"))
+        conn.execute(text(
+            "INSERT INTO conversions VALUES "
+            "(1, '2025-01-01', 'USD', 10.5, 'EUR', 9.75, 'foo')"))
+    return engine
+
+
+def seeded_engine() -> Engine:
+    """`mem_engine` holding `SEEDED_RECORDS`, ids 1 to 4."""
+    engine = mem_engine()
+    with Session(engine) as session:
+        for date_, amount, currency, category in SEEDED_RECORDS:
+            session.add(Record(date=date.fromisoformat(date_), 
+                               amount=amount, currency=currency, 
+                               description="foo", category=category))
+        session.commit()
     return engine
 
 
+def index_names(engine: Engine, table: str) -> set[str]:
+    return {ix["name"] for ix in inspect(engine).get_indexes(table)}
+
+
+def raw_column(
+        engine: Engine, 
+        table: str = "cuentas", 
+        column: str = "amount"
+) -> list:
+    """Stored values of `column`, by id, bypassing `Cents`."""
+    stmt = text(f"SELECT {column} FROM {table} ORDER BY id")
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(stmt)]
+
+
+def monthly_aggregates(engine: Engine) -> dict[tuple, tuple]:
+    """(period, currency, category): (total, count) of `monthly_aggregates`."""
+    with Session(engine) as session:
+        rows = session.query(MonthlyAggregate).all()
+        return {
+            (row.period, row.currency, row.category): (row.total, row.count)
+            for row in rows
+        }
+
+
+def fts_matches(engine: Engine, query: str) -> list[int]:
+    """Ids of the records whose description matches the FTS5 `query`."""
+    stmt = text("SELECT rowid FROM cuentas_fts WHERE cuentas_fts MATCH :q "
+                "ORDER BY rowid")
+    with engine.connect() as conn:
+        return conn.execute(stmt, {"q": query}).scalars().all()
+
+
+def stored_fingerprints(engine: Engine, source: str = "cuentas") -> list:
+    with engine.connect() as conn:
+        return conn.execute(text(
+            f"SELECT fingerprint FROM {source} ORDER BY id")).scalars().all()
+
+
 def session_mocker() -> MagicMock:
     mock_session = MagicMock()
     mock_session.__enter__ = MagicMock(return_value=mock_session)
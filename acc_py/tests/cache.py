@@ -0,0 +1,241 @@
+import unittest
+import tempfile
+import sqlite3
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import TestCase
+
+from sqlalchemy import create_engine, select, text, func
+
+from pkg.classes.cache import ResultCache, LedgerCache, UnsupportedFilter
+from pkg.classes.model import (
+    Record, create_tables, bump_ledger_version, ledger_changes,
+)
+from pkg.classes.reader import read_frame
+from tests._shared import (
+    TODAY,
+    patch_builtin,
+    mem_engine,
+)
+
+
+class TestResultCache(TestCase):
+
+    def setUp(self):
+        self.engine = mem_engine()
+        self._write(self.engine, "FOO")
+        self.cache = ResultCache(maxsize=2)
+
+    @staticmethod
+    def _write(engine, category):
+        with patch_builtin(print):
+            Record(date=TODAY, amount=1, currency="USD",
+                   description="foo", category=category).write(engine)
+
+    def _fetch(self, category, engine=None):
+        engine = engine or self.engine
+        stmt = select(Record).where(Record.category == category)
+        key = self.cache.key(stmt, engine, index_col='id')
+        if (df := self.cache.get(key, engine)) is None:
+            df = self.cache.put(key, read_frame(stmt, engine, index_col='id'))
+        return df
+
+    def test_hit_returns_a_copy(self):
+        self._fetch("FOO")
+        df = self._fetch("FOO")
+        df.loc[1, "amount"] = 99
+        self.assertEqual(1.0, self._fetch("FOO").amount[1])
+        stats = self.cache.stats()
+        self.assertEqual((2, 1), (stats["hits"], stats["misses"]))
+
+    def test_parameters_are_part_of_the_key(self):
+        self.assertEqual(1, len(self._fetch("FOO")))
+        self.assertEqual(0, len(self._fetch("BAR")))
+        self.assertEqual(0, self.cache.hits)
+
+    def test_writes_invalidate(self):
+        self._fetch("FOO")
+        self._write(self.engine, "FOO")
+        self.assertEqual(2, len(self._fetch("FOO")))
+        bump_ledger_version(self.engine)
+        self._fetch("FOO")
+        self.assertEqual(0, self.cache.hits)
+
+    def test_other_connections_invalidate(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{Path(tmp) / 'ledger.db'}"
+            engine = create_engine(url)
+            create_tables(engine)
+            self._fetch("FOO", engine)
+            # another process: a different engine on the same file
+            other = create_engine(url)
+            self._write(other, "FOO")
+            self.assertEqual(1, len(self._fetch("FOO", engine)))
+            self.assertEqual(0, self.cache.hits)
+            self._fetch("FOO", engine)
+            self.assertEqual(1, self.cache.hits)
+            # versions are read without holding a connection
+            self.assertEqual(0, engine.pool.checkedout())
+            self.cache.clear()
+            engine.dispose()
+            other.dispose()
+
+    def test_external_inserts_invalidate(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'ledger.db'
+            engine = create_engine(f"sqlite:///{path}")
+            create_tables(engine)
+            self.assertEqual(0, len(self._fetch("FOO", engine)))
+            # another process, outside sqlalchemy: a plain sqlite3 connection
+            other = sqlite3.connect(path)
+            with other:
+                other.execute(
+                    "INSERT INTO cuentas (date, amount, currency, description,"
+                    " category) VALUES ('2025-01-01', 100, 'USD', 'foo', 'FOO')")
+            other.close()
+            self.assertEqual(1, len(self._fetch("FOO", engine)))
+            self.assertEqual(0, self.cache.hits)
+            self._fetch("FOO", engine)
+            self.assertEqual(1, self.cache.hits)
+            self.cache.clear()
+            engine.dispose()
+
+    def test_external_description_edits_invalidate(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'ledger.db'
+            engine = create_engine(f"sqlite:///{path}")
+            create_tables(engine)
+            self._write(engine, "FOO")
+            self.assertEqual(["foo"], 
+                             list(self._fetch("FOO", engine).description))
+            # another process, outside sqlalchemy: a plain sqlite3 connection
+            other = sqlite3.connect(path)
+            with other:
+                other.execute("UPDATE cuentas SET description = 'edited'")
+            other.close()
+            self.assertEqual(["edited"], 
+                             list(self._fetch("FOO", engine).description))
+            self.assertEqual(0, self.cache.hits)
+            self.cache.clear()
+            engine.dispose()
+
+    def test_lru_eviction_and_footprint(self):
+        for category in ("FOO", "BAR", "BAZ"):
+            self._fetch(category)
+        self.assertEqual(2, len(self.cache))
+        self._fetch("FOO")
+        self.assertEqual(0, self.cache.hits)
+        self.assertGreater(self.cache.stats()["bytes"], 0)
+        self.cache.clear()
+        self.assertEqual(0, self.cache.stats()["bytes"])
+
+    def test_text_statements(self):
+        stmt = text("SELECT count(*) AS n FROM cuentas")
+        key = self.cache.key(stmt, self.engine)
+        self.assertIsNone(self.cache.get(key, self.engine))
+        self.cache.put(key, read_frame(stmt, self.engine))
+        self.assertEqual(1, self.cache.get(key, self.engine).n[0])
+
+
+class TestLedgerCache(TestCase):
+
+    def setUp(self):
+        self.engine = mem_engine()
+        self._write(self.engine, ("2025-01-01", 10.5, "USD", "FOO"),
+                                 ("2025-01-06", -3, "EUR", "BAR"),
+                                 ("2025-03-02", 7, "USD", "FOO"))
+        self.mirror = LedgerCache(self.engine)
+
+    @staticmethod
+    def _write(engine, *rows):
+        with patch_builtin(print):
+            for day, amount, currency, category in rows:
+                Record(date=date.fromisoformat(day), amount=amount, 
+                       currency=currency, description="foo", 
+                       category=category).write(engine)
+
+    def test_summarize(self):
+        df = self.mirror.summarize(None, ["category", "month"], 
+                                   ["sum", "count", "min"])
+        self.assertEqual([("BAR", "2025-01"), ("FOO", "2025-01"), 
+                          ("FOO", "2025-03")], list(df.index))
+        self.assertEqual([-3.0, 10.5, 7.0], list(df["sum"]))
+        self.assertEqual([1, 1, 1], list(df["count"]))
+        df = self.mirror.summarize(Record.category == "FOO", [], ["sum", "mean"])
+        self.assertEqual((17.5, 8.75), (df["sum"][0], df["mean"][0]))
+
+    def test_filters(self):
+        self.mirror.refresh()
+        where = lambda clause: list(self.mirror.where(clause))
+        self.assertEqual([True, False, True], 
+                         where(Record.amount.between(7, 10.5)))
+        self.assertEqual([False, True, True], 
+                         where(Record.date >= date(2025, 1, 6)))
+        self.assertEqual([True, True, False], where(
+            (Record.currency == "EUR") | ~(Record.date > "2025-01-31")))
+        self.assertEqual([False, False, False], 
+                         where(Record.category.in_(["BAZ"])))
+        for clause in (Record.description == "foo",
+                       Record.category.like("F%"),
+                       Record.date < "2025-02"):
+            with self.assertRaises(UnsupportedFilter):
+                self.mirror.where(clause)
+
+    def test_no_match(self):
+        df = self.mirror.summarize(Record.amount > 100, [], ["count", "max"])
+        self.assertEqual(0, df["count"][0])
+        self.assertTrue(df["max"].isna().all())
+        df = self.mirror.summarize(Record.amount > 100, ["day"], ["count"])
+        self.assertTrue(df.empty)
+
+    def test_weeks_match_sqlite(self):
+        days = [date(2023, 12, 25) + timedelta(days=i) for i in range(400)]
+        self._write(self.engine, *((day.isoformat(), 1, "USD", "FOO") 
+                                   for day in days))
+        week = func.strftime("%Y-W%W", Record.date).label("week")
+        stmt = select(week, func.count()).where(Record.id > 3) \
+                                         .group_by(week).order_by(week)
+        expected = read_frame(stmt, self.engine, index_col="week")
+        df = self.mirror.summarize(Record.id > 3, ["week"], ["count"])
+        self.assertEqual(list(expected.index), list(df.index))
+
+    def test_appends_only_new_records(self):
+        self.mirror.refresh()
+        self._write(self.engine, ("2025-04-01", 1, "GBP", "FOO"))
+        df = self.mirror.summarize(None, ["currency"], ["count"])
+        self.assertEqual(["EUR", "GBP", "USD"], list(df.index))
+        stats = self.mirror.stats()
+        self.assertEqual((4, 1, 1), 
+                         (stats["records"], stats["loads"], stats["appends"]))
+        # nothing to read while the ledger is unchanged
+        self.mirror.refresh()
+        self.assertEqual(1, self.mirror.stats()["appends"])
+
+    def test_edits_and_deletes_reload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{Path(tmp) / 'ledger.db'}"
+            engine = create_engine(url)
+            create_tables(engine)
+            self._write(engine, ("2025-01-01", 1, "USD", "FOO"), 
+                                ("2025-01-02", 2, "USD", "FOO"))
+            mirror = LedgerCache(engine)
+            mirror.refresh()
+            # another process: a different engine on the same file
+            other = create_engine(url)
+            with other.begin() as conn:
+                conn.execute(text("UPDATE cuentas SET description = 'bar'"))
+            self.assertEqual(0, ledger_changes(other))
+            with other.begin() as conn:
+                conn.execute(text("UPDATE cuentas SET amount = 500 WHERE id = 1"))
+                conn.execute(text("DELETE FROM cuentas WHERE id = 2"))
+            self.assertEqual(2, ledger_changes(other))
+            df = mirror.summarize(None, [], ["sum", "count"])
+            self.assertEqual((5.0, 1), (df["sum"][0], df["count"][0]))
+            self.assertEqual(2, mirror.stats()["loads"])
+            self.assertEqual(0, engine.pool.checkedout())
+            engine.dispose()
+            other.dispose()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from unittest import TestCase
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from sqlalchemy import text, create_engine
+from sqlalchemy.exc import OperationalError
+
+from pkg.classes.context import (
+    _sqlite_profile,
+    _sqlite_read_profile,
+    _engine,
+    _read_engine,
+    SQLITE_PRESETS,
+    READ_PROFILE,
+)
+from pkg.classes.model import create_tables
+
+
+class TestSqliteProfile(TestCase):
+
+    def test_defaults_to_safe(self):
+        self.assertEqual(SQLITE_PRESETS["safe"], _sqlite_profile(None))
+
+    def test_preset_name(self):
+        self.assertEqual(SQLITE_PRESETS["fast"], _sqlite_profile("fast"))
+
+    def test_overrides(self):
+        profile = _sqlite_profile({"preset": "fast", "synchronous": "full"})
+        self.assertEqual("FULL", profile["synchronous"])
+        self.assertEqual(SQLITE_PRESETS["fast"]["mmap_size"], 
+                         profile["mmap_size"])
+
+    def test_err(self):
+        cases = [
+            "not-a-preset",
+            {"preset": "foo"},
+            {"journal_mode": "bar"},
+            {"cache_size": "big"},
+            {"locking_mode": "EXCLUSIVE"},
+            ["safe"],
+        ]
+        for config in cases:
+            with self.subTest(config=config):
+                with self.assertRaises((ValueError, TypeError)):
+                    _sqlite_profile(config)
+
+    def test_pragmas_applied_on_connect(self):
+        profile = _sqlite_profile("fast")
+        with TemporaryDirectory() as tmp:
+            engine = _engine(str(Path(tmp) / "ledger.db"), profile)
+            with engine.connect() as conn:
+                journal = conn.execute(text("PRAGMA journal_mode")).scalar()
+                synchronous = conn.execute(text("PRAGMA synchronous")).scalar()
+                temp_store = conn.execute(text("PRAGMA temp_store")).scalar()
+            engine.dispose()
+        self.assertEqual("wal", journal)
+        # NORMAL = 1, MEMORY = 2
+        self.assertEqual(1, synchronous)
+        self.assertEqual(2, temp_store)
+
+
+class TestReadEngine(TestCase):
+
+    def test_read_profile(self):
+        profile = _sqlite_read_profile({"preset": "safe", 
+                                        "read": {"mmap_size": 0}})
+        self.assertNotIn("journal_mode", profile)
+        self.assertNotIn("read", _sqlite_profile({"read": {}}))
+        self.assertEqual(0, profile["mmap_size"])
+        self.assertEqual(READ_PROFILE["cache_size"], profile["cache_size"])
+        with self.assertRaises(ValueError):
+            _sqlite_read_profile({"read": {"locking_mode": "EXCLUSIVE"}})
+
+    def test_read_only(self):
+        with TemporaryDirectory() as tmp:
+            engine = _engine(str(Path(tmp) / "ledger.db"), 
+                             _sqlite_profile("safe"))
+            create_tables(engine)
+            read_engine = _read_engine(engine, _sqlite_read_profile("safe"))
+            self.assertIsNot(engine, read_engine)
+            with read_engine.connect() as conn:
+                self.assertEqual(1, conn.execute(
+                    text("PRAGMA query_only")).scalar())
+                self.assertEqual(0, conn.execute(
+                    text("SELECT count(*) FROM cuentas")).scalar())
+                with self.assertRaises(OperationalError):
+                    conn.execute(text("DELETE FROM cuentas"))
+            read_engine.dispose()
+            engine.dispose()
+
+    def test_memory_engine_is_shared(self):
+        engine = create_engine("sqlite://")
+        self.assertIs(engine, _read_engine(engine))
+
+
+if __name__ == "__main__":
+    unittest.main()
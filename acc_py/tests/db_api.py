@@ -0,0 +1,347 @@
+import unittest
+from datetime import date
+from unittest import TestCase
+from unittest.mock import patch
+
+import pandas as pd
+from sqlalchemy import select, text
+
+from pkg.classes.cache import UnsupportedFilter
+from pkg.classes.context import ctx
+from pkg.classes.model import Record
+from pkg.utilities.parser import sanitize_df
+import pkg.interfaces.db_api as da
+from tests._shared import (
+    patch_builtin,
+    mem_engine,
+)
+
+
+CATEGORIES = {"FOOD": "food", "RENT": "rent", "INGRESO": "income"}
+
+
+class LedgerTestCase(TestCase):
+    """Patches `ctx` onto an in-memory ledger holding `records`."""
+
+    # date, amount, currency, description, category
+    records = [
+        ("2025-01-05", 10.5, "USD", "lunch", "FOOD"),
+        ("2025-01-20", 500, "USD", "flat", "RENT"),
+        ("2025-02-03", 3, "EUR", "coffee", "FOOD"),
+        ("2025-02-28", 1000, "USD", "salary", "INGRESO"),
+    ]
+
+    def setUp(self):
+        self.engine = mem_engine()
+        context = patch.multiple(
+            ctx, engine=self.engine, read_engine=self.engine,
+            categories_dict=CATEGORIES, inflow_categories=["INGRESO"],
+            default_currency="USD", currency_list=["USD", "EUR"],
+        )
+        context.start()
+        self.addCleanup(context.stop)
+        da.RESULT_CACHE.clear()
+        with patch_builtin(print):
+            for day, amount, currency, description, category in self.records:
+                Record(date=date.fromisoformat(day), amount=amount,
+                       currency=currency, description=description,
+                       category=category).write(self.engine)
+
+    def _stored(self, *columns):
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(*(getattr(Record, c) for c in columns))
+                .order_by(Record.id)).all()
+
+    @staticmethod
+    def _df(*records):
+        return sanitize_df(pd.DataFrame(
+            records,
+            columns=["date", "amount", "currency", "description", "category"]
+        ), list(CATEGORIES))
+
+
+class TestBulkInsert(LedgerTestCase):
+
+    def test_columns_bound_by_name(self):
+        df = self._df(("2025-03-01", 7.25, "EUR", "bread", "FOOD"))
+        # any column order, extra columns ignored
+        df = df[["category", "description", "amount", "date", "currency"]]
+        with patch_builtin(print):
+            inserted = da.bulk_insert(df.assign(note="foo"), quiet=True)
+        self.assertEqual([5], inserted.index.tolist())
+        self.assertEqual(
+            (date(2025, 3, 1), 7.25, "EUR", "bread", "FOOD"),
+            tuple(self._stored("date", "amount", "currency",
+                               "description", "category")[-1]))
+
+
+class TestDuplicates(LedgerTestCase):
+
+    def _write(self, df, **kwargs):
+        with patch_builtin(print):
+            return da.write_df(df, **kwargs)
+
+    def test_kept_by_default(self):
+        df = self._df(("2025-01-05", 10.5, "usd", "Lunch", "FOOD"),
+                      ("2025-03-01", 1, "USD", "new", "FOOD"))
+        self.assertEqual([5, 6], self._write(df.copy()).index.tolist())
+        self.assertEqual(6, len(self._stored("id")))
+
+    def test_skip(self):
+        df = self._df(("2025-01-05", 10.5, "USD", "lunch", "FOOD"),
+                      ("2025-03-01", 1, "USD", "new", "FOOD"))
+        written = self._write(df, on_duplicate="skip")
+        self.assertEqual(["new"], written.description.tolist())
+        self.assertIsNone(self._write(df.iloc[:1], on_duplicate="skip"))
+        self.assertEqual(5, len(self._stored("id")))
+
+    def test_error(self):
+        df = self._df(("2025-01-05", 10.5, "USD", "lunch", "FOOD"))
+        with self.assertRaises(ValueError):
+            self._write(df, on_duplicate="error")
+        with self.assertRaises(ValueError):
+            self._write(df, on_duplicate="foo")
+        self.assertEqual(4, len(self._stored("id")))
+
+
+class TestDiffUpsert(LedgerTestCase):
+
+    def _stored_df(self):
+        columns = ["id", "date", "amount", "currency", "description", "category"]
+        df = pd.DataFrame(self._stored(*columns), columns=columns)
+        return df.assign(date=df.date.astype(str)).set_index("id")
+
+    def _update(self, df):
+        with patch_builtin(input, return_value="y"), \
+             patch_builtin(print) as mock_print, \
+             patch.object(da, "upsert_records", 
+                          wraps=da.upsert_records) as upsert:
+            da.write_df(df)
+        return upsert, mock_print
+
+    def test_only_changed_rows_and_columns(self):
+        df = self._stored_df()
+        df.loc[2, "description"] = "new flat"
+        df.loc[3, "amount"] = 99.99
+        upsert, _ = self._update(df)
+        written, columns = upsert.call_args.args
+        self.assertEqual([2, 3], written.index.tolist())
+        self.assertEqual(["amount", "description"], sorted(columns))
+        self.assertEqual(
+            [(10.5, "lunch"), (500, "new flat"), (99.99, "coffee"), 
+             (1000, "salary")],
+            self._stored("amount", "description"))
+
+    def test_amounts_compare_as_cents(self):
+        current = da._current_records([1, 3])
+        df = current.copy()
+        df.loc[1, "amount"] = 10.5 + 1e-9
+        df.loc[3, "amount"] = 3.0
+        self.assertFalse(da._diff_mask(df, current).any().any())
+        df.loc[3, "amount"] = 99.99
+        changed = da._diff_mask(df, current)
+        self.assertEqual([3], df.index[changed.any(axis=1)].tolist())
+        self.assertEqual(["amount"], 
+                         changed.columns[changed.any()].tolist())
+        self.assertEqual("3.0 -> 99.99", 
+                         da._diff_frame(df, current, changed).loc[3, "amount"])
+
+    def test_unknown_ids_and_missing_values(self):
+        current = da._current_records([1, 99])
+        self.assertEqual([1], current.index.tolist())
+        df = pd.concat([current, current.rename(index={1: 99})])
+        df.loc[1, "description"] = None
+        changed = da._diff_mask(df, current)
+        # a None is a change, an unknown id differs everywhere
+        self.assertEqual(["description"], 
+                         changed.columns[changed.loc[1]].tolist())
+        self.assertTrue(changed.loc[99].all())
+        cells = da._diff_frame(df, current, changed)
+        self.assertEqual("lunch -> None", cells.loc[1, "description"])
+        self.assertEqual(" -> lunch", cells.loc[99, "description"])
+        self.assertEqual("", cells.loc[1, "amount"])
+
+    def test_no_change_writes_nothing(self):
+        upsert, mock_print = self._update(self._stored_df())
+        upsert.assert_not_called()
+        mock_print.assert_called_with("No changes to write.")
+        self.assertEqual(4, len(self._stored("id")))
+
+
+class TestFetch(LedgerTestCase):
+
+    def test_categoricals_span_configured_values(self):
+        df = da.fetch("cat FOOD")
+        self.assertEqual(list(CATEGORIES), list(df.category.cat.categories))
+        self.assertEqual(["USD", "EUR"], list(df.currency.cat.categories))
+        # stored values missing from the config are kept
+        with patch.object(ctx, "currency_list", ["USD"]):
+            df = da.fetch("cat FOOD && cur EUR")
+        self.assertEqual(["EUR"], df.currency.tolist())
+
+    def test_edit_and_write_back(self):
+        df = da.fetch("cat FOOD")
+        df.loc[1, "category"] = "RENT"
+        df.loc[3, "currency"] = "USD"
+        with patch_builtin(input, return_value="y"), patch_builtin(print):
+            da.write_df(df)
+        self.assertEqual(
+            [("USD", "RENT"), ("USD", "RENT"), ("USD", "FOOD"), 
+             ("USD", "INGRESO")],
+            self._stored("currency", "category"))
+        self.assertEqual([2, 1], da.fetch("cat RENT").index.tolist())
+
+    def test_raw_sql_aggregates(self):
+        # raw queries are indexed on `id` too
+        df = da.fetch("sql: SELECT max(id) AS id, currency, sum(amount) AS "
+                      "total, max(amount) / 2 AS half FROM cuentas "
+                      "GROUP BY currency ORDER BY currency")
+        self.assertEqual([("EUR", 3.0, 1.5), ("USD", 1510.5, 500.0)],
+                         list(df.itertuples(index=False, name=None)))
+
+
+class TestSummarize(LedgerTestCase):
+
+    def _summarize(self, *args, **kwargs):
+        """`summarize` from the ledger mirror, checked against sqlite's."""
+        df = da.summarize(*args, **kwargs)
+        with patch.object(da.LedgerCache, "summarize", 
+                          side_effect=UnsupportedFilter):
+            pd.testing.assert_frame_equal(
+                df, da.summarize(*args, **kwargs), check_index_type=False)
+        return df
+
+    def test_groups_and_measures(self):
+        df = self._summarize("true", by=["category", "currency"], 
+                             agg=["sum", "count", "mean", "min", "max"])
+        self.assertEqual(
+            [("FOOD", "EUR"), ("FOOD", "USD"), ("INGRESO", "USD"), 
+             ("RENT", "USD")], list(df.index))
+        self.assertEqual(["category", "currency"], list(df.index.names))
+        self.assertEqual([3.0, 10.5, 1000.0, 500.0], df["sum"].tolist())
+        self.assertEqual("int64", str(df["count"].dtype))
+
+    def test_filtered(self):
+        df = self._summarize("cat FOOD && cur USD", by=["category"], 
+                             agg=["count"])
+        self.assertEqual({"FOOD": 1}, df["count"].to_dict())
+
+    def test_defaults(self):
+        df = self._summarize("true")
+        self.assertEqual(["category", "currency", "month"], df.index.names)
+        self.assertEqual(["sum", "count", "mean"], df.columns.tolist())
+
+    def test_empty_by(self):
+        df = self._summarize("!cat INGRESO", by=[], agg=["sum", "count"])
+        self.assertEqual(1, len(df))
+        self.assertEqual((513.5, 3), (df["sum"][0], df["count"][0]))
+
+    def test_period_labels(self):
+        df = self._summarize("true", by=["month"], agg=["sum"])
+        self.assertEqual({"2025-01": 510.5, "2025-02": 1003.0}, 
+                         df["sum"].to_dict())
+        # %W: weeks start on Monday, 2025-01-06 opens week 01
+        df = self._summarize("true", by=["week"], agg=["count"])
+        self.assertEqual(["2025-W00", "2025-W03", "2025-W05", "2025-W08"],
+                         df.index.tolist())
+        df = self._summarize("true", by=["year", "day"], agg=["count"])
+        self.assertEqual(("2025", "2025-01-05"), df.index[0])
+
+    def test_err(self):
+        cases = [
+            ({"by": ["foo"]}, ValueError),
+            ({"agg": []}, ValueError),
+            ({"agg": ["median"]}, ValueError),
+            ({"by": "month"}, TypeError),
+        ]
+        for kwargs, error in cases:
+            with self.subTest(kwargs=kwargs):
+                with self.assertRaises(error):
+                    da.summarize("true", **kwargs)
+        with self.assertRaises(ValueError):
+            da.summarize("sql: SELECT * FROM cuentas")
+
+
+class TestWindowFunctions(LedgerTestCase):
+
+    records = [
+        ("2025-01-05", 10, "USD", "lunch", "FOOD"),
+        ("2025-01-06", 30, "USD", "dinner", "FOOD"),
+        ("2025-01-07", 30, "USD", "groceries", "FOOD"),
+        ("2025-01-10", 8, "EUR", "bread", "FOOD"),
+        ("2025-01-20", 500, "USD", "flat", "RENT"),
+        ("2025-01-31", 1000, "USD", "salary", "INGRESO"),
+        ("2025-02-01", 5, "USD", "coffee", "FOOD"),
+        ("2025-02-20", 500, "USD", "flat", "RENT"),
+    ]
+
+    def test_top_n(self):
+        df = da.top_n("cur USD", n=2, by=["category"])
+        self.assertEqual(
+            [("FOOD", 1), ("FOOD", 2), ("INGRESO", 1), ("RENT", 1), ("RENT", 2)],
+            list(df.index))
+        # ties are broken by newest id
+        self.assertEqual(["groceries", "dinner"], 
+                         df.loc["FOOD"].description.tolist())
+        self.assertEqual([8, 5], df.loc["RENT"].id.tolist())
+        df = da.top_n("true", n=1, by=[])
+        self.assertEqual(["salary"], df.description.tolist())
+
+    def test_top_n_by_period(self):
+        df = da.top_n("cat FOOD", n=1, by=["month"])
+        self.assertEqual({("2025-01", 1): "groceries", ("2025-02", 1): "coffee"},
+                         df.description.to_dict())
+
+    def test_top_n_err(self):
+        for n in (0, -1):
+            with self.subTest(n=n):
+                with self.assertRaises(ValueError):
+                    da.top_n("true", n=n)
+
+    def test_running_total(self):
+        df = da.running_total("true", period="month")
+        self.assertEqual(
+            {("EUR", "2025-01"): 8.0, ("USD", "2025-01"): 1570.0, 
+             ("USD", "2025-02"): 2075.0},
+            df.running_total.to_dict())
+
+    def test_signed_running_total(self):
+        df = da.running_total("true", by=["currency"], period="month", 
+                              signed=True)
+        # salary adds up, everything else is an expense
+        self.assertEqual([-8.0, 430.0, -505.0], df.amount.tolist())
+        self.assertEqual([-8.0, 430.0, -75.0], df.running_total.tolist())
+        with patch.object(ctx, "inflow_categories", None):
+            with self.assertRaises(RuntimeError):
+                da.running_total("true", signed=True)
+
+    def test_running_total_err(self):
+        for kwargs in ({"period": "hour"}, {"by": ["month"], "period": "month"}):
+            with self.subTest(kwargs=kwargs):
+                with self.assertRaises(ValueError):
+                    da.running_total("true", **kwargs)
+
+    def test_quantiles(self):
+        df = da.quantiles("cur USD", q=2, by=["category"])
+        self.assertEqual(
+            {("FOOD", 1): (5.0, 10.0, 2), ("FOOD", 2): (30.0, 30.0, 2),
+             ("INGRESO", 1): (1000.0, 1000.0, 1),
+             ("RENT", 1): (500.0, 500.0, 1), ("RENT", 2): (500.0, 500.0, 1)},
+            {key: tuple(row) for key, row in 
+             zip(df.index, df[["lower", "upper", "count"]].itertuples(index=False))})
+        self.assertEqual("int64", str(df["count"].dtype))
+        with self.assertRaises(ValueError):
+            da.quantiles("true", q=0)
+
+    def test_default_groups(self):
+        self.assertEqual(["category", "month", "rank"], 
+                         da.top_n("true").index.names)
+        self.assertEqual(["currency", "period"], 
+                         da.running_total("true").index.names)
+        self.assertEqual(["category", "tile"], 
+                         da.quantiles("true").index.names)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import asyncio
+import tempfile
+import threading
+from functools import partial
+from pathlib import Path
+from unittest import TestCase
+
+from sqlalchemy import create_engine, select
+
+from pkg.classes.model import Record, create_tables
+from pkg.classes.reader import read_frame
+from pkg.classes.loader import gather, agather, concurrent_reads
+from tests._shared import (
+    TODAY,
+    patch_builtin,
+    mem_engine,
+)
+
+
+def _write(engine, *categories):
+    with patch_builtin(print):
+        for category in categories:
+            Record(date=TODAY, amount=1, currency="USD",
+                   description="foo", category=category).write(engine)
+
+
+class TestGather(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{Path(self.tmp.name) / 'ledger.db'}")
+        create_tables(self.engine)
+        _write(self.engine, "FOO", "FOO", "BAR")
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def _fetchers(self, *categories):
+        return [partial(read_frame,
+                        select(Record).where(Record.category == category),
+                        self.engine, index_col='id')
+                for category in categories]
+
+    def test_results_in_order(self):
+        self.assertTrue(concurrent_reads(self.engine))
+        dfs = gather(self.engine, *self._fetchers("FOO", "BAR", "BAZ"))
+        self.assertEqual([2, 1, 0], [len(df) for df in dfs])
+
+    def test_runs_on_worker_threads(self):
+        threads = gather(self.engine, threading.get_ident, threading.get_ident)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_failure_is_raised(self):
+        def fail():
+            raise ValueError("foo")
+        with self.assertRaises(ValueError):
+            gather(self.engine, *self._fetchers("FOO"), fail)
+
+    def test_awaitable(self):
+        dfs = asyncio.run(agather(self.engine, *self._fetchers("BAR", "FOO")))
+        self.assertEqual([1, 2], [len(df) for df in dfs])
+
+    def test_in_memory_reads_in_turn(self):
+        engine = mem_engine()
+        _write(engine, "FOO")
+        self.assertFalse(concurrent_reads(engine))
+        stmt = select(Record)
+        fetch = partial(read_frame, stmt, engine)
+        dfs = gather(engine, fetch, fetch, threading.get_ident)
+        self.assertEqual([1, 1], [len(df) for df in dfs[:2]])
+        self.assertEqual(threading.get_ident(), dfs[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+import sqlite3
+import tempfile
+from pathlib import Path
+from datetime import date
+from unittest import TestCase
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, text
+
+from pkg.classes.model import (
+    Record, CENTS_SCALE, 
+    sync_amount_storage, create_tables, close_year, open_year, 
+    record_fingerprint,
+)
+from pkg.classes.migrations import (
+    MIGRATIONS,
+    Migration,
+    migration,
+    migrate,
+    current_version,
+    pending_migrations,
+)
+from tests._shared import (
+    TODAY,
+    patch_builtin,
+    mem_engine,
+    legacy_ledger,
+    raw_column,
+)
+
+
+def _bump_amounts(run):
+    run.ddl("CREATE INDEX IF NOT EXISTS ix_cuentas_amount ON cuentas (amount)")
+    run.backfill("cuentas", "amount = amount + 1")
+
+
+class TestMigrate(TestCase):
+
+    def setUp(self):
+        self.engine = mem_engine()
+        with patch_builtin(print):
+            for i in range(5):
+                Record(date=TODAY, amount=i, currency="USD",
+                       description="foo", category="BAR").write(self.engine)
+
+    def _registry(self):
+        latest = max(MIGRATIONS)
+        bump = Migration(latest + 1, "bump amounts", _bump_amounts)
+        return patch.dict(MIGRATIONS, {bump.version: bump})
+
+    def test_applies_once(self):
+        with patch_builtin(print):
+            self.assertEqual(sorted(MIGRATIONS), migrate(self.engine))
+        self.assertEqual(max(MIGRATIONS), current_version(self.engine))
+        self.assertEqual([], pending_migrations(self.engine))
+        self.assertEqual([], migrate(self.engine))
+
+    def test_duplicate_version(self):
+        with self.assertRaises(ValueError):
+            migration(min(MIGRATIONS), "foo")(_bump_amounts)
+
+    def test_batched_backfill(self):
+        with self._registry(), patch_builtin(print) as mock_print:
+            migrate(self.engine, chunksize=2)
+        self.assertEqual([0, 100, 200, 300, 400],
+                         [amount - 1 for amount in raw_column(self.engine)])
+        mock_print.assert_called_with(
+            "bump amounts: 5/5 rows backfilled (last id: 5).")
+
+    def test_interrupted_backfill_resumes(self):
+        interrupted = [None, KeyboardInterrupt]
+        # only the test migration is left, so it gets interrupted
+        with patch_builtin(print):
+            migrate(self.engine)
+        with self._registry(), patch_builtin(print), \
+             patch("pkg.classes.migrations.sleep", side_effect=interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                migrate(self.engine, chunksize=2, pause=1)
+            # first two batches committed, the rest untouched
+            self.assertEqual([1, 101, 201, 301, 400], raw_column(self.engine))
+            self.assertEqual(max(MIGRATIONS) - 1, current_version(self.engine))
+            migrate(self.engine, chunksize=2)
+            self.assertEqual(max(MIGRATIONS), current_version(self.engine))
+        # no row was updated twice
+        self.assertEqual([1, 101, 201, 301, 401], raw_column(self.engine))
+
+    def test_target(self):
+        with self._registry():
+            self.assertEqual([1], migrate(self.engine, target=1))
+            self.assertEqual(1, current_version(self.engine))
+
+    def test_legacy_ledger_is_migrated_to_cents(self):
+        engine = legacy_ledger()
+        sync_amount_storage(engine)
+        with patch_builtin(print):
+            migrate(engine, chunksize=3)
+        self.assertEqual(CENTS_SCALE, engine.dialect.amount_scale)
+        with engine.connect() as conn:
+            amount, fingerprint = conn.execute(text(
+                "SELECT amount, fingerprint FROM cuentas WHERE id = 4")).one()
+        self.assertEqual(199999, amount)
+        self.assertEqual(
+            record_fingerprint("2025-01-04", 199999, "USD", "foo"), fingerprint)
+
+
+class TestRecordFingerprints(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{Path(self.tmp.name, 'ledger.db')}")
+        create_tables(self.engine)
+        with patch_builtin(print):
+            migrate(self.engine)
+            for year in (2023, 2024):
+                Record(date=date(year, 1, 1), amount=1, currency="USD",
+                       description="Foo", category="BAR").write(self.engine)
+            close_year(self.engine, 2023)
+        # a ledger (and partition) from before fingerprints, edited without
+        # the `ledger` view of the engine's connections
+        self.engine.dispose()
+        path = Path(self.tmp.name)
+        with sqlite3.connect(path / "ledger.db") as conn:
+            conn.execute(f"ATTACH DATABASE '{path / 'ledger.2023.db'}' AS y2023")
+            for schema in ("main", "y2023"):
+                conn.execute(f"DROP INDEX {schema}.ix_cuentas_fingerprint")
+                conn.execute(f"ALTER TABLE {schema}.cuentas DROP COLUMN fingerprint")
+            conn.execute("DELETE FROM schema_version WHERE version = 2")
+        conn.close()
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_backfilled_everywhere(self):
+        with patch_builtin(print):
+            self.assertEqual([2], migrate(self.engine))
+        with self.engine.connect() as conn:
+            stored = conn.execute(text(
+                "SELECT fingerprint FROM ledger ORDER BY id")).scalars().all()
+            indexes = conn.execute(text(
+                "SELECT count(*) FROM y2023.sqlite_master "
+                "WHERE name = 'ix_cuentas_fingerprint'")).scalar()
+        expected = [record_fingerprint(f"{year}-01-01", 100, "USD", "foo")
+                    for year in (2023, 2024)]
+        self.assertEqual(expected, stored)
+        self.assertEqual(1, indexes)
+
+    def test_closed_years_are_frozen_while_interrupted(self):
+        interrupted = patch("pkg.classes.migrations.sleep", 
+                            side_effect=KeyboardInterrupt)
+        with patch_builtin(print), interrupted:
+            with self.assertRaises(KeyboardInterrupt):
+                migrate(self.engine, chunksize=1, pause=1)
+            # the resumed steps are numbered against 2023 being closed
+            with self.assertRaises(ValueError):
+                close_year(self.engine, 2024)
+            with self.assertRaises(ValueError):
+                open_year(self.engine, 2023)
+            self.assertEqual([2], migrate(self.engine))
+            self.assertEqual(1, open_year(self.engine, 2023))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
 import unittest
+import tempfile
+from pathlib import Path
 from unittest import TestCase
 from unittest.mock import patch, MagicMock, call
 from typing import Callable
 
+from sqlalchemy import create_engine, text
+
 from pkg.classes.model import (
     Entity, 
     Record, 
@@ -10,6 +14,26 @@ from pkg.classes.model import (
     Session,
     ensure,
     soft_warning,
+    create_tables,
+    create_indexes,
+    sync_amount_storage,
+    migrate_amounts_to_cents,
+    CENTS_SCALE,
+    LEGACY_SCALE,
+    MonthlyAggregate,
+    rebuild_aggregates,
+    has_description_index,
+    transaction,
+    active_unit_of_work,
+    deferred_insert_triggers,
+    DEFERRED_TRIGGERS_MIN_ROWS,
+    close_year,
+    open_year,
+    closed_years,
+    partition_path,
+    record_fingerprint,
+    data_version,
+    LEDGER_CHANGES,
 )
 from tests._shared import (
     Patcher,
@@ -17,6 +41,14 @@ from tests._shared import (
     patch_builtin,
     session_mocker,
     mem_engine,
+    legacy_engine,
+    legacy_ledger,
+    seeded_engine,
+    index_names,
+    raw_column,
+    monthly_aggregates,
+    fts_matches,
+    stored_fingerprints,
 )
 
 #region ============================ header ====================================
@@ -159,6 +191,39 @@ class TestRecord(TestCase):
         self.assertEqual(expectedid, record.id)
 
 
+class TestFingerprint(TestCase):
+
+    def test_normalized(self):
+        fingerprint = record_fingerprint("2025-01-01", 500, "USD", "coffee bar")
+        self.assertEqual(16, len(fingerprint))
+        self.assertEqual(fingerprint, record_fingerprint(
+            "2025-01-01", 500, " usd", " Coffee\t BAR "))
+        self.assertNotEqual(fingerprint, record_fingerprint(
+            "2025-01-01", 501, "USD", "coffee bar"))
+
+    def test_set_on_write_and_edit(self):
+        engine = mem_engine()
+        record = Record(**TestRecord.fooargs)
+        with patch_builtin(print):
+            record.write(engine)
+        expected = record_fingerprint(TODAY.isoformat(), 500, "bar", "foo")
+        self.assertEqual([expected], stored_fingerprints(engine))
+        with Session(engine) as session:
+            record = session.get(Record, 1)
+        record.amount = 6
+        with patch_builtin(print):
+            record.write(engine)
+        expected = record_fingerprint(TODAY.isoformat(), 600, "bar", "foo")
+        self.assertEqual([expected], stored_fingerprints(engine))
+
+    def test_derived_column_is_hidden(self):
+        record = Record(**TestRecord.fooargs)
+        other = Record(**TestRecord.fooargs)
+        other.fingerprint = "foo"
+        self.assertEqual(record, other)
+        self.assertNotIn("fingerprint", repr(other))
+
+
 class TestConversion(TestCase):
 
     fooargs = {
@@ -210,5 +275,427 @@ class TestConversion(TestCase):
         self.assertEqual(expectedid, conv.id)
 
 
+class TestDataVersion(TestCase):
+
+    def setUp(self):
+        self.engine = mem_engine()
+        with patch_builtin(print):
+            Record(date=TODAY, amount=1, currency="USD", description="foo",
+                   category="FOO").write(self.engine)
+
+    def _edit(self, sql: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(text(sql))
+
+    def test_moves_with_every_write(self):
+        self.assertEqual((1, 0), data_version(self.engine))
+        self._edit("UPDATE cuentas SET description = 'bar'")
+        self.assertEqual((1, 1), data_version(self.engine))
+        self._edit("UPDATE cuentas SET amount = 500")
+        self.assertEqual((1, 2), data_version(self.engine))
+        with patch_builtin(print):
+            Conversion(**TestConversion.fooargs).write(self.engine)
+        self.assertEqual((1, 3), data_version(self.engine))
+        self._edit("DELETE FROM cuentas")
+        self.assertEqual((0, 4), data_version(self.engine))
+
+    def test_mirrored_writes(self):
+        self.assertEqual((1, 0), data_version(self.engine, LEDGER_CHANGES))
+        self._edit("UPDATE cuentas SET description = 'bar'")
+        self.assertEqual((1, 0), data_version(self.engine, LEDGER_CHANGES))
+        self._edit("UPDATE cuentas SET amount = 500")
+        self.assertEqual((1, 1), data_version(self.engine, LEDGER_CHANGES))
+        with patch_builtin(print):
+            Conversion(**TestConversion.fooargs).write(self.engine)
+        self.assertEqual((1, 2), data_version(self.engine, LEDGER_CHANGES))
+
+
+class TestIndexMigration(TestCase):
+
+    def test_new_tables_have_indexes(self):
+        engine = create_engine("sqlite://")
+        create_tables(engine)
+        expected = {
+            "ix_cuentas_date",
+            "ix_cuentas_category_currency_date",
+            "ix_cuentas_currency_date",
+            "ix_cuentas_fingerprint",
+        }
+        self.assertEqual(expected, index_names(engine, "cuentas"))
+        self.assertEqual({"ix_conversions_date"},
+                         index_names(engine, "conversions"))
+
+    def test_legacy_migration(self):
+        engine = legacy_ledger()
+        self.assertEqual(set(), index_names(engine, "cuentas"))
+        created = create_indexes(engine)
+        self.assertEqual(4, len(created))
+        self.assertIn("ix_cuentas_date", index_names(engine, "cuentas"))
+
+    def test_migration_is_idempotent(self):
+        engine = legacy_ledger()
+        create_tables(engine)
+        self.assertEqual([], create_indexes(engine))
+
+    def test_period_filter_uses_index(self):
+        engine = mem_engine()
+        stmt = text("EXPLAIN QUERY PLAN SELECT * FROM cuentas "
+                    "WHERE date >= '2025-01-01' AND date < '2025-02-01'")
+        with engine.connect() as conn:
+            plan = " ".join(row[-1] for row in conn.execute(stmt))
+        self.assertIn("ix_cuentas_date", plan)
+
+
+class TestCentsStorage(TestCase):
+
+    fooargs = TestRecord.fooargs | {"amount": 12.34}
+
+    def test_round_trip(self):
+        engine = mem_engine()
+        with patch_builtin(print):
+            Record(**self.fooargs).write(engine)
+        self.assertEqual([1234], raw_column(engine))
+        with Session(engine) as session:
+            record = session.get(Record, 1)
+        self.assertEqual(12.34, record.amount)
+
+    def test_filters_bind_cents(self):
+        engine = mem_engine()
+        with patch_builtin(print):
+            Record(**self.fooargs).write(engine)
+        with Session(engine) as session:
+            found = session.query(Record) \
+                           .filter(Record.amount.between(12.0, 12.5)).all()
+        self.assertEqual(1, len(found))
+
+    def test_detects_legacy_storage(self):
+        engine = legacy_ledger()
+        self.assertEqual(LEGACY_SCALE, sync_amount_storage(engine))
+        with Session(engine) as session:
+            self.assertEqual(12.34, session.get(Record, 1).amount)
+        self.assertEqual(CENTS_SCALE, sync_amount_storage(mem_engine()))
+
+    def test_migration(self):
+        engine = legacy_ledger()
+        sync_amount_storage(engine)
+        with patch_builtin(print) as mock_print:
+            copied = migrate_amounts_to_cents(engine, chunksize=3)
+        self.assertEqual(5, copied)
+        # each chunk reports the id the next one resumes from
+        mock_print.assert_any_call("cuentas: 3 rows migrated (last id: 3).")
+        mock_print.assert_any_call("cuentas: 4 rows migrated (last id: 4).")
+        self.assertEqual([1234, 10, 500, 199999], raw_column(engine))
+        self.assertEqual(
+            [975], raw_column(engine, "conversions", "target_amount"))
+        self.assertEqual(CENTS_SCALE, engine.dialect.amount_scale)
+        self.assertIn("ix_cuentas_date", 
+                      index_names(engine, "cuentas"))
+        with Session(engine) as session:
+            self.assertEqual(1999.99, session.get(Record, 4).amount)
+
+    def test_migration_resumes(self):
+        engine = legacy_ledger()
+        # simulate an interrupted run that already copied the first row
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE _cuentas_cents (id INTEGER PRIMARY KEY, "
+                "date DATE, amount INTEGER, currency VARCHAR(3), "
+                "description VARCHAR, category VARCHAR)"))
+            conn.execute(text(
+                "INSERT INTO _cuentas_cents VALUES "
+                "(1, '2025-01-01', 1234, 'USD', 'foo', 'BAR')"))
+        with patch_builtin(print):
+            copied = migrate_amounts_to_cents(engine)
+        self.assertEqual(4, copied)
+        self.assertEqual([1234, 10, 500, 199999], raw_column(engine))
+
+    def test_migration_is_idempotent(self):
+        engine = mem_engine()
+        self.assertEqual(0, migrate_amounts_to_cents(engine))
+
+
+class TestMonthlyAggregates(TestCase):
+
+    def setUp(self):
+        self.engine = seeded_engine()
+
+    def test_insert(self):
+        expected = {
+            ("2025-01", "USD", "FOOD"): (14.75, 2),
+            ("2025-01", "EUR", "FOOD"): (7.0, 1),
+            ("2025-02", "USD", "RENT"): (100.0, 1),
+        }
+        self.assertEqual(expected, monthly_aggregates(self.engine))
+
+    def test_update(self):
+        with Session(self.engine) as session:
+            record = session.get(Record, 1)
+            record.category = "RENT"
+            record.date = TODAY.fromisoformat("2025-02-10")
+            session.commit()
+        aggregates = monthly_aggregates(self.engine)
+        self.assertEqual((4.25, 1), aggregates[("2025-01", "USD", "FOOD")])
+        self.assertEqual((110.5, 2), aggregates[("2025-02", "USD", "RENT")])
+
+    def test_delete_removes_empty_groups(self):
+        with Session(self.engine) as session:
+            session.delete(session.get(Record, 3))
+            session.commit()
+        self.assertNotIn(("2025-01", "EUR", "FOOD"), 
+                         monthly_aggregates(self.engine))
+
+    def test_rebuild(self):
+        expected = monthly_aggregates(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE monthly_aggregates SET total = 0"))
+        self.assertEqual(3, rebuild_aggregates(self.engine))
+        self.assertEqual(expected, monthly_aggregates(self.engine))
+
+    def test_backfilled_on_create(self):
+        engine = legacy_engine()
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO cuentas VALUES "
+                "(1, '2025-01-01', 12.5, 'USD', 'foo', 'BAR')"))
+        create_tables(engine)
+        with Session(engine) as session:
+            row = session.get(MonthlyAggregate, ("2025-01", "USD", "BAR"))
+        self.assertEqual((12.5, 1), (row.total, row.count))
+
+
+class TestDescriptionIndex(TestCase):
+
+    def test_kept_in_sync(self):
+        engine = mem_engine()
+        self.assertTrue(has_description_index(engine))
+        with Session(engine) as session:
+            for description in ["coffee beans", "bus ticket"]:
+                session.add(Record(**TestRecord.fooargs | 
+                                   {"description": description}))
+            session.commit()
+            self.assertEqual([1], fts_matches(engine, "coffee"))
+
+            session.get(Record, 1).description = "green tea"
+            session.commit()
+            self.assertEqual([], fts_matches(engine, "coffee"))
+            self.assertEqual([1], fts_matches(engine, "tea"))
+
+            session.delete(session.get(Record, 2))
+            session.commit()
+            self.assertEqual([], fts_matches(engine, "bus"))
+
+    def test_populated_on_create(self):
+        engine = legacy_engine()
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO cuentas VALUES "
+                "(7, '2025-01-01', 12.5, 'USD', 'coffee', 'BAR')"))
+        create_tables(engine)
+        self.assertEqual([7], fts_matches(engine, "coffee"))
+
+
+class TestDeferredInsertTriggers(TestCase):
+
+    def _triggers(self, conn):
+        return set(conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        )).scalars())
+
+    def test_caught_up(self):
+        engine = seeded_engine()
+        with engine.connect() as conn:
+            triggers = self._triggers(conn)
+        with engine.begin() as conn:
+            rows = DEFERRED_TRIGGERS_MIN_ROWS
+            with deferred_insert_triggers(conn, rows) as last_id:
+                self.assertEqual(4, last_id)
+                self.assertNotIn("trg_cuentas_fts_insert", self._triggers(conn))
+                conn.execute(text(
+                    "INSERT INTO cuentas (date, amount, currency, "
+                    "description, category) VALUES "
+                    "('2025-01-09', 125, 'USD', 'coffee', 'FOOD'), "
+                    "('2025-03-01', 300, 'USD', 'coffee', 'RENT')"))
+            self.assertEqual(triggers, self._triggers(conn))
+        aggregates = monthly_aggregates(engine)
+        self.assertEqual((16.0, 3), aggregates[("2025-01", "USD", "FOOD")])
+        self.assertEqual((3.0, 1), aggregates[("2025-03", "USD", "RENT")])
+        self.assertEqual([5, 6], fts_matches(engine, "coffee"))
+
+    def test_restored_on_rollback(self):
+        engine = mem_engine()
+        with engine.connect() as conn:
+            triggers = self._triggers(conn)
+        with self.assertRaises(RuntimeError):
+            with engine.begin() as conn:
+                rows = DEFERRED_TRIGGERS_MIN_ROWS
+                with deferred_insert_triggers(conn, rows):
+                    raise RuntimeError("boom")
+        with engine.connect() as conn:
+            self.assertEqual(triggers, self._triggers(conn))
+
+    def test_small_loads_keep_triggers(self):
+        engine = mem_engine()
+        with engine.connect() as conn:
+            triggers = self._triggers(conn)
+        with engine.begin() as conn:
+            with deferred_insert_triggers(conn, 1) as last_id:
+                self.assertEqual(triggers, self._triggers(conn))
+                conn.execute(text(
+                    "INSERT INTO cuentas (date, amount, currency, "
+                    "description, category) VALUES "
+                    "('2025-01-09', 125, 'USD', 'coffee', 'FOOD')"))
+        self.assertEqual(0, last_id)
+        with engine.connect() as conn:
+            count = conn.execute(text(
+                "SELECT count FROM monthly_aggregates")).scalar()
+        self.assertEqual(1, count)
+
+
+class TestYearPartitions(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{Path(self.tmp.name, 'ledger.db')}")
+        create_tables(self.engine)
+        with patch_builtin(print):
+            for date_ in ["2023-03-01", "2023-12-31", "2024-01-01"]:
+                Record(**TestRecord.fooargs | 
+                       {"date": TODAY.fromisoformat(date_)}).write(self.engine)
+            close_year(self.engine, 2023)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def _ids(self, source):
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text(f"SELECT id FROM {source} ORDER BY id")).scalars().all()
+
+    def test_close(self):
+        self.assertEqual((2023,), closed_years(self.engine))
+        self.assertTrue(partition_path(self.engine, 2023).exists())
+        self.assertEqual([3], self._ids("cuentas"))
+        self.assertEqual([1, 2], self._ids("y2023.cuentas"))
+        self.assertEqual([1, 2, 3], self._ids("ledger"))
+        # totals of the closed year are kept
+        with Session(self.engine) as session:
+            self.assertIsNotNone(
+                session.get(MonthlyAggregate, ("2023-03", "bar", "baz")))
+
+    def test_attached_on_startup(self):
+        engine = create_engine(self.engine.url)
+        create_tables(engine)
+        self.assertEqual((2023,), closed_years(engine))
+        engine.dispose()
+
+    def test_writes_are_routed(self):
+        late = Record(**TestRecord.fooargs | 
+                      {"date": TODAY.fromisoformat("2023-06-01")})
+        fresh = Record(**TestRecord.fooargs | 
+                       {"date": TODAY.fromisoformat("2024-06-01")})
+        with patch_builtin(print):
+            late.write(self.engine)
+            fresh.write(self.engine)
+        # ids are never reused across partitions
+        self.assertEqual((4, 5), (late.id, fresh.id))
+        self.assertEqual([1, 2, 4], self._ids("y2023.cuentas"))
+        with Session(self.engine) as session:
+            row = session.get(MonthlyAggregate, ("2023-06", "bar", "baz"))
+            self.assertEqual(1, row.count)
+
+    def test_routed_writes_have_fingerprints(self):
+        late = Record(**TestRecord.fooargs | 
+                      {"date": TODAY.fromisoformat("2023-06-01")})
+        with patch_builtin(print):
+            late.write(self.engine)
+        expected = record_fingerprint("2023-06-01", 500, "bar", "foo")
+        stored = stored_fingerprints(self.engine, "y2023.cuentas")
+        self.assertEqual(expected, stored[-1])
+
+    def test_edits_are_refused(self):
+        with Session(self.engine) as session:
+            record = session.get(Record, 3)
+        record.date = TODAY.fromisoformat("2023-01-01")
+        with self.assertRaises(ValueError):
+            record.write(self.engine)
+
+    def test_open(self):
+        with patch_builtin(print):
+            self.assertEqual(2, open_year(self.engine, 2023))
+        self.assertEqual((), closed_years(self.engine))
+        self.assertFalse(partition_path(self.engine, 2023).exists())
+        self.assertEqual([1, 2, 3], self._ids("cuentas"))
+
+    def test_memory_engine_refused(self):
+        with self.assertRaises(ValueError):
+            close_year(mem_engine(), 2023)
+
+
+class TestTransaction(TestCase):
+
+    def _count(self, engine):
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT count(*) FROM cuentas")).scalar()
+
+    def test_single_commit(self):
+        engine = mem_engine()
+        with patch_builtin(print) as mock_print:
+            with transaction(engine) as session:
+                records = [Record(**TestRecord.fooargs) for _ in range(3)]
+                for record in records:
+                    record.write(engine, quiet=True)
+                # ids are assigned on flush, nothing committed yet
+                self.assertEqual([1, 2, 3], [r.id for r in records])
+                self.assertIs(session, active_unit_of_work(engine).session)
+        self.assertEqual(3, self._count(engine))
+        self.assertIsNone(active_unit_of_work(engine))
+        summary, = mock_print.call_args.args
+        self.assertIn("3 written", summary)
+        # still readable after the session is closed
+        self.assertEqual("foo", records[0].description)
+
+    def test_rollback(self):
+        engine = mem_engine()
+        with patch_builtin(print) as mock_print:
+            with self.assertRaises(RuntimeError):
+                with transaction(engine):
+                    Record(**TestRecord.fooargs).write(engine, quiet=True)
+                    raise RuntimeError("boom")
+        self.assertEqual(0, self._count(engine))
+        self.assertIsNone(active_unit_of_work(engine))
+        summary, = mock_print.call_args.args
+        self.assertIn("rolled back", summary)
+
+    def test_edit_and_delete(self):
+        engine = mem_engine()
+        with patch_builtin(print):
+            for _ in range(2):
+                Record(**TestRecord.fooargs).write(engine)
+        with Session(engine) as session:
+            first, second = session.get(Record, 1), session.get(Record, 2)
+
+        with patch_builtin(print) as mock_print:
+            with transaction(engine):
+                first.description = "edited"
+                first.write(engine, quiet=True)
+                second.delete(engine)
+        summary, = mock_print.call_args.args
+        self.assertIn("1 written, 1 deleted", summary)
+        with Session(engine) as session:
+            self.assertEqual("edited", session.get(Record, 1).description)
+            self.assertIsNone(session.get(Record, 2))
+
+    def test_nested(self):
+        engine = mem_engine()
+        with patch_builtin(print):
+            with transaction(engine) as outer:
+                with transaction(engine) as inner:
+                    Record(**TestRecord.fooargs).write(engine, quiet=True)
+                self.assertIs(outer, inner)
+                self.assertIsNotNone(active_unit_of_work(engine))
+        self.assertEqual(1, self._count(engine))
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
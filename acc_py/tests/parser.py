@@ -4,7 +4,7 @@ from unittest import TestCase
 
 import datetime
 from sqlalchemy.dialects import sqlite
-from sqlalchemy import text, true, select
+from sqlalchemy import text, true, select, and_, or_, not_
 import pandas as pd
 from datetime import timedelta
 from typing import Callable
@@ -23,7 +23,16 @@ from pkg.utilities.parser import (
     parse_date,
     parse_double_currency,
     core_semantic_filter_parse,
+    parse_date_range,
+    parse_date_wildcard,
+    date_range_filter,
+    parse_description_match,
+    regex_literal_prefix,
+    parse_regex_filter,
+    sqlite_regexp,
+    compile_regex,
     parse_semantic_filter,
+    parse_filter_expression,
     cast_csv_types,
     sanitize_df,
     parse_record_from_id
@@ -306,6 +315,203 @@ class TestPeriodParser(TestCase):
                     parse_period(period='', default_period=bad_input)
 
 
+class TestDateRangeParser(TestCase):
+
+    def test_parse_date_range(self):
+        cases = [
+            (pd.Period("2025-03", freq='M'),    (datetime.date(2025, 3, 1),   datetime.date(2025, 4, 1))),
+            (pd.Period("2024", freq='Y'),       (datetime.date(2024, 1, 1),   datetime.date(2025, 1, 1))),
+            (pd.Period("2025-12", freq='M'),    (datetime.date(2025, 12, 1),  datetime.date(2026, 1, 1))),
+            (datetime.date(2025, 2, 28),        (datetime.date(2025, 2, 28),  datetime.date(2025, 3, 1))),
+            ('2025',                            (datetime.date(2025, 1, 1),   datetime.date(2026, 1, 1))),
+            ('2025-2',                          (datetime.date(2025, 2, 1),   datetime.date(2025, 3, 1))),
+            ('2025 / 11',                       (datetime.date(2025, 11, 1),  datetime.date(2025, 12, 1))),
+            ('2025-W01',                        (datetime.date(2024, 12, 30), datetime.date(2025, 1, 6))),
+            ('2025w10',                         (datetime.date(2025, 3, 3),   datetime.date(2025, 3, 10))),
+            ('2025-03-15',                      (datetime.date(2025, 3, 15),  datetime.date(2025, 3, 16))),
+        ]
+        for expr, expected in cases:
+            with self.subTest(expr=expr):
+                self.assertEqual(expected, parse_date_range(expr))
+
+    def test_parse_date_range_err(self):
+        cases = [
+            (None,          TypeError),
+            (2025,          TypeError),
+            ('2025-W60',    ValueError),
+            ('2025-13',     ValueError),
+        ]
+        for expr, err in cases:
+            with self.subTest(expr=expr):
+                with self.assertRaises(err):
+                    parse_date_range(expr)
+
+    def test_parse_date_wildcard(self):
+        cases = [
+            ('2025%',       ('2025-', '2025:')),
+            ('202%',        ('2020-', '202:')),
+            ('2025-03%',    ('2025-03', '2025-03:')),
+            ('2025-09%',    ('2025-09', '2025-09:')),
+            ('2025-03-%',   ('2025-03-', '2025-03-:')),
+            ('%',           None),
+            ('%-03-%',      None),
+            ('2025-0_-01',  None),
+            ('2025-03-01',  None),
+        ]
+        for wildcard, expected in cases:
+            with self.subTest(wildcard=wildcard):
+                self.assertEqual(expected, parse_date_wildcard(wildcard))
+
+    def test_range_filter_matches_like(self):
+        engine = mem_engine()
+        dates = ["2024-12-31", "2025-09-01", "2025-09-30", "2025-10-01"]
+        with engine.begin() as conn:
+            for i, date_ in enumerate(dates):
+                conn.execute(text(
+                    "INSERT INTO cuentas "
+                    "(id, date, amount, currency, description, category) "
+                    f"VALUES ({i}, '{date_}', 1, 'USD', "
+                    "'foo', 'BAR')"))
+        for wildcard in ['2025%', '202%', '2025-09%', '2025-0%', 
+                         '2025-%', '2024-12-3%']:
+            with self.subTest(wildcard=wildcard):
+                like = select(Record.id).where(Record.date.like(wildcard))
+                bounds = parse_date_wildcard(wildcard)
+                ranged = select(Record.id).where(*date_range_filter(*bounds))
+                with engine.connect() as conn:
+                    self.assertEqual(
+                        conn.execute(like).scalars().all(),
+                        conn.execute(ranged).scalars().all(),
+                    )
+
+
+class TestDescriptionMatchParser(TestCase):
+
+    def setUp(self):
+        self.engine = mem_engine()
+        descriptions = [
+            "coffee at the bar",
+            "Coffee beans",
+            "coffeehouse breakfast",
+            "bus ticket",
+        ]
+        with self.engine.begin() as conn:
+            for i, description in enumerate(descriptions, 1):
+                conn.execute(text(
+                    "INSERT INTO cuentas "
+                    "(id, date, amount, currency, description, category) "
+                    f"VALUES ({i}, '2025-01-01', 1, "
+                    f"'USD', '{description}', 'BAR')"))
+
+    def _ids(self, terms, full_text=True):
+        where = parse_description_match(terms, full_text)
+        stmt = select(Record.id).where(where).order_by(Record.id)
+        with self.engine.connect() as conn:
+            return conn.execute(stmt).scalars().all()
+
+    def test_full_text(self):
+        cases = [
+            (["coffee"],            [1, 2]),
+            (["coffee*"],           [1, 2, 3]),
+            (["coffee", "bar"],     [1]),
+            (["'bus'"],             [4]),
+            (["tea"],               []),
+        ]
+        for terms, expected in cases:
+            with self.subTest(terms=terms):
+                self.assertEqual(expected, self._ids(terms))
+
+    def test_fallback(self):
+        self.assertEqual([1, 2, 3], self._ids(["coffee"], full_text=False))
+        self.assertEqual([1], self._ids(["coffee", "bar"], full_text=False))
+        self.assertEqual(
+            compile_sql(Record.description.like("%bus%")),
+            compile_sql(parse_description_match(["bus*"], full_text=False))
+        )
+
+    def test_punctuation_is_not_query_syntax(self):
+        self.assertEqual([], self._ids(["AND", "(bar", "-"]))
+
+    def test_err(self):
+        for terms in [[], ["*"], ["''"]]:
+            with self.subTest(terms=terms):
+                with self.assertRaises(ValueError):
+                    parse_description_match(terms)
+
+    def test_semantic_filter(self):
+        self.assertEqual(
+            compile_sql(parse_description_match(["coffee", "bar*"])),
+            compile_sql(core_semantic_filter_parse("desc match coffee bar*"))
+        )
+
+
+class TestRegexFilterParser(TestCase):
+
+    def test_literal_prefix(self):
+        cases = [
+            ('^FOOD',           'FOOD'),
+            ('^FOOD-.*',        'FOOD-'),
+            ('^FOOD?',          'FOO'),
+            ('^ab*c',           'a'),
+            ('^a{2}',           ''),
+            ('^(FOOD|RENT)',    ''),
+            ('^FOOD|RENT',      ''),
+            ('FOOD',            ''),
+            ('^\\d',            ''),
+            ('^2025-0[1-3]',    '2025-0'),
+        ]
+        for pattern, expected in cases:
+            with self.subTest(pattern=pattern):
+                self.assertEqual(expected, regex_literal_prefix(pattern))
+
+    def test_date_prefilter(self):
+        expected = and_(*date_range_filter('2025-0', '2025-0:'),
+                        Record.date.regexp_match('^2025-0[1-3]'))
+        self.assertEqual(
+            compile_sql(expected),
+            compile_sql(parse_regex_filter(Record.date, '^2025-0[1-3]'))
+        )
+
+    def test_prefilter_matches_plain_regex(self):
+        from pkg.classes.context import _set_regexp
+        engine = mem_engine()
+        _set_regexp(engine)
+        categories = ["FOOD", "FOOD-OUT", "FOOT", "RENT", "food"]
+        with engine.begin() as conn:
+            for i, category in enumerate(categories, 1):
+                conn.execute(text(
+                    "INSERT INTO cuentas "
+                    "(id, date, amount, currency, description, category) "
+                    f"VALUES ({i}, '2025-0{i}-01', 1, "
+                    f"'USD', 'foo', '{category}')"))
+        cases = [
+            (Record.category,   '^FOOD'),
+            (Record.category,   '^FOO[DT]$'),
+            (Record.category,   '^FOOD?'),
+            (Record.date,       '^2025-0[1-3]'),
+        ]
+        for column, pattern in cases:
+            with self.subTest(pattern=pattern):
+                plain = select(Record.id).where(column.regexp_match(pattern))
+                filtered = select(Record.id) \
+                           .where(parse_regex_filter(column, pattern))
+                with engine.connect() as conn:
+                    self.assertEqual(
+                        conn.execute(plain).scalars().all(),
+                        conn.execute(filtered).scalars().all(),
+                    )
+
+    def test_sqlite_regexp_is_cached(self):
+        compile_regex.cache_clear()
+        for value in ["FOOD", "RENT", "FOOD-OUT", None]:
+            sqlite_regexp('^FOOD', value)
+        info = compile_regex.cache_info()
+        self.assertEqual(1, info.misses)
+        self.assertEqual(2, info.hits)
+        self.assertFalse(sqlite_regexp('^FOOD', None))
+        self.assertTrue(sqlite_regexp('-0[12]-', '2025-02-01'))
+
+
 class TestCoreSemanticFilterParser(TestCase):
 
     @staticmethod
@@ -397,8 +603,21 @@ class TestCoreSemanticFilterParser(TestCase):
 
     def test_date_like(self):
         cases = [
-            ('date like 2025-12%', '2025-12%'),
-            ('date like \'2025-12%\'', '2025-12%')
+            ('date like 2025-12%', ('2025-12', '2025-12:')),
+            ('date like \'2025-12%\'', ('2025-12', '2025-12:')),
+            ('date like 2025%', ('2025-', '2025:')),
+        ]
+        for date_like, bounds in cases:
+            with self.subTest(date_like=date_like):
+                self.assertEqual(
+                    compile_sql(and_(*date_range_filter(*bounds))),
+                    self.wrap(date_like)
+                )
+
+    def test_date_like_not_sargable(self):
+        cases = [
+            ('date like %-12-%', '%-12-%'),
+            ('date like 2025-1_-01', '2025-1_-01'),
         ]
         for date_like, expected in cases:
             with self.subTest(date_like=date_like):
@@ -407,6 +626,19 @@ class TestCoreSemanticFilterParser(TestCase):
                     self.wrap(date_like)
                 )
 
+    def test_date_in(self):
+        cases = [
+            ('date in 2025',        datetime.date(2025, 1, 1),  datetime.date(2026, 1, 1)),
+            ('date in 2025-02',     datetime.date(2025, 2, 1),  datetime.date(2025, 3, 1)),
+            ('date in 2025-W07',    datetime.date(2025, 2, 10), datetime.date(2025, 2, 17)),
+        ]
+        for date_in, lower, upper in cases:
+            with self.subTest(date_in=date_in):
+                self.assertEqual(
+                    compile_sql(and_(*date_range_filter(lower, upper))),
+                    self.wrap(date_in)
+                )
+
     def test_date_parse(self):
         cases = [
             ('date = 2025 10 31',           '2025 10 31',       datetime.date(year=2025, month=10, day=31)),
@@ -549,8 +781,7 @@ class TestCoreSemanticFilterParser(TestCase):
     def test_description_regex(self):
         cases = [
             ('description  regexp valid regex',     'valid regex'),
-            ('   description r ^"',                 '^\"'),
-            ('  desc regex  ^beg\\.end$',           r'^beg\.end$')
+            ('   description r (?i)^"',             '(?i)^\"'),
         ]
         for filter, regexp in cases:
             with self.subTest(filter=filter):
@@ -559,6 +790,18 @@ class TestCoreSemanticFilterParser(TestCase):
                     self.wrap(filter)
                 )        
 
+    def test_description_regex_prefilter(self):
+        cases = [
+            ('   description r ^"',                 '^\"',          '"',   '#'),
+            ('  desc regex  ^beg\\.end$',           r'^beg\.end$',  'beg', 'beh'),
+        ]
+        for filter, regexp, lower, upper in cases:
+            with self.subTest(filter=filter):
+                expected = and_(Record.description >= lower,
+                                Record.description < upper,
+                                Record.description.regexp_match(regexp))
+                self.assertEqual(compile_sql(expected), self.wrap(filter))
+
     def test_description_err(self):
         cases = [
             'description like ',
@@ -629,7 +872,7 @@ class TestSemanticFilterParser(TestCase):
                     Record.category == 'TEST',
                     Record.amount >= 1200.0,
                     Record.currency == 'USD',
-                    Record.date.like('2024-10%')
+                    *date_range_filter('2024-10', '2024-10:')
                 )
             ),
             (
@@ -648,6 +891,63 @@ class TestSemanticFilterParser(TestCase):
                     self.wrap(raw_query)
                 )
 
+    def test_boolean_filter(self):
+        food, rent = Record.category == 'FOOD', Record.category == 'RENT'
+        usd = Record.currency == 'USD'
+        cases = [
+            ('cat FOOD || cat RENT',                    or_(food, rent)),
+            ('!currency USD',                           not_(usd)),
+            ('cat FOOD || cat RENT && cur USD',         or_(food, and_(rent, usd))),
+            ('(cat FOOD || cat RENT) && !(cur USD)',    and_(or_(food, rent), not_(usd))),
+            ('!!cat FOOD',                              food),
+            (
+                'desc r ^(a|b) || cat FOOD',
+                or_(Record.description.regexp_match('^(a|b)'), food)
+            ),
+        ]
+        for raw_query, expected in cases:
+            with self.subTest(raw_query=raw_query):
+                self.assertEqual(
+                    compile_sql(select(Record).where(expected)),
+                    self.wrap(raw_query)
+                )
+
+    def test_parentheses_in_descriptions(self):
+        smiley = Record.description.like('%:)%')
+        food = Record.category == 'FOOD'
+        cases = [
+            ('desc like %:)%',                      smiley),
+            ('desc like %:) && cat FOOD',           and_(Record.description.like('%:)'), food)),
+            ('(desc like %:)% || cat FOOD)',        or_(smiley, food)),
+            ('!(desc like %:)%)',                   not_(smiley)),
+            ('desc like (draft)%',                  Record.description.like('(draft)%')),
+            ('desc = lunch :)',                     Record.description == 'lunch :)'),
+        ]
+        for raw_query, expected in cases:
+            with self.subTest(raw_query=raw_query):
+                self.assertEqual(
+                    compile_sql(select(Record).where(expected)),
+                    self.wrap(raw_query)
+                )
+
+    def test_boolean_filter_err(self):
+        cases = [
+            '(cat FOOD',
+            'cat FOOD )',
+            '(cat FOOD || (cur USD)',
+            'cat FOOD (cur USD)',
+        ]
+        for query in cases:
+            with self.subTest(query=query):
+                with self.assertRaises(ValueError):
+                    self.wrap(query)
+
+    def test_parsed_filters_are_cached(self):
+        self.assertIs(
+            parse_filter_expression('cat FOOD || cur USD'),
+            parse_filter_expression('  cat   FOOD ||  cur USD ')
+        )
+
     def test_semantic_filter_err(self):
         cases = [
             ('sql: UPDATE * FROM cuentas SET currency=\'CORRUPTED\'',       ValueError),
@@ -777,6 +1077,23 @@ class TestDataFrameSanitizer(TestCase):
                 }]),
                 "coerce date and upper currency"
             ),
+            (
+                pd.DataFrame([{
+                    "date": pd.Timestamp("2024-12-31"),
+                    "amount" : 65.0,
+                    "currency" : "EUR",
+                    "description": "desc",
+                    "category": "category2"
+                }]).astype({"currency": "category", "category": "category"}),
+                pd.DataFrame([{
+                    "date": "2024-12-31",
+                    "amount" : 65.0,
+                    "currency" : "EUR",
+                    "description": "desc",
+                    "category": "category2"
+                }]),
+                "categorical columns, as returned by fetch"
+            ),
         ]
         for df_input, df_expected, label in cases:
             with self.subTest(label=label):
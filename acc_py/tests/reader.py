@@ -0,0 +1,316 @@
+import unittest
+import threading
+import tempfile
+import _thread
+from datetime import date
+from pathlib import Path
+from unittest import TestCase
+
+import pandas as pd
+from sqlalchemy import create_engine, select, func, text, bindparam, event
+
+from pkg.classes.model import Record, create_tables, close_year
+from pkg.classes.reader import (read_frame, read_frames, explain_plan,
+                                epoch_days, ledger_size_estimate,
+                                set_scan_warning_rows, set_query_timeout,
+                                QueryTimeout, CANCELLED,
+                                _date_bounds, _partition_source)
+from pkg.classes.statements import (register, prepared, track_compiled_cache,
+                                    COMPILED_CACHE)
+from pkg.utilities.parser import date_range_filter, parse_date_range
+from tests._shared import (
+    mem_engine,
+    patch_builtin,
+    TODAY,
+    Patcher,
+)
+
+
+class TestReadFrame(TestCase):
+
+    amounts = [12.34, 0.1, 5, 1999.99]
+
+    def setUp(self):
+        self.engine = mem_engine()
+        with patch_builtin(print):
+            for amount in self.amounts:
+                Record(date=TODAY, amount=amount, currency="USD",
+                       description="foo", category="BAR").write(self.engine)
+
+    def test_amount_column_is_float(self):
+        df = read_frame(select(Record), self.engine, index_col='id')
+        self.assertEqual("float64", str(df.amount.dtype))
+        self.assertEqual(self.amounts, df.amount.to_list())
+
+    def test_labeled_aggregate(self):
+        total = func.sum(Record.amount).label("total_amount")
+        stmt = select(Record.currency, total).group_by(Record.currency)
+        df = read_frame(stmt, self.engine, index_col='currency')
+        self.assertAlmostEqual(sum(self.amounts), df.total_amount["USD"])
+
+    def test_epoch_days(self):
+        stmt = select(Record.id, epoch_days(Record.date), Record.amount)
+        df = read_frame(stmt, self.engine, index_col='id')
+        self.assertEqual("int64", str(df.date.dtype))
+        dates = pd.to_datetime(df.date, unit='D')
+        self.assertTrue((dates == pd.Timestamp(TODAY)).all())
+
+    def test_text_statement_amounts_are_scaled(self):
+        stmt = text("SELECT amount, amount * 2 AS twice FROM cuentas")
+        df = read_frame(stmt, self.engine)
+        self.assertEqual(self.amounts, df.amount.to_list())
+        self.assertEqual([2 * a for a in self.amounts], df.twice.to_list())
+
+    def test_text_statement_aggregates_are_scaled(self):
+        stmt = text("SELECT sum(amount) AS total, max(amount) FROM cuentas "
+                    "WHERE currency = :currency")
+        df = read_frame(stmt, self.engine, params={"currency": "USD"})
+        self.assertAlmostEqual(sum(self.amounts), df.total[0])
+        self.assertEqual(1999.99, df.iloc[0, 1])
+
+    def test_text_statement_with_its_own_ctes(self):
+        stmt = text("with big AS (SELECT amount FROM cuentas WHERE amount > 10)"
+                    " SELECT sum(amount) AS total FROM big")
+        df = read_frame(stmt, self.engine)
+        self.assertAlmostEqual(12.34 + 1999.99, df.total[0])
+        # qualified names read the stored minor units
+        stmt = text("SELECT sum(amount) AS total FROM main.cuentas")
+        self.assertEqual(201743, read_frame(stmt, self.engine).total[0])
+
+
+class TestPartitionPruning(TestCase):
+
+    def _bounds(self, *criteria):
+        return _date_bounds(select(Record).where(*criteria))
+
+    def test_date_bounds(self):
+        stmt = date_range_filter(*parse_date_range("2023-03"))
+        self.assertEqual(("2023-03-01", "2023-04-01"), self._bounds(*stmt))
+        stmt = date_range_filter(*parse_date_range("2023"))
+        self.assertEqual(("2023-01-01", "2023-12-31"), self._bounds(*stmt))
+        self.assertEqual((None, None), self._bounds(Record.category == "BAR"))
+
+    def test_partition_source(self):
+        years = (2022, 2023)
+        self.assertIsNone(_partition_source(years, "2024-01-01", None))
+        only = _partition_source(years, "2023-01-01", "2023-12-31")
+        self.assertEqual("y2023", only.element.schema)
+        union = _partition_source(years, "2023-06-01", "2024-06-01")
+        self.assertEqual(2, len(union.element.selects))
+
+
+class TestPartitionedReads(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{Path(self.tmp.name, 'ledger.db')}")
+        create_tables(self.engine)
+        with patch_builtin(print):
+            for year in (2022, 2023, 2024):
+                Record(date=date(year, 6, 1), amount=year, currency="USD",
+                       description="foo", category="BAR").write(self.engine)
+            for year in (2022, 2023):
+                close_year(self.engine, year)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def _years(self, *criteria):
+        stmt = select(Record).where(*criteria).order_by(Record.id)
+        df = read_frame(stmt, self.engine, index_col='id')
+        return [int(amount) for amount in df.amount]
+
+    def test_closed_only_ranges(self):
+        self.assertEqual([2023], self._years(
+            *date_range_filter(*parse_date_range("2023"))))
+        self.assertEqual([2022, 2023], self._years(
+            Record.date >= "2022-01-01", Record.date < "2024-01-01"))
+
+    def test_mixed_and_unbounded_ranges(self):
+        self.assertEqual([2023, 2024], self._years(Record.date >= "2023-01-01"))
+        self.assertEqual([2024], self._years(Record.date >= "2024-01-01"))
+        self.assertEqual([2022, 2023, 2024], self._years(Record.category == "BAR"))
+
+    def test_aggregates_and_text(self):
+        total = func.sum(Record.amount).label("total")
+        stmt = select(total).where(*date_range_filter(*parse_date_range("2022")))
+        self.assertEqual(2022, read_frame(stmt, self.engine).total[0])
+        df = read_frame(text("SELECT amount FROM ledger ORDER BY id"), self.engine)
+        self.assertEqual([2022, 2023, 2024], df.amount.tolist())
+        df = read_frame(text("SELECT sum(amount) AS total FROM ledger"), 
+                        self.engine)
+        self.assertEqual(2022 + 2023 + 2024, df.total[0])
+
+
+class TestReadFrames(TestCase):
+
+    def setUp(self):
+        self.engine = mem_engine()
+        with patch_builtin(print):
+            for i in range(7):
+                Record(date=TODAY, amount=i, currency="USD",
+                       description="foo", category="BAR").write(self.engine)
+
+    def _ids(self, stmt, chunk_size, **kwargs):
+        return [chunk.index.to_list() if chunk.index.name == "id" 
+                else chunk.id.to_list()
+                for chunk in read_frames(stmt, self.engine, Record.id, 
+                                         chunk_size, **kwargs)]
+
+    def test_keyset_pages_newest_first(self):
+        pages = self._ids(select(Record), 3, index_col="id")
+        self.assertEqual([[7, 6, 5], [4, 3, 2], [1]], pages)
+
+    def test_filtered_and_exact_pages(self):
+        stmt = select(Record).where(Record.amount >= 1)
+        self.assertEqual([[7, 6, 5], [4, 3, 2]], self._ids(stmt, 3))
+
+    def test_amounts_are_scaled(self):
+        chunks = read_frames(select(Record), self.engine, Record.id, 4)
+        amounts = sorted(a for c in chunks for a in c.amount.to_list())
+        self.assertEqual([float(i) for i in range(7)], amounts)
+
+    def test_text_statement_is_streamed(self):
+        stmt = text("SELECT id FROM cuentas ORDER BY id")
+        self.assertEqual([[1, 2, 3, 4], [5, 6, 7]], self._ids(stmt, 4))
+        stmt = text("SELECT amount FROM cuentas ORDER BY id")
+        amounts = [a for c in read_frames(stmt, self.engine, Record.id, 4)
+                   for a in c.amount.to_list()]
+        self.assertEqual([float(i) for i in range(7)], amounts)
+
+
+class TestExplainPlan(TestCase):
+
+    def setUp(self):
+        self.engine = mem_engine()
+        with patch_builtin(print):
+            for category in ("FOO", "BAR", "BAZ"):
+                Record(date=TODAY, amount=1, currency="USD",
+                       description="foo", category=category).write(self.engine)
+
+    def _explain(self, stmt, **kwargs):
+        with patch_builtin(print), \
+             Patcher("pkg.classes.reader", "soft_warning") as mock_warning:
+            plan = explain_plan(stmt, self.engine, **kwargs)
+        return plan.detail.to_list(), mock_warning
+
+    def test_full_scan_warns_above_threshold(self):
+        stmt = select(Record).where(Record.description == "foo")
+        set_scan_warning_rows(self.engine, 2)
+        details, mock_warning = self._explain(stmt)
+        self.assertEqual(["SCAN cuentas"], details)
+        mock_warning.assert_called_once()
+
+    def test_ledger_size_is_estimated(self):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(self.engine, "before_cursor_execute", listener)
+        set_scan_warning_rows(self.engine, 2)
+        self._explain(select(Record).where(Record.description == "foo"))
+        event.remove(self.engine, "before_cursor_execute", listener)
+        self.assertFalse(any("count(" in sql.lower() for sql in statements))
+        self.assertEqual(3, ledger_size_estimate(self.engine))
+
+    def test_full_scan_below_threshold(self):
+        stmt = select(Record).where(Record.description == "foo")
+        _, mock_warning = self._explain(stmt)
+        mock_warning.assert_not_called()
+
+    def test_indexed_filter_with_params(self):
+        stmt = select(Record).where(Record.category == bindparam("category"))
+        set_scan_warning_rows(self.engine, 0)
+        details, mock_warning = self._explain(
+            stmt, params={"category": "FOO"})
+        self.assertTrue(details[0].startswith("SEARCH cuentas USING INDEX"))
+        mock_warning.assert_not_called()
+
+    def test_read_frame_still_reads(self):
+        with patch_builtin(print):
+            df = read_frame(select(Record), self.engine, explain=True)
+        self.assertEqual(3, len(df))
+
+
+class TestTimeBudget(TestCase):
+
+    # counts forever, one sqlite VM loop per row
+    endless = text(
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+        "SELECT max(i) AS i FROM n"
+    )
+
+    def setUp(self):
+        self.engine = mem_engine()
+        CANCELLED.clear()
+
+    def test_timeout(self):
+        with self.assertRaises(QueryTimeout):
+            read_frame(self.endless, self.engine, timeout=0.05)
+        self.assertEqual(1, CANCELLED["timeouts"])
+        # the connection is still usable, without a handler left behind
+        df = read_frame(text("SELECT count(*) AS n FROM cuentas"), self.engine)
+        self.assertEqual(0, df.n[0])
+
+    def test_engine_default(self):
+        set_query_timeout(self.engine, 0.05)
+        with self.assertRaises(QueryTimeout):
+            read_frame(self.endless, self.engine)
+        set_query_timeout(self.engine, None)
+        limited = text("SELECT 1 AS i")
+        self.assertEqual(1, read_frame(limited, self.engine).i[0])
+
+    def test_ctrl_c_interrupts(self):
+        timer = threading.Timer(0.05, _thread.interrupt_main)
+        timer.start()
+        with self.assertRaises(KeyboardInterrupt):
+            read_frame(self.endless, self.engine)
+        timer.join()
+        self.assertEqual({"interrupts": 1}, dict(CANCELLED))
+
+    def test_streamed_pages_have_their_own_budget(self):
+        stmt = select(Record.id)
+        frames = read_frames(stmt, self.engine, Record.id, 10, timeout=0.05)
+        self.assertEqual([], list(frames))
+        with self.assertRaises(QueryTimeout):
+            next(read_frames(self.endless, self.engine, Record.id, 10,
+                             timeout=0.05))
+
+
+@register("tests.by_category")
+def _by_category():
+    return select(Record.id, Record.amount) \
+        .where(Record.category == bindparam("category"))
+
+
+class TestPreparedStatements(TestCase):
+
+    def setUp(self):
+        self.engine = mem_engine()
+        track_compiled_cache(self.engine)
+        with patch_builtin(print):
+            for category in ("FOO", "BAR"):
+                Record(date=TODAY, amount=1, currency="USD",
+                       description="foo", category=category).write(self.engine)
+
+    def test_built_once(self):
+        self.assertIs(prepared("tests.by_category"),
+                      prepared("tests.by_category"))
+
+    def test_unknown_and_duplicate_names(self):
+        with self.assertRaises(KeyError):
+            prepared("tests.missing")
+        with self.assertRaises(ValueError):
+            register("tests.by_category")(_by_category)
+
+    def test_reexecution_hits_compiled_cache(self):
+        stmt = prepared("tests.by_category")
+        read_frame(stmt, self.engine, params={"category": "FOO"})
+        before = COMPILED_CACHE.copy()
+        df = read_frame(stmt, self.engine, params={"category": "BAR"})
+        self.assertEqual(1, len(df))
+        self.assertEqual(before["misses"], COMPILED_CACHE["misses"])
+        self.assertGreater(COMPILED_CACHE["hits"], before["hits"])
+
+
+if __name__ == "__main__":
+    unittest.main()